@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -29,11 +30,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'dashboard.timing.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'dashboard.middleware.FarmerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -42,7 +46,8 @@ ROOT_URLCONF = 'ArogyaKheti.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, with render times reported (see dashboard.timing)
+        'BACKEND': 'dashboard.timing.TimedDjangoTemplates',
         'DIRS': [
             os.path.join(BASE_DIR, "landing/templates"),
             os.path.join(BASE_DIR, "dashboard/templates")
@@ -68,6 +73,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / os.environ.get('DB_NAME', 'db.sqlite3'),
+        'OPTIONS': {
+            # Concurrent writers (e.g. buyers reserving the same lot) wait for the lock instead of failing
+            'timeout': 20,
+        },
+        'TEST': {
+            # On disk, so tests with several threads exercise real file locking
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -105,5 +118,90 @@ if not DEBUG:
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache tier (dashboard.cache_backends). 'sqlite' is shared by every worker on the
+# host; 'redis' by every host; 'locmem' is per process and only fit for one worker.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')
+if sys.argv[1:2] == ['test']:
+    # Tests get a cache of their own instead of the developer's cache file
+    CACHE_BACKEND = 'locmem'
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'dashboard.cache_backends.InstrumentedLocMemCache',
+    },
+    'sqlite': {
+        'BACKEND': 'dashboard.cache_backends.SQLiteCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', BASE_DIR / 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    'redis': {
+        'BACKEND': 'dashboard.cache_backends.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    },
+}
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_BACKEND],
+}
+
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_COOKIE_AGE = 1800  # Sessions expire after 30 minutes
+
+# Per-provider overrides for dashboard.providers (timeouts, retries, breaker, pool sizes).
+# rate_limit budgets are shared by all workers through the cache and sit a little
+# under each provider's published quota.
+PROVIDER_CLIENTS = {
+    'weather': {'read_timeout': 5, 'rate_limit': {'calls': 950000, 'period': 30 * 86400, 'burst': 500}},
+    'news': {'read_timeout': 8, 'rate_limit': {'calls': 95, 'period': 86400, 'burst': 10}},
+    'govdata': {'read_timeout': 10, 'rate_limit': {'calls': 1000, 'period': 3600, 'burst': 60}},
+    'gmaps': {'read_timeout': 5, 'rate_limit': {'calls': 40, 'period': 1}},
+    'gemini': {'retries': 0, 'read_timeout': 60, 'rate_limit': {'calls': 14, 'period': 60}},
+}
+
+# Offline provider stand-ins (dashboard.simulator) for load tests. Latency
+# distributions: fixed(ms), uniform(low_ms, high_ms), exponential(mean_ms),
+# lognormal(median_ms, sigma).
+PROVIDER_SIMULATOR = {
+    'enabled': os.environ.get('PROVIDER_SIMULATOR', 'False') == 'True',
+    'seed': int(os.environ.get('PROVIDER_SIMULATOR_SEED', '42')),
+    'providers': {
+        'weather': {'latency': {'dist': 'lognormal', 'median_ms': 120, 'sigma': 0.4}, 'error_rate': 0.01},
+        'news': {'latency': {'dist': 'lognormal', 'median_ms': 300, 'sigma': 0.6}, 'error_rate': 0.02,
+                 'payload': {'articles': 100, 'content_chars': 200}},
+        'govdata': {'latency': {'dist': 'lognormal', 'median_ms': 800, 'sigma': 0.7}, 'error_rate': 0.05,
+                    'payload': {'records_per_state': 10}},
+        'gmaps': {'latency': {'dist': 'uniform', 'low_ms': 40, 'high_ms': 120}},
+        'gemini': {'latency': {'dist': 'lognormal', 'median_ms': 2000, 'sigma': 0.5}, 'payload': {'words': 150}},
+    },
+}
+
+# Dashboard cards. shell_deadline: how long (seconds) the home page waits for a
+# provider before leaving the card for the browser to fetch from its widget
+# endpoint; max_age: browser cache lifetime of that endpoint. Server-side TTLs
+# live in dashboard.cachekeys.
+DASHBOARD_WIDGETS = {
+    'weather': {'shell_deadline': 0.2, 'max_age': 600},
+    'news': {'shell_deadline': 0.2, 'max_age': 1800},
+    'market_stats': {'max_age': 30},
+}
+DASHBOARD_FANOUT_WORKERS = 16
+
+# Open reservations older than this are released by `manage.py release_reservations`
+ORDER_RESERVATION_HOURS = 48
+
+# Append-only log of the bid/ask books (dashboard.matching). The first process to
+# take a bid locks it and owns the books; other workers answer bids with a 503,
+# so route /api/bids/ to a single process.
+MATCHING_LOG = os.environ.get('MATCHING_LOG', str(BASE_DIR / 'matching.jsonl'))
+# Bids and bid cancels catch the owning process's books up on listings other
+# workers changed, and take expired bids off, at most this often
+MATCHING_SYNC_SECONDS = int(os.environ.get('MATCHING_SYNC_SECONDS', 5))
+# Days an unfilled bid rests on its book
+MATCHING_BID_DAYS = int(os.environ.get('MATCHING_BID_DAYS', 7))
+
+# Per-request timings in a Server-Timing header. They show internals, so staff users
+# always get them and everyone else only when this is on (by default, under DEBUG)
+SERVER_TIMING = os.environ.get('SERVER_TIMING', str(DEBUG)) == 'True'
+# Clients allowed to scrape /metrics; unset allows none
+METRICS_ALLOWED_IPS = os.environ['METRICS_ALLOWED_IPS'].split(',') if os.environ.get('METRICS_ALLOWED_IPS') else []
+# Reverse proxies in front of the app. A request from one of them is taken to come
+# from the address it appended to X-Forwarded-For
+TRUSTED_PROXIES = os.environ['TRUSTED_PROXIES'].split(',') if os.environ.get('TRUSTED_PROXIES') else []
@@ -2,9 +2,12 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from dashboard.timing import metrics_view
+
 urlpatterns = [
     path('root/', admin.site.urls),
     path('', include("landing.urls")),
     path('admin/', include("dashboard.urls")),
-    path('public/', include("public.urls"))
+    path('public/', include("public.urls")),
+    path('metrics', metrics_view),
 ]
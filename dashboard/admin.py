@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Produce
+from .models import Mandi, Produce
 
 # Register your models here.
-admin.site.register(Produce)
\ No newline at end of file
+admin.site.register(Produce)
+# Markets the geocoder misplaced can be corrected here
+admin.site.register(Mandi)
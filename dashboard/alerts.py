@@ -0,0 +1,94 @@
+"""Price alerts, checked against every market price refresh.
+
+Active alerts are indexed by (commodity, state) and direction, each list
+sorted by threshold. A refresh is one pass over the records to find each
+(commodity, state)'s lowest and highest modal price, then a bisect per
+direction to find the alerts those prices set off, rather than comparing
+every record with every alert. An alert fires once and stays off until
+the farmer re-arms it.
+"""
+from bisect import bisect_left, bisect_right
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .commodities import normalize
+from .models import PriceAlert
+
+def state_key(state):
+    # The price API's state names arrive with '+' for spaces and mixed case
+    return " ".join(str(state).replace("+", " ").split()).lower()
+
+
+class AlertIndex:
+    """{(commodity, state): (sorted thresholds, alert ids)} for each direction."""
+
+    def __init__(self, alerts):
+        """`alerts`: (id, commodity, state, direction, threshold), in threshold order."""
+        self.index = {PriceAlert.ABOVE: {}, PriceAlert.BELOW: {}}
+        for alert_id, commodity, state, direction, threshold in alerts:
+            thresholds, ids = self.index[direction].setdefault((commodity, state_key(state)), ([], []))
+            thresholds.append(threshold)
+            ids.append(alert_id)
+
+    @classmethod
+    def load(cls):
+        return cls(PriceAlert.objects.filter(active=True).order_by('threshold').values_list(
+            'id', 'commodity', 'state', 'direction', 'threshold',
+        ))
+
+    def rising(self, key, price):
+        """Ids of ABOVE alerts with threshold <= price."""
+        thresholds, ids = self.index[PriceAlert.ABOVE].get(key, ((), ()))
+        return ids[:bisect_right(thresholds, price)]
+
+    def falling(self, key, price):
+        """Ids of BELOW alerts with threshold >= price."""
+        thresholds, ids = self.index[PriceAlert.BELOW].get(key, ((), ()))
+        return ids[bisect_left(thresholds, price):]
+
+
+def price_ranges(records):
+    """{(commodity, state): (lowest, highest)} as (modal price, market) pairs."""
+    ranges = {}
+    for record in records:
+        commodity = normalize(record.get("commodity", ""))
+        try:
+            price = Decimal(str(record.get("modal_price")))
+        except InvalidOperation:
+            continue
+        if commodity is None or not price.is_finite():
+            continue
+        key = (commodity, state_key(record.get("state", "")))
+        found = (price, record.get("market", ""))
+        low, high = ranges.get(key, (found, found))
+        ranges[key] = (min(low, found), max(high, found))
+    return ranges
+
+
+def evaluate(records, index=None):
+    """Fire the alerts the records set off. Returns {alert id: (price, market)}."""
+    index = index or AlertIndex.load()
+    fired = {}
+    for key, (low, high) in price_ranges(records).items():
+        for alert_id in index.rising(key, high[0]):
+            fired[alert_id] = high
+        for alert_id in index.falling(key, low[0]):
+            fired[alert_id] = low
+    if not fired:
+        return fired
+
+    by_record = {}
+    for alert_id, found in fired.items():
+        by_record.setdefault(found, []).append(alert_id)
+    now = timezone.now()
+    with transaction.atomic():
+        # One UPDATE per distinct (price, market); active=True keeps a concurrent
+        # refresh from firing an alert twice
+        for (price, market), alert_ids in by_record.items():
+            PriceAlert.objects.filter(id__in=alert_ids, active=True).update(
+                active=False, triggered_at=now, triggered_price=price, triggered_market=market[:255],
+            )
+    return fired
+
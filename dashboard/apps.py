@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def install_search(sender, using, **kwargs):
+    from .search import install
+
+    install(connections[using])
 
 
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .timing import install_db_timing
+
+        connection_created.connect(install_db_timing)
+
+        post_migrate.connect(install_search, sender=self)
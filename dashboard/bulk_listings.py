@@ -0,0 +1,66 @@
+"""Bulk produce listing from a CSV upload.
+
+The upload is validated in chunks with the same form as a single listing,
+and inserted with one bulk_create inside one transaction: either every row
+is listed or none is, and the farmer gets every row's errors at once.
+"""
+from django.db import transaction
+
+from landing.models import User
+from . import matching, rollups
+from .cachekeys import invalidate_tags
+from .commodities import commodity_for
+from .csv_upload import CSVUploadError, chunks, read_rows
+from .forms import CropProduceListForm
+from .models import Produce
+from .stats import record_listings_created
+
+COLUMNS = ("name", "price", "quantity")
+MAX_ROWS = 5000
+CHUNK_SIZE = 500
+UNIT = "quintals"
+
+
+def validate(rows, farmer_id):
+    """Validate rows chunk by chunk. Returns (unsaved Produce objects, errors),
+    errors being [{'row': line number, 'errors': {field: [messages]}}]."""
+    produces, errors = [], []
+    for chunk in chunks(rows, CHUNK_SIZE):
+        if len(produces) + len(errors) + len(chunk) > MAX_ROWS:
+            raise CSVUploadError(f"At most {MAX_ROWS} listings per upload")
+        for line, row in chunk:
+            form = CropProduceListForm({column: (row.get(column) or "").strip() for column in COLUMNS})
+            if not form.is_valid():
+                errors.append({"row": line, "errors": form.errors.get_json_data()})
+                continue
+            produces.append(Produce(
+                **form.cleaned_data,
+                commodity=commodity_for(form.cleaned_data["name"]),
+                farmer_id=farmer_id,
+                unit=UNIT,
+            ))
+    return produces, errors
+
+
+def create_listings(farmer_id, produces):
+    """Insert validated listings in one transaction and account for them."""
+    with transaction.atomic():
+        created = Produce.objects.bulk_create(produces, batch_size=CHUNK_SIZE)
+        latest = created[-1]
+        if latest.pk is None:
+            # Backends that can't return ids from a bulk insert
+            latest = Produce.objects.filter(farmer_id=farmer_id).order_by('-id').first()
+        # bulk_create skips the Produce signals; do their work once for the batch
+        record_listings_created(farmer_id, sum(1 for produce in created if produce.quantity > 0), latest)
+        rollups.listings_created(User.objects.values_list('state', flat=True).get(id=farmer_id), created)
+        matching.sync_on_commit(produce.id for produce in created if produce.id is not None)
+        transaction.on_commit(lambda: invalidate_tags(f"listings:farmer:{farmer_id}", "listings"))
+    return created
+
+
+def import_listings(upload, farmer_id):
+    """(created listings, errors). Nothing is created if any row is invalid."""
+    produces, errors = validate(read_rows(upload, COLUMNS), farmer_id)
+    if errors or not produces:
+        return [], errors
+    return create_listings(farmer_id, produces), []
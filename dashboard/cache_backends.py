@@ -0,0 +1,325 @@
+"""Cache backends shared by all worker processes.
+
+Values are stored as tagged JSON rather than pickles, so cached entries stay
+small and never carry whole model instances. Every backend counts per key
+prefix hits, misses and bytes written (``cache_stats``, exported with the
+other metrics by ``dashboard.timing.metrics_view``), and times each
+operation (see ``dashboard.timing``).
+"""
+import datetime
+import decimal
+import functools
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache as DjangoRedisCache
+from prometheus_client import Counter
+
+from . import timing
+
+_PREFIX_RE = re.compile(r"[A-Za-z]+(?:_[A-Za-z]+)*")
+
+
+def key_prefix(key):
+    match = _PREFIX_RE.match(str(key))
+    return match.group(0) if match else "other"
+
+
+CACHE_GETS = Counter("cache_gets", "Cache reads by key prefix", ["prefix", "result"])
+CACHE_SETS = Counter("cache_sets", "Cache writes by key prefix", ["prefix"])
+CACHE_SET_BYTES = Counter("cache_set_bytes", "Bytes written to the cache by key prefix", ["prefix"])
+
+
+class CacheStats:
+    """Prometheus counters keyed by cache key prefix (e.g. 'weather', 'user')."""
+
+    def __init__(self):
+        # labels() takes a lock and builds a key on every call; reads are frequent
+        self._children = {}
+
+    def _child(self, metric, *labels):
+        child = self._children.get((metric, labels))
+        if child is None:
+            child = self._children[(metric, labels)] = metric.labels(*labels)
+        return child
+
+    def record_get(self, key, hit):
+        self._child(CACHE_GETS, key_prefix(key), "hit" if hit else "miss").inc()
+
+    def record_set(self, key, size):
+        prefix = key_prefix(key)
+        self._child(CACHE_SETS, prefix).inc()
+        self._child(CACHE_SET_BYTES, prefix).inc(size)
+
+
+cache_stats = CacheStats()
+
+
+def _encode(obj):
+    if isinstance(obj, datetime.datetime):
+        return {"__dt__": obj.isoformat()}
+    if isinstance(obj, datetime.date):
+        return {"__d__": obj.isoformat()}
+    if isinstance(obj, decimal.Decimal):
+        return {"__dec__": str(obj)}
+    if isinstance(obj, uuid.UUID):
+        return {"__uuid__": obj.hex}
+    raise TypeError(f"{type(obj).__name__} is not cacheable; cache a dict projection instead")
+
+
+def _decode(obj):
+    if len(obj) == 1:
+        if "__dt__" in obj:
+            return datetime.datetime.fromisoformat(obj["__dt__"])
+        if "__d__" in obj:
+            return datetime.date.fromisoformat(obj["__d__"])
+        if "__dec__" in obj:
+            return decimal.Decimal(obj["__dec__"])
+        if "__uuid__" in obj:
+            return uuid.UUID(obj["__uuid__"])
+    return obj
+
+
+class JSONSerializer:
+    """Compact JSON with tags for datetimes, decimals and UUIDs.
+
+    Plain ints are passed through untouched so Redis INCR keeps working.
+    """
+
+    def dumps(self, obj):
+        if type(obj) is int:
+            return obj
+        return json.dumps(obj, default=_encode, separators=(",", ":")).encode()
+
+    def loads(self, data):
+        try:
+            return int(data)
+        except ValueError:
+            return json.loads(data, object_hook=_decode)
+
+
+class InstrumentedCacheMixin:
+    """Adds per-prefix hit/miss/size accounting to a Django cache backend."""
+
+    _stats_serializer = JSONSerializer()
+
+    def _value_size(self, value):
+        try:
+            return len(self._stats_serializer.dumps(value))
+        except TypeError:
+            return 0
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing_key, version=version)
+        cache_stats.record_get(key, value is not self._missing_key)
+        return default if value is self._missing_key else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cache_stats.record_set(key, self._value_size(value))
+        return super().set(key, value, timeout=timeout, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = super().add(key, value, timeout=timeout, version=version)
+        if added:
+            cache_stats.record_set(key, self._value_size(value))
+        return added
+
+
+TIMED_OPERATIONS = ("get", "get_many", "set", "set_many", "add", "delete", "delete_many", "touch", "has_key", "incr")
+
+
+def _timed(name, method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with timing.timed("cache", name):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def timed_operations(cls):
+    """Class decorator: time each of a backend's TIMED_OPERATIONS."""
+    for name in TIMED_OPERATIONS:
+        setattr(cls, name, _timed(name, getattr(cls, name)))
+    return cls
+
+
+@timed_operations
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    """Per-process cache; only suitable for a single worker."""
+
+
+@timed_operations
+class RedisCache(InstrumentedCacheMixin, DjangoRedisCache):
+    """Django's Redis backend with JSON instead of pickle. Works against any
+    server speaking the Redis protocol."""
+
+    def __init__(self, server, params):
+        params = {**params, "OPTIONS": {"serializer": JSONSerializer, **params.get("OPTIONS", {})}}
+        super().__init__(server, params)
+
+    def get_many(self, keys, version=None):
+        # Django's Redis backend reads and writes many keys natively, not through get/set
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        for key in keys:
+            cache_stats.record_get(key, key in found)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            cache_stats.record_set(key, self._value_size(value))
+        return super().set_many(data, timeout=timeout, version=version)
+
+
+@timed_operations
+class SQLiteCache(BaseCache):
+    """Cache in a local SQLite file, shared by every worker on the host.
+
+    WAL mode lets readers proceed while one process writes; `add` is a single
+    conditional upsert, so it is safe to use as a cross-process lock.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = str(location)
+        self._local = threading.local()
+        self._serializer = JSONSerializer()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _dumps(self, value):
+        data = self._serializer.dumps(value)
+        return str(data).encode() if type(data) is int else data
+
+    def _maybe_cull(self, conn, now):
+        if random.random() < 1 / self._cull_frequency:
+            conn.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (now,))
+            (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+            if count > self._max_entries:
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)",
+                    (count - self._max_entries,),
+                )
+
+    def get(self, key, default=None, version=None):
+        raw_key = key
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        cache_stats.record_get(raw_key, row is not None)
+        return default if row is None else self._serializer.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        placeholders = ",".join("?" * len(key_map))
+        rows = self._connection().execute(
+            f"SELECT key, value FROM cache WHERE key IN ({placeholders}) AND (expires IS NULL OR expires > ?)",
+            (*key_map, time.time()),
+        ).fetchall()
+        found = {key_map[key]: self._serializer.loads(value) for key, value in rows}
+        for key in keys:
+            cache_stats.record_get(key, key in found)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw_key = key
+        key = self.make_and_validate_key(key, version=version)
+        data = self._dumps(value)
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, data, self.get_backend_timeout(timeout)),
+        )
+        cache_stats.record_set(raw_key, len(data))
+        self._maybe_cull(conn, time.time())
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw_key = key
+        key = self.make_and_validate_key(key, version=version)
+        data = self._dumps(value)
+        now = time.time()
+        # Only overwrite a row that has already expired
+        cursor = self._connection().execute(
+            "INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires "
+            "WHERE cache.expires IS NOT NULL AND cache.expires <= ?",
+            (key, data, self.get_backend_timeout(timeout), now),
+        )
+        added = cursor.rowcount == 1
+        if added:
+            cache_stats.record_set(raw_key, len(data))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            "UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            "SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = self._serializer.loads(row[0]) + delta
+            conn.execute("UPDATE cache SET value = ? WHERE key = ?", (self._dumps(value), key))
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+    def prefix_sizes(self):
+        """Entry count and stored bytes per key prefix across all workers."""
+        sizes = {}
+        rows = self._connection().execute(
+            "SELECT key, length(value) FROM cache WHERE expires IS NULL OR expires > ?", (time.time(),)
+        )
+        for key, size in rows:
+            # Stored keys look like '<KEY_PREFIX>:<version>:<key>'
+            entry = sizes.setdefault(key_prefix(key.split(":", 2)[-1]), {"entries": 0, "bytes": 0})
+            entry["entries"] += 1
+            entry["bytes"] += size
+        return dict(sorted(sizes.items()))
@@ -0,0 +1,72 @@
+"""Registry of everything the app keeps in the cache.
+
+Each CacheEntity declares its key schema, schema version, TTL and tags. The
+stored key embeds the current version of every tag, so bumping a tag (see
+``invalidate_tags``) makes all entries carrying it unreachable at once,
+without having to know their keys. Every entity is also tagged with its own
+name.
+"""
+import time
+
+from django.core.cache import cache
+
+TAG_PREFIX = "tag:"
+
+registry = {}
+
+
+def _tag_versions(tags):
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # First use, or evicted: any fresh value is safe since it can't match an old entry
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_tags(*tags):
+    cache.set_many({TAG_PREFIX + tag: time.time_ns() for tag in tags}, timeout=None)
+
+
+class CacheEntity:
+    def __init__(self, name, key, version, timeout, tags=()):
+        self.name = name
+        self.key_schema = key
+        self.version = version
+        self.timeout = timeout
+        self.tag_schemas = (name, *tags)
+        registry[name] = self
+
+    def tags(self, **params):
+        return [tag.format(**params) for tag in self.tag_schemas]
+
+    def key(self, **params):
+        stamp = ".".join(str(v) for v in _tag_versions(self.tags(**params)))
+        return f"{self.key_schema.format(**params)}:v{self.version}:{stamp}"
+
+    def get(self, default=None, **params):
+        return cache.get(self.key(**params), default)
+
+    def set(self, value, **params):
+        cache.set(self.key(**params), value, timeout=self.timeout)
+
+    def __repr__(self):
+        return f"<CacheEntity {self.name} {self.key_schema} v{self.version}>"
+
+
+USER_PROFILE = CacheEntity("user", "user:{id}", version=4, timeout=86400, tags=("farmer:{id}",))
+GEOCODE = CacheEntity("geocode", "geocode:{pincode}", version=1, timeout=30 * 86400)
+# Coordinates are rounded to ~1 km so neighbouring farms share an entry
+WEATHER = CacheEntity("weather", "weather:{lat:.2f}:{lon:.2f}", version=1, timeout=3600)
+AGRO_NEWS = CacheEntity("agro_news", "agro_news", version=1, timeout=86400)
+MARKET_PRICES = CacheEntity("market_prices", "market_prices", version=1, timeout=3600)
+# Rebuilt from MARKET_PRICES on every refresh (dashboard.market_prices); outlives it so
+# listings keep a reference price while the next refresh is pending
+MARKET_PRICE_INDEX = CacheEntity("market_price_index", "market_price_index", version=1, timeout=7 * 86400,
+                                 tags=("market_prices",))
+FARMER_LISTINGS = CacheEntity("market_stats", "market_stats:{id}", version=2, timeout=86400,
+                              tags=("listings:farmer:{id}",))
+PUBLIC_LISTING_COUNT = CacheEntity("public_listing_count", "public_listing_count", version=1, timeout=86400,
+                                   tags=("listings",))
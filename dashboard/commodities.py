@@ -0,0 +1,183 @@
+"""Commodity vocabulary for listings and mandi prices.
+
+Farmers type listing names freely ("tamatar", "Tomato ", "tomatoes"); the
+data.gov.in price records use Agmarknet commodity names. ``normalize``
+maps the former onto the latter: exact alias lookup first, then trigram
+similarity for typos. A name that only matches as part of a longer one
+("sugar" in "sugarcane") is not taken for it.
+"""
+import re
+from collections import Counter
+from functools import lru_cache
+
+# Agmarknet names as they appear in the data.gov.in records, with common
+# English and Hindi names. Words inside the parentheses and around '/' are
+# aliases as well.
+VOCABULARY = {
+    "Tomato": ["tamatar", "tamater"],
+    "Onion": ["pyaz", "pyaaz", "pyaj", "kanda", "dungri"],
+    "Potato": ["aloo", "alu", "batata"],
+    "Wheat": ["gehun", "gehu", "gahu"],
+    "Rice": ["chawal", "chaval"],
+    "Paddy(Dhan)(Common)": ["paddy", "dhaan"],
+    "Maize": ["makka", "makki", "corn", "bhutta"],
+    "Cauliflower": ["phool gobhi", "phool gobi", "gobhi", "gobi"],
+    "Cabbage": ["patta gobhi", "band gobhi", "patta gobi"],
+    "Brinjal": ["baingan", "bengan", "eggplant", "vangi"],
+    "Green Chilli": ["hari mirch", "mirchi", "mirch", "chilli", "chili"],
+    "Dry Chillies": ["lal mirch", "red chilli"],
+    "Bhindi(Ladies Finger)": ["okra", "ladyfinger", "lady finger", "bhendi"],
+    "Garlic": ["lehsun", "lahsun", "lasun"],
+    "Ginger(Green)": ["adrak", "ginger"],
+    "Turmeric": ["haldi"],
+    "Coriander(Leaves)": ["dhaniya", "dhania", "coriander"],
+    "Carrot": ["gajar"],
+    "Cucumbar(Kheera)": ["cucumber", "khira"],
+    "Peas Wet": ["matar", "mutter", "green peas", "peas"],
+    "Spinach": ["palak"],
+    "Methi(Leaves)": ["fenugreek"],
+    "Sweet Potato": ["shakarkand", "shakarkandi"],
+    "Capsicum": ["shimla mirch", "bell pepper"],
+    "Pumpkin": ["kaddu", "kaddoo"],
+    "Radish": ["mooli", "muli"],
+    "Beetroot": ["chukandar", "beet"],
+    "Bitter gourd": ["karela"],
+    "Bottle gourd": ["lauki", "ghiya", "dudhi"],
+    "Ridgeguard(Tori)": ["ridge gourd", "turai", "torai"],
+    "Drumstick": ["sahjan", "moringa"],
+    "Tapioca": ["cassava"],
+    "Banana": ["kela"],
+    "Apple": ["seb", "saib"],
+    "Mango": ["aam"],
+    "Pomegranate": ["anar"],
+    "Grapes": ["angoor", "angur", "grape"],
+    "Orange": ["santra", "narangi"],
+    "Mousambi(Sweet Lime)": ["mosambi", "musambi"],
+    "Papaya": ["papita"],
+    "Guava": ["amrood", "amrud", "peru"],
+    "Lemon": ["nimbu", "lime"],
+    "Water Melon": ["tarbooz", "tarbuj", "watermelon"],
+    "Pineapple": ["ananas"],
+    "Coconut": ["nariyal"],
+    "Bajra(Pearl Millet/Cumbu)": ["pearl millet"],
+    "Jowar(Sorghum)": ["jwar"],
+    "Ragi (Finger Millet)": ["nachni", "mandua"],
+    "Barley (Jau)": [],
+    "Arhar (Tur/Red Gram)(Whole)": ["toor", "toor dal", "arhar dal", "pigeon pea"],
+    "Bengal Gram(Gram)(Whole)": ["chana", "chickpea", "chick pea"],
+    "Green Gram (Moong)(Whole)": ["mung", "moong dal"],
+    "Black Gram (Urd Beans)(Whole)": ["urad", "urad dal"],
+    "Lentil (Masur)(Whole)": ["masoor", "masoor dal"],
+    "Groundnut": ["moongfali", "mungfali", "peanut"],
+    "Mustard": ["sarson", "rai"],
+    "Soyabean": ["soybean", "soya"],
+    "Sunflower": ["surajmukhi"],
+    "Castor Seed": ["arandi"],
+    "Cotton": ["kapas"],
+    "Jute": ["pat"],
+    "Sugarcane": ["ganna"],
+    "Cumin Seed(Jeera)": ["cumin"],
+    "Black pepper": ["kali mirch", "pepper"],
+    "Cardamoms": ["elaichi", "cardamom"],
+    "Arecanut(Betelnut/Supari)": ["areca"],
+    "Copra": ["dry coconut"],
+}
+
+# Below this trigram similarity a name is left unmatched
+MIN_SIMILARITY = 0.45
+# Letters a typo may add or drop before it reads as a different word
+MAX_TYPO_LETTERS = 2
+
+_SPLIT_RE = re.compile(r"[()/]")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def _singular(word):
+    if len(word) > 4 and word.endswith("oes"):
+        return word[:-2]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def clean(text):
+    """Lowercase, punctuation-free, singular form used for every comparison."""
+    words = _NON_WORD_RE.sub(" ", str(text).lower()).split()
+    return " ".join(_singular(word) for word in words)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Jaccard similarity of the two strings' trigram sets (0..1)."""
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+def _build_aliases():
+    aliases = {}
+    for name, extra in VOCABULARY.items():
+        for alias in [name, *_SPLIT_RE.split(name), *extra]:
+            key = clean(alias)
+            # Generic parts such as 'whole', 'leaves' or 'common' would match too much
+            if key and key not in ("whole", "leave", "common", "green", "gram"):
+                aliases.setdefault(key, name)
+    return aliases
+
+
+ALIASES = _build_aliases()
+_ALIAS_TRIGRAMS = {alias: trigrams(alias) for alias in ALIASES}
+
+
+def _build_trigram_index():
+    # trigram -> aliases containing it, so only aliases sharing a trigram get scored
+    index = {}
+    for alias, grams in _ALIAS_TRIGRAMS.items():
+        for gram in grams:
+            index.setdefault(gram, []).append(alias)
+    return index
+
+
+_TRIGRAM_INDEX = _build_trigram_index()
+
+
+def _different_word(a, b):
+    # One name inside a longer one ("sugar" in "sugarcane") scores like a
+    # typo but is another word; a letter or two either way is still a typo
+    shorter, longer = sorted((a, b), key=len)
+    return shorter in longer and len(longer) - len(shorter) > MAX_TYPO_LETTERS
+
+
+@lru_cache(maxsize=4096)
+def normalize(text):
+    """The data.gov.in commodity name for free text, or None if nothing is close."""
+    key = clean(text)
+    if not key:
+        return None
+    if key in ALIASES:
+        return ALIASES[key]
+    grams = trigrams(key)
+    shared = Counter(alias for gram in grams for alias in _TRIGRAM_INDEX.get(gram, ()))
+    best, best_score = None, MIN_SIMILARITY
+    for alias, count in shared.items():
+        score = count / (len(grams) + len(_ALIAS_TRIGRAMS[alias]) - count)
+        if score > best_score and not _different_word(key, alias):
+            best, best_score = ALIASES[alias], score
+    if best is None:
+        # "Basmati rice", "desi tomato": fall back to any word that is a commodity
+        for word in sorted(key.split(), key=len, reverse=True):
+            if word in ALIASES:
+                return ALIASES[word]
+    return best
+
+
+def commodity_for(text):
+    """What a listing is filed under: its commodity, or its own tidied name."""
+    return normalize(text) or " ".join(str(text).split()).title()[:100]
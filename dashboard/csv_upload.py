@@ -0,0 +1,39 @@
+"""Reading uploaded CSV files row by row for the bulk import paths."""
+import csv
+import io
+import itertools
+
+
+class CSVUploadError(Exception):
+    """The upload as a whole can't be used (bad encoding, missing columns, too many rows)."""
+
+
+def read_rows(upload, columns):
+    """(line number, row dict) for each non-blank data row of an uploaded CSV
+    file. Headers are matched case-insensitively; `columns` must all be present."""
+    try:
+        text = io.TextIOWrapper(getattr(upload, "file", upload), encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(text)
+        headers = [header.strip().lower() for header in reader.fieldnames or []]
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise CSVUploadError(f"Could not read the CSV file: {str(e)}")
+    missing = [column for column in columns if column not in headers]
+    if missing:
+        raise CSVUploadError(f"Missing column(s): {', '.join(missing)}")
+    reader.fieldnames = headers
+    try:
+        for row in reader:
+            if any((value or "").strip() for value in row.values() if isinstance(value, str)):
+                # reader.line_num counts the header and any quoted newlines
+                yield reader.line_num, row
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise CSVUploadError(f"Could not read the CSV file: {str(e)}")
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,56 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.db import connections
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "DASHBOARD_FANOUT_WORKERS", 16),
+    thread_name_prefix="dashboard-fanout",
+)
+
+
+def _run(fn):
+    try:
+        return fn()
+    finally:
+        # Worker threads outlive the request; don't leak their DB connections
+        connections.close_all()
+
+
+class FanOut:
+    """Run independent page sources concurrently, each with its own deadline.
+
+    A source that misses its deadline or raises is replaced by its
+    placeholder; the work itself keeps running so the read-through cache is
+    warm for the next request.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.sources = {}
+
+    def submit(self, name, fn, deadline, placeholder=None):
+        # Carry the request's context over, so the source's work is timed with it
+        context = contextvars.copy_context()
+        self.sources[name] = (_executor.submit(context.run, _run, fn), deadline, placeholder)
+
+    def results(self):
+        results = {}
+        for name, (future, deadline, placeholder) in self.sources.items():
+            remaining = max(0, self.started + deadline - time.monotonic())
+            try:
+                result = future.result(timeout=remaining)
+                results[name] = placeholder if result is None else result
+            except TimeoutError:
+                logger.info(f"Dashboard source '{name}' missed its {deadline}s deadline")
+                results[name] = placeholder
+            except Exception as e:
+                logger.error(f"Dashboard source '{name}' failed: {str(e)}")
+                results[name] = placeholder
+        return results
@@ -0,0 +1,121 @@
+"""Offline modal price forecasts for every market x commodity series.
+
+The history is laid out as one NumPy matrix (series x days, gaps carried
+forward), and every forecaster runs on whole chunks of rows at once:
+
+* seasonal naive: the same weekday last week;
+* simple exponential smoothing, with the smoothing factor picked per
+  series from a small grid by one-step-ahead error.
+
+Each series keeps whichever method did better over the last HORIZON days
+held out, and its hold-out error sets an 80% band. Chunks of series are
+fitted in parallel with joblib. Run nightly by ``manage.py
+forecast_prices``; nothing here runs at request time.
+"""
+import datetime
+
+import numpy as np
+from joblib import Parallel, delayed
+
+HORIZON = 14
+SEASON = 7
+# Days of history a series needs: two seasons to fit on, plus the hold-out
+MIN_HISTORY = 2 * SEASON + HORIZON
+ALPHAS = np.array([0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+# 80% two-sided normal band
+Z_80 = 1.2816
+CHUNK_SIZE = 2000
+
+SEASONAL_NAIVE = "seasonal_naive"
+SMOOTHING = "exp_smoothing"
+
+
+def fill_gaps(y):
+    """Carry each series' last observation forward over NaNs, and its first
+    one back over leading NaNs."""
+    rows = np.arange(y.shape[0])[:, None]
+    observed = ~np.isnan(y)
+    last = np.where(observed, np.arange(y.shape[1]), 0)
+    np.maximum.accumulate(last, axis=1, out=last)
+    filled = y[rows, last]
+    first = y[rows[:, 0], observed.argmax(axis=1)]
+    return np.where(np.isnan(filled), first[:, None], filled)
+
+
+def seasonal_naive(y, horizon):
+    """(n, horizon) forecasts repeating each series' last SEASON days."""
+    steps = np.arange(horizon) % SEASON
+    return y[:, -SEASON:][:, steps]
+
+
+def exp_smoothing(y, horizon):
+    """(n, horizon) flat forecasts from simple exponential smoothing, the
+    smoothing factor chosen per series from ALPHAS."""
+    alphas = ALPHAS[None, :]
+    level = np.repeat(y[:, :1], len(ALPHAS), axis=1)
+    sse = np.zeros_like(level)
+    for t in range(1, y.shape[1]):
+        observed = y[:, t:t + 1]
+        sse += (observed - level) ** 2
+        level += alphas * (observed - level)
+    best = sse.argmin(axis=1)
+    final = level[np.arange(y.shape[0]), best]
+    return np.repeat(final[:, None], horizon, axis=1)
+
+
+METHODS = {
+    SEASONAL_NAIVE: seasonal_naive,
+    SMOOTHING: exp_smoothing,
+}
+
+
+def fit(y, horizon=HORIZON):
+    """Forecast a gap-free (n, days) block. Returns (forecasts, spread, method
+    index): (n, horizon) forecasts, (n,) hold-out RMSE and the index into
+    METHODS each series used."""
+    train, held_out = y[:, :-horizon], y[:, -horizon:]
+    errors = np.stack([
+        np.sqrt(np.mean((method(train, horizon) - held_out) ** 2, axis=1)) for method in METHODS.values()
+    ])
+    chosen = errors.argmin(axis=0)
+    forecasts = np.stack([method(y, horizon) for method in METHODS.values()])
+    rows = np.arange(y.shape[0])
+    return forecasts[chosen, rows], errors[chosen, rows], chosen
+
+
+def _fit_chunk(y, horizon):
+    return fit(fill_gaps(y), horizon)
+
+
+def forecast_all(y, horizon=HORIZON, jobs=-1):
+    """fit() over every row of `y` (NaN for missing days), CHUNK_SIZE rows per
+    job, on `jobs` processes (-1: all cores)."""
+    starts = range(0, y.shape[0], CHUNK_SIZE)
+    if len(starts) <= 1 or jobs == 1:
+        parts = [_fit_chunk(y[start:start + CHUNK_SIZE], horizon) for start in starts]
+    else:
+        parts = Parallel(n_jobs=jobs)(delayed(_fit_chunk)(y[start:start + CHUNK_SIZE], horizon) for start in starts)
+    if not parts:
+        return np.empty((0, horizon)), np.empty(0), np.empty(0, dtype=int)
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+def history_matrix(rows, end, days):
+    """Lay out (series key, date, price) rows as (keys, matrix) covering the
+    `days` days up to `end`. Series with fewer than MIN_HISTORY observed days,
+    or none in the last HORIZON days, are left out."""
+    start = end - datetime.timedelta(days=days - 1)
+    index, series, columns, values = {}, [], [], []
+    for key, date, price in rows:
+        if not start <= date <= end:
+            continue
+        series.append(index.setdefault(key, len(index)))
+        columns.append((date - start).days)
+        values.append(float(price))
+    y = np.full((len(index), days), np.nan)
+    y[series, columns] = values
+
+    observed = ~np.isnan(y)
+    keep = (observed.sum(axis=1) >= MIN_HISTORY) & observed[:, -HORIZON:].any(axis=1)
+    keys = [key for key, position in sorted(index.items(), key=lambda item: item[1])]
+    return [key for key, kept in zip(keys, keep) if kept], y[keep]
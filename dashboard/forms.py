@@ -1,5 +1,8 @@
 from django import forms
 
+from .commodities import normalize
+from .models import PriceAlert
+
 SOIL_TYPES =  [
     ('Sandy', 'Sandy'),
     ('Loamy', 'Loamy'),
@@ -75,4 +78,41 @@ class CropProduceListForm(forms.Form):
     quantity = forms.IntegerField(label="Available Quantity (in quintals)",widget=forms.TextInput(attrs={
         'class': 'form-control',
         'placeholder': 'Enter the available produce quantity'
-        }))
\ No newline at end of file
+        }))
+
+
+class BulkProduceUploadForm(forms.Form):
+    file = forms.FileField(label="Listings CSV (columns: name, price, quantity)", widget=forms.ClearableFileInput(attrs={
+        'class': 'form-control',
+        'accept': '.csv,text/csv'
+        }))
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if upload.size > 2 * 1024 * 1024:
+            raise forms.ValidationError("The CSV file must be under 2 MB")
+        return upload
+
+
+class PriceAlertForm(forms.Form):
+    commodity = forms.CharField(label="Commodity", max_length=100, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Enter the commodity to watch'
+        }))
+    direction = forms.ChoiceField(label="Alert me when the modal price", choices=PriceAlert.DIRECTION_CHOICES, widget=forms.Select(attrs={
+        'class': 'form-control'
+        }))
+    threshold = forms.DecimalField(label="Price (Rs/quintal)", max_digits=10, decimal_places=2, min_value=0, widget=forms.NumberInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Enter the price to watch for'
+        }))
+    state = forms.CharField(label="State", required=False, max_length=100, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Defaults to your state'
+        }))
+
+    def clean_commodity(self):
+        commodity = normalize(self.cleaned_data['commodity'])
+        if commodity is None:
+            raise forms.ValidationError("Unknown commodity")
+        return commodity
@@ -7,6 +7,9 @@ from dotenv import load_dotenv
 import base64
 from google import genai
 from google.genai import types
+from . import simulator
+from .providers import get_provider
+from .ratelimit import RateLimitExceeded
 
 # Load environment variables
 load_dotenv()
@@ -25,10 +28,7 @@ def getWeatherDetails(coords):
     try:
         lat, lon = coords[0], coords[1]
         weather_url = f"http://api.weatherapi.com/v1/current.json?key={weather_api_key}&q={lat},{lon}&aqi=no"
-        response = requests.get(weather_url, timeout=10)
-        response.raise_for_status()  # Raise HTTP errors (e.g., 404, 500)
-
-        data = response.json()
+        data = get_provider("weather").get_json(weather_url)
         if "error" in data:
             print(f"Error: {data['error']['message']}")
             return None
@@ -52,10 +52,7 @@ def getWeatherDetails(coords):
 def getAgroNews():
     try:
         newsapi_url = f"https://newsapi.org/v2/everything?q=agriculture&apiKey={newsapi_api_key}"
-        response = requests.get(newsapi_url, timeout=10)
-        response.raise_for_status()
-
-        data = response.json()
+        data = get_provider("news").get_json(newsapi_url)
         return data.get("articles", [])[:20]
 
     except requests.exceptions.RequestException as e:
@@ -88,17 +85,19 @@ def getFertilizerRecommendation(model, nitrogen, phosphorus, potassium, temp, hu
 def getMarketPricesAllStates():
     states = ["Kerala", "Uttrakhand", "Uttar Pradesh", "Rajasthan", "Nagaland", "Gujarat", "Maharashtra", "Tripura", "Punjab", "Bihar", "Telangana", "Meghalaya"]
     final_list = []
+    provider = get_provider("govdata")
 
     for state in states:
         try:
             state = state.replace(" ", "+")
             govdata_url = f"https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070?api-key={govdata_api_key}&format=json&filters%5Bstate%5D={state}"
-            response = requests.get(govdata_url, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = provider.get_json(govdata_url)
             final_list.extend(data.get("records", []))
 
+        except RateLimitExceeded as e:
+            # A partial country list would replace the full cached one; return nothing so the cache is served
+            print(f"Quota exhausted in getMarketPricesAllStates ({state}): {e}")
+            return []
         except requests.exceptions.RequestException as e:
             print(f"Network Error in getMarketPricesAllStates ({state}): {e}")
         except KeyError:
@@ -106,10 +105,21 @@ def getMarketPricesAllStates():
 
     return final_list
 
+_gemini_client = None
+
+def getGeminiClient():
+    global _gemini_client
+    if _gemini_client is None:
+        _gemini_client = genai.Client(api_key=palm_api_key)
+    return _gemini_client
+
 # 🟢 Get AI Response from Google Gemini
 def GetResponse(query):
     try:
-        client = genai.Client(api_key=os.environ.get('GOOGLE_GEMINI_API_KEY'))
+        if simulator.is_enabled():
+            return get_provider("gemini").call(simulator.gemini_response, query)
+
+        client = getGeminiClient()
         model = "gemini-2.0-flash"
         contents = [
             types.Content(
@@ -126,15 +136,18 @@ def GetResponse(query):
             system_instruction="You are a farmer assistance helper. Help with agriculture practices.",
         )
         
-        complete_response = ""
-        for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if chunk.text:
-                complete_response += chunk.text
-        return complete_response
+        def stream_response():
+            complete_response = ""
+            for chunk in client.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=generate_content_config,
+            ):
+                if chunk.text:
+                    complete_response += chunk.text
+            return complete_response
+
+        return get_provider("gemini").call(stream_response)
 
     except Exception as e:
         print(f"Error in GetResponse: {e}")
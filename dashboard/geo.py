@@ -0,0 +1,191 @@
+"""Distance helpers for farm and listing coordinates (degrees, WGS84)."""
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat, lon, km):
+    """(min_lat, max_lat, min_lon, max_lon) enclosing every point within `km`.
+
+    The box is a cheap indexed pre-filter; callers still check the exact
+    distance.
+    """
+    dlat = math.degrees(km / EARTH_RADIUS_KM)
+    # Longitude degrees shrink towards the poles
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, dlat / cos_lat)
+    return max(-90.0, lat - dlat), min(90.0, lat + dlat), lon - dlon, lon + dlon
+
+
+# 🟢 Geohash
+# Stored hashes are GEOHASH_PRECISION characters (~5 m cells); searches use
+# a shorter prefix sized to the radius, and a prefix is a contiguous range of
+# stored hashes, so each cell is one index range scan.
+
+GEOHASH_PRECISION = 9
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: i for i, char in enumerate(_BASE32)}
+
+
+def encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate longitude, latitude, starting with longitude
+        interval, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def decode_bounds(geohash):
+    """(min_lat, max_lat, min_lon, max_lon) of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            mid = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = mid
+            else:
+                interval[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def cell_size_deg(precision):
+    """(height, width) of a geohash cell in degrees."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def _covered_km(lat, precision):
+    """Radius around any point in a cell that its 3x3 block is sure to cover."""
+    height, width = cell_size_deg(precision)
+    # Measure width at the cell edge nearest the pole, where it is narrowest
+    far_lat = min(90.0, abs(lat) + height)
+    return min(math.radians(height), math.radians(width) * math.cos(math.radians(far_lat))) * EARTH_RADIUS_KM
+
+
+def precision_for_radius(lat, km):
+    """Longest prefix whose 3x3 block around (lat, ·) covers `km`, or 0 if none does."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if _covered_km(lat, precision) >= km:
+            return precision
+    return 0
+
+
+def neighbours(geohash):
+    """The cell and its eight neighbours at the same precision (fewer at the poles)."""
+    min_lat, max_lat, min_lon, max_lon = decode_bounds(geohash)
+    height, width = max_lat - min_lat, max_lon - min_lon
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    cells = []
+    for dlat in (-height, 0, height):
+        lat = center_lat + dlat
+        if not -90 < lat < 90:
+            continue
+        for dlon in (-width, 0, width):
+            lon = (center_lon + dlon + 180) % 360 - 180
+            cell = encode(lat, lon, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def _cells_q(field, lat, lon, precision):
+    query = Q()
+    for cell in neighbours(encode(lat, lon, precision)):
+        # '~' sorts after every base32 character
+        query |= Q(**{f"{field}__gte": cell, f"{field}__lt": cell + "~"})
+    return query
+
+
+def within_q(field, lat, lon, km):
+    """Q matching rows whose geohash `field` lies in cells that cover `km` around
+    (lat, lon), or None when the radius is too large to narrow anything."""
+    precision = precision_for_radius(lat, km)
+    return _cells_q(field, lat, lon, precision) if precision else None
+
+
+def within(queryset, lat, lon, km, fields=("geohash", "latitude", "longitude")):
+    """{pk: distance_km} for rows of `queryset` within `km` of (lat, lon).
+
+    `fields` names the geohash, latitude and longitude fields. Only those
+    columns are read, and only from the cells around the point.
+    """
+    geohash_field, lat_field, lon_field = fields
+    cells = within_q(geohash_field, lat, lon, km)
+    if cells is not None:
+        queryset = queryset.filter(cells)
+    else:
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, km)
+        queryset = queryset.filter(**{
+            f"{lat_field}__range": (min_lat, max_lat),
+            f"{lon_field}__range": (min_lon, max_lon),
+        })
+    found = {}
+    for pk, row_lat, row_lon in queryset.order_by().values_list("pk", lat_field, lon_field):
+        distance = haversine_km(lat, lon, row_lat, row_lon)
+        if distance <= km:
+            found[pk] = distance
+    return found
+
+
+# Cells finer than ~1 km rarely hold k rows, so the search starts here
+_NEAREST_START_PRECISION = 6
+
+
+def nearest(queryset, lat, lon, k, fields=("geohash", "latitude", "longitude")):
+    """The `k` rows of `queryset` closest to (lat, lon), nearest first, each
+    with a `distance_km` attribute.
+
+    Widens the cells around the point until k rows fall inside the radius
+    those cells are sure to cover. Candidates are ranked from their
+    coordinates alone; only the winners are loaded as objects.
+    """
+    geohash_field, lat_field, lon_field = fields
+    candidates = queryset.order_by().values_list("pk", lat_field, lon_field)
+    for precision in range(_NEAREST_START_PRECISION, 0, -1):
+        ranked = _by_distance(candidates.filter(_cells_q(geohash_field, lat, lon, precision)), lat, lon)
+        covered = _covered_km(lat, precision)
+        if sum(1 for distance, _ in ranked if distance <= covered) >= k:
+            break
+    else:
+        ranked = _by_distance(candidates.exclude(**{geohash_field: ""}), lat, lon)
+
+    ranked = ranked[:k]
+    rows = queryset.in_bulk([pk for _, pk in ranked])
+    results = []
+    for distance, pk in ranked:
+        row = rows[pk]
+        row.distance_km = distance
+        results.append(row)
+    return results
+
+
+def _by_distance(candidates, lat, lon):
+    return sorted((haversine_km(lat, lon, row_lat, row_lon), pk) for pk, row_lat, row_lon in candidates)
@@ -0,0 +1,79 @@
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.matching import ASK, BID, Engine
+from dashboard.management.commands.bench_views import percentile
+
+
+class Command(BaseCommand):
+    help = "Measure order-book matching throughput, then replay the log and check the books match"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=100000)
+        parser.add_argument("--commodities", type=int, default=20)
+        parser.add_argument("--cancel-rate", type=float, default=0.1, help="Share of operations that cancel a resting order")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--log", help="Log file to write (default: a temporary file)")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        commodities = [f"commodity-{i}" for i in range(options["commodities"])]
+        mid = {commodity: rng.randint(1000, 5000) for commodity in commodities}
+        operations = []
+        for _ in range(options["orders"]):
+            commodity = rng.choice(commodities)
+            side = rng.choice((BID, ASK))
+            # Prices straddle the mid so about half the orders cross
+            price = mid[commodity] + rng.randint(-50, 50) + (10 if side == BID else -10)
+            operations.append((rng.random() < options["cancel_rate"], commodity, side, price, rng.randint(1, 50)))
+
+        log_path = options["log"] or tempfile.mkstemp(suffix=".jsonl")[1]
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        engine = Engine(log_path)
+        resting = {commodity: [] for commodity in commodities}
+        latencies, fills = [], 0
+
+        started = time.perf_counter()
+        for cancel, commodity, side, price, quantity in operations:
+            op_started = time.perf_counter()
+            if cancel and resting[commodity]:
+                order_ids = resting[commodity]
+                index = rng.randrange(len(order_ids))
+                order_ids[index], order_ids[-1] = order_ids[-1], order_ids[index]
+                engine.cancel(commodity, order_ids.pop())
+            else:
+                entry, filled = engine.submit(commodity, side, price, quantity)
+                fills += len(filled)
+                if entry.quantity > 0:
+                    resting[commodity].append(entry.id)
+            latencies.append(time.perf_counter() - op_started)
+        elapsed = time.perf_counter() - started
+        engine.close()
+
+        self.stdout.write(
+            f"{len(operations)} operations in {elapsed:.2f}s: {len(operations) / elapsed:,.0f} ops/s, {fills} fills, "
+            f"p50={percentile(latencies, 50) * 1e6:.0f}us p99={percentile(latencies, 99) * 1e6:.0f}us "
+            f"max={max(latencies) * 1e6:.0f}us"
+        )
+        self.stdout.write(f"log: {os.path.getsize(log_path) / 1e6:.1f} MB at {log_path}")
+
+        expected = engine.snapshot()
+        started = time.perf_counter()
+        replayed = Engine(log_path)
+        self.stdout.write(
+            f"replay and compaction: {time.perf_counter() - started:.2f}s, "
+            f"{sum(len(orders) for orders in expected.values())} resting orders, "
+            f"compacted log {os.path.getsize(log_path) / 1e6:.1f} MB"
+        )
+        replayed.close()
+        if replayed.snapshot() != expected:
+            raise CommandError("Replayed books differ from the live ones")
+        self.stdout.write(self.style.SUCCESS("Replayed books match"))
+        if not options["log"]:
+            os.remove(log_path)
+            os.remove(f"{log_path}.lock")
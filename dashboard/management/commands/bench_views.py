@@ -0,0 +1,97 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+
+from dashboard import simulator
+from dashboard.cachekeys import invalidate_tags
+from dashboard.providers import provider_snapshot
+from dashboard.models import ListingStats
+from landing.models import User
+
+VIEWS = {
+    "home": ("get", "/admin/", None),
+    "prices": ("get", "/admin/prices/", None),
+    "help": ("post", "/admin/help/", {"userinput": "How do I improve soil nitrogen?"}),
+}
+
+
+# Not a valid Indian mobile number, so it can't be a real farmer's
+BENCH_PHONE = "+910000000000"
+
+COLD_ENTITIES = ["geocode", "weather", "agro_news", "market_prices", "user", "market_stats", "public_listing_count"]
+
+
+def remove_bench_farmer():
+    # The requests run on their own connections, so the farmer has to be
+    # committed rather than rolled back; this deletes it and its stats row
+    ids = list(User.objects.filter(phone=BENCH_PHONE).values_list('id', flat=True))
+    ListingStats.objects.filter(farmerid__in=ids).delete()
+    User.objects.filter(id__in=ids).delete()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Measure dashboard view latency against the offline provider simulator"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--views", nargs="+", choices=sorted(VIEWS), default=sorted(VIEWS))
+        parser.add_argument("--requests", type=int, default=50, help="Requests per view")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--cold", action="store_true", help="Invalidate cached provider data before each view")
+        parser.add_argument("--allow-live", action="store_true", help="Run even if the simulator is off")
+
+    def handle(self, *args, **options):
+        if not simulator.is_enabled() and not options["allow_live"]:
+            raise CommandError("Set PROVIDER_SIMULATOR=True (or pass --allow-live to hit real providers)")
+
+        # A run killed before its cleanup leaves its farmer behind
+        remove_bench_farmer()
+        farmer = User.objects.create(
+            name="Bench Farmer", phone=BENCH_PHONE, pincode=110001,
+            farmname="Bench Farm", farmarea=1,
+        )
+        try:
+            for name in options["views"]:
+                if options["cold"]:
+                    # Drop provider data but keep quota buckets and sessions
+                    invalidate_tags(*COLD_ENTITIES)
+                self.run_view(name, farmer, options["requests"], options["concurrency"])
+        finally:
+            remove_bench_farmer()
+
+        for name, snapshot in provider_snapshot().items():
+            self.stdout.write(f"  provider {name}: " + " ".join(f"{k}={v}" for k, v in snapshot.items()))
+
+    def run_view(self, name, farmer, requests, concurrency):
+        method, path, data = VIEWS[name]
+
+        def one_request(_):
+            client = Client(HTTP_HOST="localhost")
+            session = client.session
+            session["member_logged_id"] = farmer.id
+            session.save()
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data) if data else getattr(client, method)(path)
+            elapsed = time.perf_counter() - start
+            connections.close_all()
+            return elapsed, response.status_code
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one_request, range(requests)))
+
+        latencies = [elapsed * 1000 for elapsed, _ in results]
+        errors = sum(1 for _, status in results if status >= 400 or status == 302)
+        self.stdout.write(
+            f"{name}: n={len(latencies)} errors={errors} "
+            f"p50={percentile(latencies, 50):.1f}ms p95={percentile(latencies, 95):.1f}ms "
+            f"p99={percentile(latencies, 99):.1f}ms max={max(latencies):.1f}ms "
+            f"mean={statistics.mean(latencies):.1f}ms"
+        )
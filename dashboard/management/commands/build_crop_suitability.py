@@ -0,0 +1,118 @@
+import time
+from collections import Counter
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Avg, Max
+from django.utils import timezone
+
+from dashboard import geo, suitability
+from dashboard.models import CropSuitability
+from landing.login_cfg import GetLocation
+from landing.models import User
+
+
+class Command(BaseCommand):
+    help = "Score every pincode's typical conditions with the crop recommendation model and store its best crops"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", help="CSV of typical conditions: a region column (pincode or state) "
+                                               "and any of " + ", ".join(suitability.FEATURES))
+        parser.add_argument("--top", type=int, default=suitability.TOP_K, help="Crops kept per pincode")
+        parser.add_argument("--jobs", type=int, default=-1, help="Worker processes (-1: all cores)")
+        parser.add_argument("--no-weather", action="store_true",
+                            help="Don't fetch current weather for climate the profiles leave out")
+        parser.add_argument("--benchmark", type=int, metavar="PINCODES",
+                            help="Score this many synthetic pincodes instead, without touching the database")
+
+    def handle(self, *args, **options):
+        model = suitability.load_model()
+        if options["benchmark"]:
+            return self.benchmark(model, options["benchmark"], options["jobs"])
+
+        profiles = suitability.load_profiles(options["profiles"]) if options["profiles"] else {}
+        regions = {
+            row['pincode']: (row['state'], row['latitude'], row['longitude'])
+            for row in User.objects.values('pincode').annotate(
+                state=Max('state'), latitude=Avg('latitude'), longitude=Avg('longitude'),
+            ).order_by()
+        }
+        # Pincodes officers profiled that no farmer has registered from yet
+        for pincode in profiles.keys() - regions.keys():
+            if isinstance(pincode, int):
+                state, country, lat, lon = GetLocation(pincode)
+                regions[pincode] = (state, lat, lon)
+        pincodes = sorted(regions)
+        cells = {
+            pincode: geo.encode(lat, lon, suitability.CLIMATE_PRECISION)
+            for pincode, (state, lat, lon) in regions.items() if lat is not None
+        }
+
+        climate = {}
+        if not options["no_weather"]:
+            climate = suitability.current_climate(set(cells.values()))
+        fallback = suitability.defaults()
+        rows, sources = [], []
+        for pincode in pincodes:
+            state, lat, lon = regions[pincode]
+            weather = climate.get(cells.get(pincode))
+            features, source = suitability.profile_for(pincode, state, profiles, fallback, weather)
+            rows.append(features)
+            sources.append(source)
+
+        started = time.perf_counter()
+        scores = suitability.score(model, np.array(rows, dtype=float).reshape(-1, len(suitability.FEATURES)),
+                                   jobs=options["jobs"])
+        scored = time.perf_counter() - started
+
+        computed_at = timezone.now()
+        objs = [
+            CropSuitability(
+                pincode=pincode,
+                state=regions[pincode][0],
+                latitude=regions[pincode][1],
+                longitude=regions[pincode][2],
+                rank=rank,
+                crop=crop,
+                probability=round(probability, 4),
+                source=source,
+                computed_at=computed_at,
+            )
+            for pincode, source, crops in zip(
+                pincodes, sources, suitability.top_crops(scores, model.classes_, options["top"]),
+            )
+            for rank, (crop, probability) in enumerate(crops, 1)
+        ]
+        with transaction.atomic():
+            # The map never sees a half-written set
+            CropSuitability.objects.all().delete()
+            CropSuitability.objects.bulk_create(objs, batch_size=1000)
+
+        self.stdout.write(
+            f"{len(pincodes)} pincodes x {suitability.GRID_SIZE} grid points scored in {scored:.2f}s, "
+            f"{len(objs)} rows written; weather for {sum(1 for found in climate.values() if found)} of "
+            f"{len(climate)} areas; profiles: "
+            + ", ".join(f"{source}: {count}" for source, count in sorted(Counter(sources).items()))
+        )
+
+    def benchmark(self, model, pincodes, jobs):
+        rng = np.random.default_rng(1)
+        low, high = np.array([0, 5, 5, 10, 15, 4, 20]), np.array([140, 145, 205, 43, 99, 9.5, 300])
+        profiles = rng.uniform(low, high, (pincodes, len(suitability.FEATURES)))
+        points = pincodes * suitability.GRID_SIZE
+
+        # What one predict call per pincode would cost, measured on a sample
+        sample = min(pincodes, 50)
+        started = time.perf_counter()
+        for row in profiles[:sample]:
+            suitability._score_chunk(model, row[None, :])
+        per_call = (time.perf_counter() - started) / sample
+        self.stdout.write(f"one call per pincode: ~{per_call * pincodes:.2f}s for {pincodes} (measured on {sample})")
+
+        for label, workers in (("1 process", 1), (f"jobs={jobs}", jobs)):
+            started = time.perf_counter()
+            suitability.score(model, profiles, jobs=workers)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{pincodes} pincodes ({points:,} grid points), {label}: {elapsed:.2f}s "
+                              f"({points / elapsed:,.0f} predictions/s)")
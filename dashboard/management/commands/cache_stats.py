@@ -0,0 +1,13 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Show entries and stored bytes per cache key prefix in the shared cache"
+
+    def handle(self, *args, **options):
+        if not hasattr(cache, "prefix_sizes"):
+            self.stdout.write(f"{type(cache).__name__} does not report sizes; hit/miss counters are in the cache_* series at /metrics")
+            return
+        for prefix, entry in cache.prefix_sizes().items():
+            self.stdout.write(f"{prefix}: entries={entry['entries']} bytes={entry['bytes']}")
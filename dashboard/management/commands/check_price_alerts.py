@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dashboard.cachekeys import MARKET_PRICES
+from dashboard.market_prices import refresh_market_prices
+from dashboard.models import PriceAlert
+
+
+class Command(BaseCommand):
+    help = ("Fetch the latest market prices, refresh the cached copy and price index, fire the price alerts "
+            "they set off and record the day's prices")
+
+    def handle(self, *args, **options):
+        started_at, started = timezone.now(), time.perf_counter()
+        # The same refresh the pages run, so market registration and the
+        # forecasters' history aren't skipped when this fills the cache
+        records = refresh_market_prices()
+        if not records:
+            self.stdout.write("No prices fetched; alerts not checked")
+            return
+        MARKET_PRICES.set(records)
+        fired = PriceAlert.objects.filter(triggered_at__gte=started_at).count()
+        self.stdout.write(
+            f"{len(records)} records refreshed in {time.perf_counter() - started:.3f}s; {fired} alerts fired"
+        )
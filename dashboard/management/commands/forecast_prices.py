@@ -0,0 +1,97 @@
+import datetime
+import time
+from collections import Counter
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from dashboard import forecasting
+from dashboard.models import MarketPrice, PriceForecast
+
+
+def _money(value):
+    return Decimal(f"{max(value, 0):.2f}")
+
+
+class Command(BaseCommand):
+    help = "Fit price forecasts for every market x commodity series and store the next days' prices (run nightly)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=120, help="Days of history to fit on")
+        parser.add_argument("--jobs", type=int, default=-1, help="Worker processes (-1: all cores)")
+        parser.add_argument("--benchmark", type=int, metavar="SERIES",
+                            help="Fit this many synthetic series instead, without touching the database")
+
+    def handle(self, *args, **options):
+        if options["benchmark"]:
+            return self.benchmark(options["benchmark"], options["days"], options["jobs"])
+
+        end = MarketPrice.objects.aggregate(latest=Max('arrival_date'))['latest']
+        if end is None:
+            self.stdout.write("No price history yet")
+            return
+        start = end - datetime.timedelta(days=options["days"] - 1)
+        rows = (
+            ((mandi_id, commodity), date, price)
+            for mandi_id, commodity, date, price in MarketPrice.objects.filter(arrival_date__gte=start).values_list(
+                'mandi_id', 'commodity', 'arrival_date', 'modal_price',
+            ).iterator(chunk_size=5000)
+        )
+        keys, y = forecasting.history_matrix(rows, end, options["days"])
+
+        started = time.perf_counter()
+        forecasts, spread, chosen = forecasting.forecast_all(y, jobs=options["jobs"])
+        fitted = time.perf_counter() - started
+
+        methods = list(forecasting.METHODS)
+        made_at = timezone.now()
+        band = forecasting.Z_80 * spread
+        dates = [end + datetime.timedelta(days=step) for step in range(1, forecasting.HORIZON + 1)]
+        objs = [
+            PriceForecast(
+                mandi_id=mandi_id,
+                commodity=commodity,
+                date=date,
+                modal_price=_money(forecasts[i, step]),
+                low=_money(forecasts[i, step] - band[i]),
+                high=_money(forecasts[i, step] + band[i]),
+                method=methods[chosen[i]],
+                made_at=made_at,
+            )
+            for i, (mandi_id, commodity) in enumerate(keys)
+            for step, date in enumerate(dates)
+        ]
+        started = time.perf_counter()
+        with transaction.atomic():
+            # Pages never see a half-written set
+            PriceForecast.objects.all().delete()
+            PriceForecast.objects.bulk_create(objs, batch_size=1000)
+        written = time.perf_counter() - started
+
+        counts = Counter(methods[index] for index in chosen)
+        self.stdout.write(
+            f"{len(keys)} series forecast to {dates[-1]} in {fitted:.2f}s, {len(objs)} rows written in {written:.2f}s; "
+            + ", ".join(f"{method}: {count}" for method, count in sorted(counts.items()))
+        )
+
+    def benchmark(self, series, days, jobs):
+        rng = np.random.default_rng(1)
+        weekday = rng.normal(0, 80, (series, forecasting.SEASON))[:, np.arange(days) % forecasting.SEASON]
+        walk = np.cumsum(rng.normal(0, 25, (series, days)), axis=1)
+        y = rng.uniform(800, 5000, (series, 1)) + weekday + walk + rng.normal(0, 40, (series, days))
+        # Markets don't report every day
+        y[rng.random(y.shape) < 0.15] = np.nan
+
+        for label, workers in (("1 process", 1), (f"jobs={jobs}", jobs)):
+            started = time.perf_counter()
+            forecasts, spread, chosen = forecasting.forecast_all(y, jobs=workers)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{series} series x {days} days, {label}: {elapsed:.2f}s ({series / elapsed:,.0f} series/s)")
+        counts = Counter(list(forecasting.METHODS)[index] for index in chosen)
+        self.stdout.write(f"median hold-out RMSE {np.median(spread):.1f}; " + ", ".join(
+            f"{method}: {count}" for method, count in sorted(counts.items())
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import mandis
+from dashboard.cachekeys import MARKET_PRICES
+from dashboard.functions import getMarketPricesAllStates
+
+
+class Command(BaseCommand):
+    help = "Register the markets in the latest price records and locate the ones not yet geocoded"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retry-failed", action="store_true",
+                            help=f"Also retry markets the geocoder missed more than {mandis.RETRY_AFTER.days} days ago")
+        parser.add_argument("--fetch", action="store_true", help="Fetch fresh prices instead of using the cached list")
+
+    def handle(self, *args, **options):
+        records = None if options["fetch"] else MARKET_PRICES.get()
+        if not records:
+            records = getMarketPricesAllStates()
+        added = mandis.register(records or [])
+
+        todo = list(mandis.pending(options["retry_failed"]))
+        located, failed = mandis.locate(todo) if todo else (0, 0)
+        self.stdout.write(
+            f"{added} new markets; located {located} of {len(todo)} looked up "
+            f"({len(todo) - located - failed} not found, {failed} failed and left for the next run)"
+        )
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dashboard.providers import get_provider
+
+
+class Command(BaseCommand):
+    help = "Show circuit state, call metrics and remaining quota budget for each external provider"
+
+    def handle(self, *args, **options):
+        for name in sorted(settings.PROVIDER_CLIENTS):
+            snapshot = get_provider(name).snapshot()
+            budget = snapshot.pop("remaining_budget")
+            self.stdout.write(f"{name}: budget={'unmetered' if budget is None else budget} "
+                              + " ".join(f"{k}={v}" for k, v in snapshot.items()))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import rollups
+from dashboard.models import MarketRollup, Produce
+
+
+class Command(BaseCommand):
+    help = "Recompute the market rollups from the listings, or with --check report rows that have drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Compare with the listings without writing")
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            rows = rollups.rebuild()
+            self.stdout.write(f"Rebuilt {rows} market rollups")
+            return
+
+        expected = rollups.totals(Produce.objects.active().values_list(
+            'farmer__state', 'commodity', 'price', 'quantity', 'unit',
+        ).iterator(chunk_size=5000)).rows
+        stored = {
+            (row[0], row[1]): list(row[2:])
+            for row in MarketRollup.objects.values_list('state', 'commodity', *rollups.FIELDS)
+        }
+        empty = [0] * len(rollups.FIELDS)
+        drifted = sorted(
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key, empty) != stored.get(key, empty)
+        )
+        for state, commodity in drifted[:20]:
+            self.stdout.write(f"{state or '-'} / {commodity or '-'}: stored {stored.get((state, commodity))}, "
+                              f"expected {expected.get((state, commodity))}")
+        if drifted:
+            raise CommandError(f"{len(drifted)} of {len(expected)} rollups differ from the listings")
+        self.stdout.write(self.style.SUCCESS(f"All {len(expected)} rollups match the listings"))
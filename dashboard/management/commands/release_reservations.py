@@ -0,0 +1,20 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dashboard.orders import release_expired
+
+
+class Command(BaseCommand):
+    help = "Cancel reservations left open too long and put their quantity back on the listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours", type=float, default=getattr(settings, "ORDER_RESERVATION_HOURS", 48),
+            help="Release reservations older than this many hours",
+        )
+
+    def handle(self, *args, **options):
+        released = release_expired(datetime.timedelta(hours=options["hours"]))
+        self.stdout.write(f"Released {released} reservations")
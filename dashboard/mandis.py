@@ -0,0 +1,108 @@
+"""Mandis named in the price records, their locations, and the ones nearest
+a farmer.
+
+New markets are registered as price refreshes bring them in and located
+once by ``manage.py geocode_mandis``; the Mandi table is the store, so a
+market is never looked up again. Its geohash lets ``geo.nearest`` find a
+farmer's closest markets without scanning the table, and the price list is
+then cut down to those markets' rows.
+"""
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.utils import timezone
+
+from landing.login_cfg import GeocodeAddress
+from . import geo
+from .alerts import state_key
+from .models import Mandi
+
+logger = logging.getLogger(__name__)
+
+# Markets shown on a farmer's prices page
+NEAREST = 10
+GEOCODE_WORKERS = 4
+# Markets the geocoder couldn't place are tried again after this long
+RETRY_AFTER = datetime.timedelta(days=30)
+
+
+def _clean(value):
+    return " ".join(str(value or "").replace("+", " ").split())
+
+
+def market_key(state, district, name):
+    return state_key(state), _clean(district).lower(), _clean(name).lower()
+
+
+def register(records):
+    """Add markets the table hasn't seen yet; returns how many were added."""
+    found = {}
+    for record in records:
+        if record.get("market") and record.get("state"):
+            key = market_key(record["state"], record.get("district"), record["market"])
+            found.setdefault(key, record)
+    known = {market_key(*row) for row in Mandi.objects.values_list('state', 'district', 'name')}
+    new = [
+        Mandi(name=_clean(record["market"]), district=_clean(record.get("district")), state=_clean(record["state"]))
+        for key, record in found.items() if key not in known
+    ]
+    Mandi.objects.bulk_create(new, batch_size=500, ignore_conflicts=True)
+    return len(new)
+
+
+def pending(retry_failed=False):
+    """Markets still to be located."""
+    queryset = Mandi.objects.filter(latitude__isnull=True)
+    if retry_failed:
+        return queryset.exclude(geocoded_at__gte=timezone.now() - RETRY_AFTER)
+    return queryset.filter(geocoded_at__isnull=True)
+
+
+def _address(mandi):
+    return ", ".join(part for part in (f"{mandi.name} mandi", mandi.district, mandi.state, "India") if part)
+
+
+def _lookup(mandi):
+    try:
+        return GeocodeAddress(_address(mandi))
+    except Exception as e:
+        logger.error(f"Error geocoding {_address(mandi)}: {e}")
+        return None
+
+
+def locate(mandis):
+    """Geocode and save the given markets; returns (placed, failed). Markets
+    whose lookup failed are left as they were, to be tried on the next run;
+    only the geocoder finding nothing holds a market back for RETRY_AFTER."""
+    mandis = list(mandis)
+    with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as pool:
+        locations = list(pool.map(_lookup, mandis))
+    now = timezone.now()
+    looked_up = []
+    for mandi, location in zip(mandis, locations):
+        if location is None:
+            continue
+        lat, lon = location
+        mandi.latitude, mandi.longitude = lat, lon
+        mandi.geohash = geo.encode(lat, lon) if lat is not None else ""
+        mandi.geocoded_at = now
+        looked_up.append(mandi)
+    Mandi.objects.bulk_update(looked_up, ['latitude', 'longitude', 'geohash', 'geocoded_at'], batch_size=500)
+    placed = sum(1 for mandi in looked_up if mandi.latitude is not None)
+    return placed, len(mandis) - len(looked_up)
+
+
+def nearby_prices(records, lat, lon, k=NEAREST):
+    """The records from the `k` markets nearest (lat, lon), nearest first, each
+    a copy with `distance_km` and `mandi_id` added. Empty if no market has
+    been located."""
+    mandis = geo.nearest(Mandi.objects.all(), lat, lon, k)
+    found = {market_key(mandi.state, mandi.district, mandi.name): mandi for mandi in mandis}
+    rows = []
+    for record in records:
+        mandi = found.get(market_key(record.get("state"), record.get("district"), record.get("market")))
+        if mandi is not None:
+            rows.append({**record, "distance_km": mandi.distance_km, "mandi_id": mandi.id})
+    rows.sort(key=lambda row: row["distance_km"])
+    return rows
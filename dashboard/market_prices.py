@@ -0,0 +1,187 @@
+"""Mandi prices: refreshing them, and the going rate per commodity and state.
+
+Comparing a listing with the raw price list would mean scanning every
+record per listing. Each refresh instead reduces the list to an index of
+(commodity, state) -> the latest day's modal, min and max across that
+state's mandis, plus an all-India entry per commodity, and caches it;
+pages then look a listing up in O(1).
+"""
+import datetime
+import logging
+import statistics
+import time
+from decimal import Decimal, InvalidOperation
+
+from . import mandis
+from .alerts import evaluate, state_key
+from .cachekeys import MARKET_PRICE_INDEX, MARKET_PRICES
+from .commodities import normalize
+from .functions import getMarketPricesAllStates
+from .models import Mandi, MarketPrice, PriceForecast
+
+logger = logging.getLogger(__name__)
+
+# Mandi prices are per quintal; how many quintals one listing unit is
+QUINTALS_PER_UNIT = {
+    "quintal": Decimal(1),
+    "quintals": Decimal(1),
+    "kg": Decimal("0.01"),
+    "kgs": Decimal("0.01"),
+    "tonne": Decimal(10),
+    "tonnes": Decimal(10),
+}
+ALL_INDIA = ""
+
+
+def _decimal(value):
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+
+def _arrival(record):
+    try:
+        return datetime.datetime.strptime(record.get("arrival_date", ""), "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+def _key(commodity, state):
+    # The cache stores JSON, so keys are strings
+    return f"{commodity}|{state}"
+
+
+def build_index(records):
+    """{'built_at': timestamp, 'prices': {'commodity|state key': price}}, a price
+    being {'modal', 'min', 'max', 'markets', 'date'} over the latest arrival date.
+    The all-India entry has state key ALL_INDIA."""
+    latest = {}
+    for record in records:
+        commodity = normalize(record.get("commodity", ""))
+        modal = _decimal(record.get("modal_price"))
+        if commodity is None or modal is None:
+            continue
+        row = (modal, _decimal(record.get("min_price")) or modal, _decimal(record.get("max_price")) or modal)
+        arrival = _arrival(record) or datetime.date.min
+        for key in (_key(commodity, state_key(record.get("state", ""))), _key(commodity, ALL_INDIA)):
+            date, rows = latest.get(key, (None, None))
+            if date is None or arrival > date:
+                latest[key] = (arrival, [row])
+            elif arrival == date:
+                rows.append(row)
+
+    prices = {}
+    for key, (date, rows) in latest.items():
+        prices[key] = {
+            "modal": statistics.median(row[0] for row in rows),
+            "min": min(row[1] for row in rows),
+            "max": max(row[2] for row in rows),
+            "markets": len(rows),
+            "date": date if date != datetime.date.min else None,
+        }
+    return {"built_at": time.time(), "prices": prices}
+
+
+def refresh_market_prices():
+    """Fetch the latest prices, rebuild the index, check the price alerts and
+    add the day's prices (and any markets not seen before) to the history."""
+    records = getMarketPricesAllStates()
+    if records:
+        MARKET_PRICE_INDEX.set(build_index(records))
+        # Each step on its own: the prices are still worth serving, and one
+        # failing step shouldn't skip the others
+        for step in (evaluate, mandis.register, record_history):
+            try:
+                step(records)
+            except Exception as e:
+                logger.error(f"Price refresh follow-up error in {step.__name__}: {str(e)}")
+    return records
+
+
+def record_history(records):
+    """Store each market's prices for their arrival date; a day already
+    recorded is left as it is. Returns how many rows were offered."""
+    mandi_ids = {
+        mandis.market_key(state, district, name): mandi_id
+        for mandi_id, state, district, name in Mandi.objects.values_list('id', 'state', 'district', 'name')
+    }
+    rows = {}
+    for record in records:
+        commodity = normalize(record.get("commodity", ""))
+        modal = _decimal(record.get("modal_price"))
+        arrival = _arrival(record)
+        mandi_id = mandi_ids.get(mandis.market_key(record.get("state"), record.get("district"), record.get("market")))
+        if commodity is None or modal is None or arrival is None or mandi_id is None:
+            continue
+        rows[(mandi_id, commodity, arrival)] = MarketPrice(
+            mandi_id=mandi_id,
+            commodity=commodity,
+            arrival_date=arrival,
+            min_price=_decimal(record.get("min_price")) or modal,
+            max_price=_decimal(record.get("max_price")) or modal,
+            modal_price=modal,
+        )
+    MarketPrice.objects.bulk_create(rows.values(), batch_size=500, ignore_conflicts=True)
+    return len(rows)
+
+
+def price_index():
+    """The cached index, rebuilt from cached prices if only they survive; None
+    rather than a provider call when neither is cached."""
+    index = MARKET_PRICE_INDEX.get()
+    if index is None:
+        records = MARKET_PRICES.get()
+        if records:
+            index = build_index(records)
+            MARKET_PRICE_INDEX.set(index)
+    return index
+
+
+def mandi_price(index, commodity, state):
+    """The state's going rate for a commodity, else the all-India one."""
+    if not index or not commodity:
+        return None
+    prices = index["prices"]
+    return prices.get(_key(commodity, state_key(state or ""))) or prices.get(_key(commodity, ALL_INDIA))
+
+
+def premium_label(premium):
+    if premium is None:
+        return ""
+    if premium == 0:
+        return "At mandi price"
+    return f"{abs(premium):g}% {'above' if premium > 0 else 'below'} mandi"
+
+
+def compare_with_mandi(produces, state_of, index=None):
+    """Set `mandi` (the reference price), `mandi_premium` (% over its modal
+    price, None without a reference) and `mandi_label` on each listing."""
+    index = price_index() if index is None else index
+    for produce in produces:
+        produce.mandi = mandi_price(index, produce.commodity, state_of(produce))
+        produce.mandi_premium = None
+        quintals = QUINTALS_PER_UNIT.get(str(produce.unit).strip().lower())
+        if produce.mandi and quintals and produce.mandi["modal"] > 0:
+            per_quintal = Decimal(produce.price) / quintals
+            produce.mandi_premium = round(float((per_quintal - produce.mandi["modal"]) / produce.mandi["modal"] * 100), 1)
+        produce.mandi_label = premium_label(produce.mandi_premium)
+    return produces
+
+
+def attach_outlook(rows):
+    """Add each nearby price row's stored forecast: `outlook` is
+    {'peak': the highest forecast day, 'days': every forecast}, or None.
+    One query for all the rows."""
+    wanted = {(row["mandi_id"], normalize(row.get("commodity", ""))) for row in rows}
+    forecasts = {}
+    for forecast in PriceForecast.objects.filter(
+        mandi_id__in={mandi_id for mandi_id, _ in wanted},
+        commodity__in={commodity for _, commodity in wanted if commodity},
+    ).order_by('date'):
+        forecasts.setdefault((forecast.mandi_id, forecast.commodity), []).append(forecast)
+    for row in rows:
+        days = forecasts.get((row["mandi_id"], normalize(row.get("commodity", ""))))
+        row["outlook"] = {"peak": max(days, key=lambda day: day.modal_price), "days": days} if days else None
+    return rows
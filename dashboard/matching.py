@@ -0,0 +1,617 @@
+"""Per-commodity order books matching buyer bids against farmer asks.
+
+Each book keeps bids in a max-heap and asks in a min-heap keyed on
+(price, arrival), so an incoming order fills against the best price first
+and, at equal prices, the oldest order first (price-time priority). Filled
+and cancelled orders are dropped lazily when they reach the top of a heap.
+Trades happen at the resting order's price.
+
+Every change to a book (an order resting, a fill against a resting order,
+a cancel) is appended to a JSON-lines log, and replaying the log rebuilds
+the books after a restart. The log records effects rather than inputs, so
+replay doesn't re-run matching or settlement. An engine holds an exclusive
+lock on its log while it's open: one process owns the books, and a second
+engine on the same log raises EngineBusy.
+
+Settlement runs without the engine lock held. A match takes the quantity
+off both orders and logs the fill under a fresh reference, then settles
+it, then logs that it settled or puts the quantities back. Replay only
+applies fills that settled, asking `settled` (the orders table, for the
+process's engine) about any the log didn't get to confirm, so a crash
+between settling and logging can't fill an order twice.
+
+Farmer listings are the asks. The owning process syncs a book with the
+active listings the first time it uses it, then catches up on listings
+changed since before every bid, so listings saved by other workers reach
+it too; other books are caught up by the next bid or cancel once
+MATCHING_SYNC_SECONDS have passed. Changes committed in the owning process
+are applied straight away. A fill against a listing is settled with
+``orders.reserve``, so the database stays the authority on stock: if the
+listing sold out in the meantime the ask is cancelled and matching moves on
+to the next one.
+
+Buyers' bids are Bid rows; the books and the log only know them by id. A
+bid's quantity goes down with each fill in the same transaction as the
+order, and a bid rests until it fills, the buyer cancels it or
+MATCHING_BID_DAYS pass. Expired bids are taken off with the catch-up.
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import orders
+from .models import Bid, Order, Produce
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+BID = "bid"
+ASK = "ask"
+
+# `ref` names a settled fill in the log and on its order
+Fill = namedtuple("Fill", "bid ask price quantity settlement ref", defaults=(None,))
+
+
+class EngineBusy(Exception):
+    """Another engine, usually in another process, has the log open."""
+
+
+def _lock_exclusively(file):
+    """Lock an open file for this process without waiting; False if another
+    process (or another open file) holds it. Closing the file unlocks it."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+class Entry:
+    """An order in a book; `quantity` is what's left of it."""
+    __slots__ = ("id", "side", "price", "quantity", "seq", "owner", "cancelled")
+
+    def __init__(self, id, side, price, quantity, seq, owner=None):
+        self.id = id
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.seq = seq
+        self.owner = owner
+        self.cancelled = False
+
+    def crosses(self, other):
+        return self.price >= other.price if self.side == BID else self.price <= other.price
+
+
+class Book:
+    def __init__(self, commodity):
+        self.commodity = commodity
+        self.bids = []  # (-price, seq, entry)
+        self.asks = []  # (price, seq, entry)
+        self.orders = {}
+
+    def rest(self, entry):
+        replaced = self.orders.get(entry.id)
+        if replaced is not None and replaced is not entry:
+            replaced.quantity = 0
+        self.orders[entry.id] = entry
+        if entry.side == BID:
+            heapq.heappush(self.bids, (-entry.price, entry.seq, entry))
+        else:
+            heapq.heappush(self.asks, (entry.price, entry.seq, entry))
+
+    def remove(self, order_id):
+        entry = self.orders.pop(order_id, None)
+        if entry is not None:
+            # Left in its heap until it reaches the top
+            entry.quantity = 0
+        return entry
+
+    def reduce(self, order_id, quantity):
+        entry = self.orders[order_id]
+        entry.quantity -= quantity
+        if entry.quantity <= 0:
+            self.remove(order_id)
+
+    def best(self, side):
+        heap = self.bids if side == BID else self.asks
+        while heap and heap[0][2].quantity <= 0:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def depth(self, levels=5):
+        """{'bid': [(price, quantity)], 'ask': [...]}, best levels first."""
+        result = {}
+        for side in (BID, ASK):
+            totals = {}
+            for entry in self.orders.values():
+                if entry.side == side:
+                    totals[entry.price] = totals.get(entry.price, 0) + entry.quantity
+            prices = sorted(totals, reverse=side == BID)[:levels]
+            result[side] = [(price, totals[price]) for price in prices]
+        return result
+
+
+class Engine:
+    """The books plus their log. Every public method takes the engine lock;
+    nothing holds it while settling."""
+
+    def __init__(self, log_path=None, settled=None):
+        self.books = {}
+        self.lock = threading.RLock()
+        self._seq = itertools.count(1)
+        self._log = None
+        self._owner = None
+        # settled(refs) -> the refs among them that were settled
+        self._settled = settled
+        self.log_path = log_path
+        if log_path is not None:
+            self._owner = open(f"{log_path}.lock", "a+")
+            if not _lock_exclusively(self._owner):
+                self._owner.close()
+                raise EngineBusy(f"{log_path} is open in another engine")
+            last = self.replay(log_path)
+            self._seq = itertools.count(last + 1)
+            self.compact()
+
+    def book(self, commodity):
+        book = self.books.get(commodity)
+        if book is None:
+            book = self.books[commodity] = Book(commodity)
+        return book
+
+    def submit(self, commodity, side, price, quantity, order_id=None, owner=None, settle=None):
+        """Match an order and rest whatever is left of it. Returns (entry, fills).
+
+        `settle(bid, ask, quantity, price, ref)` is called for each fill,
+        without the engine lock, and returns a truthy settlement, or a falsy
+        value when the ask can't be filled any more: a resting ask is then
+        cancelled and matching goes on; an incoming ask stops there.
+        """
+        price, quantity = Decimal(price), Decimal(quantity)
+        if quantity <= 0 or price <= 0:
+            raise ValueError("Price and quantity must be positive")
+        with self.lock:
+            book = self.book(commodity)
+            seq = next(self._seq)
+            entry = Entry(order_id or f"{side}:{seq}", side, price, quantity, seq, owner)
+            if entry.id in book.orders:
+                raise ValueError(f"Order {entry.id} is already in the {commodity} book")
+            if settle is None:
+                fills = [fill for fill, resting in self._match(book, entry)]
+                self._rest(book, entry)
+                return entry, fills
+
+        fills = []
+        while True:
+            with self.lock:
+                matched = self._match(book, entry, refs=True)
+                if not matched:
+                    self._rest(book, entry)
+                    return entry, fills
+            pending, settled, failed = list(matched), [], []
+            try:
+                while pending:
+                    fill, resting = pending[0]
+                    bid, ask = (entry, resting) if side == BID else (resting, entry)
+                    settlement = settle(bid, ask, fill.quantity, fill.price, fill.ref)
+                    pending.pop(0)
+                    if settlement:
+                        settled.append(fill._replace(settlement=settlement))
+                    else:
+                        failed.append((fill, resting))
+                        if side == ASK:
+                            break
+            finally:
+                with self.lock:
+                    self._write([{"op": "settled", "ref": fill.ref} for fill in settled])
+                    for fill, resting in failed:
+                        if side == BID:
+                            self._retire(book, resting)
+                        else:
+                            self._put_back(book, resting, fill.quantity)
+                    for fill, resting in pending:
+                        self._put_back(book, resting, fill.quantity)
+                    entry.quantity += sum(fill.quantity for fill, resting in failed + pending)
+            fills.extend(settled)
+            if failed and side == ASK:
+                entry.quantity = 0
+                return entry, fills
+
+    def cancel(self, commodity, order_id):
+        """Take an order off its book; returns it, or None if it's gone."""
+        with self.lock:
+            entry = self.book(commodity).remove(order_id)
+            if entry is not None:
+                entry.cancelled = True
+                self._write([{"op": "cancel", "book": commodity, "id": order_id}])
+            return entry
+
+    def snapshot(self):
+        """{commodity: sorted [(id, side, price, quantity)]} of resting orders."""
+        with self.lock:
+            return {
+                commodity: sorted((e.id, e.side, e.price, e.quantity) for e in book.orders.values())
+                for commodity, book in self.books.items() if book.orders
+            }
+
+    def _match(self, book, entry, refs=False):
+        """Take what crosses off `entry` and the best opposite orders and log
+        the fills; returns [(fill, resting order)]."""
+        opposite = ASK if entry.side == BID else BID
+        matched, records = [], []
+        while entry.quantity > 0:
+            resting = book.best(opposite)
+            if resting is None or not entry.crosses(resting):
+                break
+            filled = min(entry.quantity, resting.quantity)
+            entry.quantity -= filled
+            book.reduce(resting.id, filled)
+            bid, ask = (entry, resting) if entry.side == BID else (resting, entry)
+            fill = Fill(bid.id, ask.id, resting.price, filled, True, uuid.uuid4().hex if refs else None)
+            matched.append((fill, resting))
+            record = {
+                "op": "fill", "book": book.commodity, "id": resting.id, "against": entry.id,
+                "price": str(resting.price), "quantity": str(filled),
+            }
+            if fill.ref:
+                record["ref"] = fill.ref
+            records.append(record)
+        self._write(records)
+        return matched
+
+    def _rest(self, book, entry):
+        if entry.quantity > 0:
+            book.rest(entry)
+            self._write([self._add_record(book.commodity, entry)])
+
+    def _retire(self, book, ask):
+        """Cancel an ask whose fill didn't settle, unless a newer order
+        replaced it meanwhile. Also logged when the fill had used it up, as
+        replay skips that fill and would otherwise bring it back."""
+        if ask.cancelled or book.orders.get(ask.id, ask) is not ask:
+            return
+        book.remove(ask.id)
+        ask.cancelled = True
+        self._write([{"op": "cancel", "book": book.commodity, "id": ask.id}])
+
+    def _put_back(self, book, resting, quantity):
+        """Return an unsettled fill's quantity to the resting order, back in
+        its place in the queue if the fill had used it up."""
+        if resting.cancelled:
+            return
+        current = book.orders.get(resting.id)
+        if current is resting:
+            resting.quantity += quantity
+        elif current is None:
+            resting.quantity = quantity
+            book.rest(resting)
+
+    def _add_record(self, commodity, entry):
+        return {
+            "op": "add", "book": commodity, "id": entry.id, "side": entry.side, "seq": entry.seq,
+            "price": str(entry.price), "quantity": str(entry.quantity), "owner": entry.owner,
+        }
+
+    def _write(self, records):
+        if self._log is None or not records:
+            return
+        self._log.write("".join(json.dumps(record) + "\n" for record in records))
+        self._log.flush()
+
+    def replay(self, path):
+        """Apply a log to the books; returns the last sequence number seen."""
+        last = 0
+        if not os.path.exists(path):
+            return last
+        records = []
+        with open(path) as log:
+            for line_number, line in enumerate(log, 1):
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    logger.warning(f"Skipping unreadable line {line_number} of {path}")
+        confirmed = {record["ref"] for record in records if record["op"] == "settled"}
+        unconfirmed = {record["ref"] for record in records if record["op"] == "fill" and "ref" in record} - confirmed
+        if unconfirmed and self._settled is not None:
+            confirmed |= set(self._settled(unconfirmed))
+        for record in records:
+            if record["op"] == "settled":
+                continue
+            book = self.book(record["book"])
+            if record["op"] == "add":
+                book.rest(Entry(
+                    record["id"], record["side"], Decimal(record["price"]),
+                    Decimal(record["quantity"]), record["seq"], record["owner"],
+                ))
+                last = max(last, record["seq"])
+            elif record["op"] == "fill":
+                if "ref" in record and record["ref"] not in confirmed:
+                    # Never settled
+                    continue
+                if record["id"] in book.orders:
+                    book.reduce(record["id"], Decimal(record["quantity"]))
+            elif record["op"] == "cancel":
+                book.remove(record["id"])
+        return last
+
+    def compact(self):
+        """Rewrite the log as just the resting orders, and keep appending to it."""
+        with self.lock:
+            if self._log is not None:
+                self._log.close()
+            temporary = f"{self.log_path}.tmp"
+            with open(temporary, "w") as log:
+                entries = sorted(
+                    ((commodity, entry) for commodity, book in self.books.items() for entry in book.orders.values()),
+                    key=lambda item: item[1].seq,
+                )
+                for commodity, entry in entries:
+                    log.write(json.dumps(self._add_record(commodity, entry)) + "\n")
+                log.flush()
+                os.fsync(log.fileno())
+            os.replace(temporary, self.log_path)
+            self._log = open(self.log_path, "a")
+
+    def close(self):
+        with self.lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if self._owner is not None:
+                # Closing the file releases the lock on it
+                self._owner.close()
+                self._owner = None
+
+
+def listing_id(produce_id):
+    return f"listing:{produce_id}"
+
+
+def settle_listing_fill(bid, ask, quantity, price, ref=None):
+    """Reserve a filled quantity on the ask's listing for the bid's buyer."""
+    if ask.owner is None or "listing" not in ask.owner:
+        return True
+    buyer = Bid.objects.get(id=bid.owner["bid"])
+    try:
+        with transaction.atomic():
+            order = orders.reserve(
+                ask.owner["listing"], quantity, buyer.buyer_name, buyer.buyer_phone,
+                price=price, bid=buyer, fill_ref=ref,
+            )
+            Bid.objects.filter(id=buyer.id).update(quantity=F('quantity') - quantity)
+            Bid.objects.filter(id=buyer.id, quantity__lte=0).update(status=Bid.FILLED)
+        return order
+    except orders.OutOfStock:
+        return None
+
+
+def settled_fills(refs):
+    """The fill refs among `refs` that have an order."""
+    refs, found = list(refs), set()
+    for start in range(0, len(refs), 500):
+        found.update(Order.objects.filter(fill_ref__in=refs[start:start + 500]).values_list('fill_ref', flat=True))
+    return found
+
+
+# Listings changed this long before a sync are read again by the next one,
+# for writes that committed after it with an earlier updated_at
+SYNC_OVERLAP = timedelta(seconds=5)
+
+_engine = None
+_engine_lock = threading.Lock()
+# Serializes listing syncs, which settle fills; never taken inside a transaction
+_sync_lock = threading.RLock()
+# Commodity -> updated_at the next sync of its book reads listings from
+_synced = {}
+# time.monotonic() of the last catch-up on every book
+_caught_up_at = None
+
+
+def engine():
+    """This process's engine, replayed from settings.MATCHING_LOG on first
+    use. Raises EngineBusy while another process owns the log."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            market = Engine(settings.MATCHING_LOG, settled=settled_fills)
+            _store_legacy_bids(market)
+            _engine = market
+        return _engine
+
+
+def _store_legacy_bids(market):
+    # Logs from before Bid rows kept the buyer's name and phone on each bid
+    moved = False
+    for commodity, book in market.books.items():
+        for entry in book.orders.values():
+            if entry.side == BID and entry.owner and "phone" in entry.owner:
+                bid = Bid.objects.create(
+                    commodity=commodity, price=entry.price, quantity=entry.quantity,
+                    buyer_name=entry.owner["name"], buyer_phone=entry.owner["phone"],
+                    expires_at=timezone.now() + timedelta(days=settings.MATCHING_BID_DAYS),
+                )
+                entry.owner = {"bid": bid.id}
+                moved = True
+    if moved:
+        market.compact()
+
+
+def catch_up(market):
+    """Catch the synced books up on listings other processes changed and
+    take expired bids off, unless that was done less than
+    MATCHING_SYNC_SECONDS ago."""
+    global _caught_up_at
+    with _sync_lock:
+        now = time.monotonic()
+        if _caught_up_at is not None and now - _caught_up_at < settings.MATCHING_SYNC_SECONDS:
+            return
+        _caught_up_at = now
+        for commodity in list(_synced):
+            try:
+                sync_listings(market, commodity)
+            except Exception as e:
+                logger.error(f"Error syncing the {commodity} order book: {e}")
+        expire_bids(market)
+
+
+def _withdraw(market, bid, status):
+    market.cancel(bid.commodity, f"bid:{bid.id}")
+    # A fill that matched before the cancel may still settle; the bid keeps its quantity for that
+    Bid.objects.filter(id=bid.id, status=Bid.OPEN).update(status=status)
+
+
+def expire_bids(market):
+    """Take bids past their expiry off the books; returns how many."""
+    expired = list(Bid.objects.filter(status=Bid.OPEN, expires_at__lte=timezone.now()))
+    for bid in expired:
+        _withdraw(market, bid, Bid.EXPIRED)
+    return len(expired)
+
+
+def _noting_stale(stale):
+    """settle_listing_fill, adding the listings that had less left than
+    their ask showed to `stale`."""
+    def settle(bid, ask, quantity, price, ref):
+        settlement = settle_listing_fill(bid, ask, quantity, price, ref)
+        if not settlement and ask.owner and "listing" in ask.owner:
+            stale.append(ask.owner["listing"])
+        return settlement
+    return settle
+
+
+def _sync_listing(market, commodity, produce_id, price, quantity, farmer_id, retry=True):
+    with _sync_lock:
+        order_id = listing_id(produce_id)
+        with market.lock:
+            resting = market.book(commodity).orders.get(order_id)
+            if resting is not None and resting.price == price and resting.quantity == quantity:
+                return
+        if resting is not None:
+            market.cancel(commodity, order_id)
+        if quantity > 0:
+            stale = []
+            # May fill resting bids straight away
+            market.submit(
+                commodity, ASK, price, quantity, order_id=order_id,
+                owner={"listing": produce_id, "farmer": farmer_id}, settle=_noting_stale(stale),
+            )
+            if stale and retry:
+                # Put up what the listing does have left
+                current = Produce.objects.filter(id=produce_id).values_list('price', 'quantity', 'farmer_id').first()
+                if current is not None:
+                    _sync_listing(market, commodity, produce_id, *current, retry=False)
+
+
+def sync_listings(market, commodity):
+    """Bring a book's listing asks in line with the database: every active
+    listing the first time, then the listings changed since the last sync.
+    Listings deleted by other processes stay until a fill against them fails."""
+    with _sync_lock:
+        since = _synced.get(commodity)
+        started = timezone.now()
+        listings = Produce.objects.filter(commodity=commodity)
+        listings = listings.active() if since is None else listings.filter(updated_at__gte=since)
+        rows = list(listings.values_list('id', 'price', 'quantity', 'farmer_id'))
+        for row in rows:
+            _sync_listing(market, commodity, *row)
+        if since is None:
+            live = {listing_id(row[0]) for row in rows}
+            with market.lock:
+                gone = [
+                    order_id for order_id in market.book(commodity).orders
+                    if order_id.startswith("listing:") and order_id not in live
+                ]
+            for order_id in gone:
+                market.cancel(commodity, order_id)
+        _synced[commodity] = started - SYNC_OVERLAP
+
+
+def place_bid(commodity, price, quantity, buyer_name, buyer_phone):
+    """Match a buyer's bid against the listings; returns (entry, fills).
+    Whatever isn't filled rests on the book. Raises EngineBusy when another
+    process owns the books."""
+    market = engine()
+    catch_up(market)
+    bid = Bid.objects.create(
+        commodity=commodity, price=price, quantity=quantity, buyer_name=buyer_name, buyer_phone=buyer_phone,
+        expires_at=timezone.now() + timedelta(days=settings.MATCHING_BID_DAYS),
+    )
+    sync_listings(market, commodity)
+    stale = []
+    result = market.submit(
+        commodity, BID, price, quantity, order_id=f"bid:{bid.id}", owner={"bid": bid.id},
+        settle=_noting_stale(stale),
+    )
+    # Listings that had less left than their ask showed (reserved directly
+    # since): put back what they do have
+    listings_changed(stale)
+    return result
+
+
+def cancel_bid(bid_id, buyer_phone):
+    """Withdraw what's left of a buyer's open bid. Returns the Bid, or None
+    when the buyer has no open bid by that id. Raises EngineBusy when
+    another process owns the books."""
+    market = engine()
+    catch_up(market)
+    bid = Bid.objects.filter(id=bid_id, buyer_phone=buyer_phone, status=Bid.OPEN).first()
+    if bid is None:
+        return None
+    _withdraw(market, bid, Bid.CANCELLED)
+    bid.refresh_from_db()
+    return bid
+
+
+def listings_changed(produce_ids):
+    """Bring the synced books in line with these listings' committed state."""
+    if _engine is None or not produce_ids:
+        return
+    rows = Produce.objects.filter(id__in=produce_ids, commodity__in=list(_synced)).values_list(
+        'commodity', 'id', 'price', 'quantity', 'farmer_id',
+    )
+    for row in rows:
+        _sync_listing(_engine, *row)
+
+
+def listing_removed(produce_id, commodity):
+    if _engine is not None and commodity in _synced:
+        _engine.cancel(commodity, listing_id(produce_id))
+
+
+def sync_on_commit(produce_ids):
+    """Apply changes to these listings to the books once the current
+    transaction commits: the books must not see stock that may roll back,
+    and syncing can settle fills, which must not wait on the engine lock
+    inside a transaction."""
+    produce_ids = list(produce_ids)
+    if produce_ids:
+        transaction.on_commit(lambda: listings_changed(produce_ids), robust=True)
+
+
+def remove_on_commit(produce_id, commodity):
+    transaction.on_commit(lambda: listing_removed(produce_id, commodity), robust=True)
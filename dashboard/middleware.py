@@ -0,0 +1,49 @@
+from django.http import HttpResponseForbidden
+from django.shortcuts import redirect
+from django.utils.functional import SimpleLazyObject
+
+
+def login_exempt(view):
+    """Let a dashboard view run without a logged-in farmer."""
+    view.login_exempt = True
+    return view
+
+
+def fragment(view):
+    """Mark a view that returns a page fragment; unauthenticated calls get a 403
+    instead of a redirect to the error page."""
+    view.fragment = True
+    return view
+
+
+def get_farmer(request):
+    """The logged-in farmer for this request, loaded at most once."""
+    if not hasattr(request, "_cached_farmer"):
+        from .views import getDetailsFromUID
+
+        logged_id = request.session.get("member_logged_id")
+        request._cached_farmer = getDetailsFromUID(logged_id) if logged_id else None
+    return request._cached_farmer
+
+
+class FarmerMiddleware:
+    """Attach `request.farmer` and turn away anonymous requests to dashboard views
+    before they run."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.farmer = SimpleLazyObject(lambda: get_farmer(request))
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not view_func.__module__.startswith("dashboard.") or getattr(view_func, "login_exempt", False):
+            return None
+        # Only the session is consulted here; the farmer itself stays lazy
+        if request.session.get("member_logged_id"):
+            return None
+        if getattr(view_func, "fragment", False):
+            return HttpResponseForbidden()
+        request.session["error_message"] = "Please Login to Continue"
+        return redirect('/admin/404/')
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.5 on 2026-10-19 00:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_listing_stats(apps, schema_editor):
+    Produce = apps.get_model('dashboard', 'Produce')
+    ListingStats = apps.get_model('dashboard', 'ListingStats')
+    per_farmer = Produce.objects.values('farmerid').annotate(
+        listing_count=models.Count('id'), latest_id=models.Max('id'),
+    ).order_by()
+    rows = [
+        ListingStats(farmerid=row['farmerid'], listing_count=row['listing_count'], latest_listing_id=row['latest_id'])
+        for row in per_farmer if row['farmerid'] != 0
+    ]
+    rows.append(ListingStats(farmerid=0, listing_count=Produce.objects.count()))
+    ListingStats.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_alter_produce_farmerid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('farmerid', models.IntegerField(unique=True)),
+                ('listing_count', models.IntegerField(default=0)),
+                ('latest_listing', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dashboard.produce')),
+            ],
+            options={
+                'verbose_name_plural': 'listing stats',
+            },
+        ),
+        migrations.RunPython(backfill_listing_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 5000
+
+
+def backfill_farmer(apps, schema_editor):
+    Produce = apps.get_model('dashboard', 'Produce')
+    User = apps.get_model('landing', 'User')
+    ListingStats = apps.get_model('dashboard', 'ListingStats')
+    known_users = User.objects.values('id')
+
+    # Walk the table in primary-key ranges so each UPDATE is short and commits on its own.
+    # Rows pointing at missing farmers (the old default of 0, deleted users) keep farmer NULL.
+    bounds = Produce.objects.aggregate(low=models.Min('id'), high=models.Max('id'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        Produce.objects.filter(
+            id__gte=start, id__lt=start + BATCH_SIZE, farmer__isnull=True, farmerid__in=known_users,
+        ).update(farmer_id=models.F('farmerid'))
+
+    # Orphaned listings no longer count towards the marketplace total
+    ListingStats.objects.filter(farmerid=0).update(
+        listing_count=Produce.objects.filter(farmer__isnull=False).count(),
+    )
+
+
+class Migration(migrations.Migration):
+    # Not atomic, so each backfill batch commits separately on a large table
+    atomic = False
+
+    dependencies = [
+        ('landing', '0034_alter_user_fidc'),
+        ('dashboard', '0004_listingstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produce',
+            name='farmer',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='produces', to='landing.user'),
+        ),
+        migrations.RunPython(backfill_farmer, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_produce_farmer_backfill'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='produce',
+            name='farmerid',
+        ),
+        migrations.AddIndex(
+            model_name='produce',
+            index=models.Index(fields=['farmer', 'created_at'], name='produce_farmer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produce',
+            index=models.Index(fields=['name', 'price'], name='produce_name_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produce',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['-created_at'], name='produce_active_recent_idx'),
+        ),
+    ]
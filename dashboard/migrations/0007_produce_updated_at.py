@@ -0,0 +1,26 @@
+# Generated by Django 4.2.5 on 2026-10-19 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_remove_produce_farmerid_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='produce',
+            name='produce_active_recent_idx',
+        ),
+        migrations.AddField(
+            model_name='produce',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='produce',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['-created_at', '-id'], name='produce_active_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,178 @@
+# Generated by Django 4.2.5 on 2026-10-19 01:03
+
+import re
+
+from django.db import migrations, models
+
+# dashboard.commodities as of this migration, copied so the backfill
+# doesn't change when the live vocabulary or matching does
+VOCABULARY = {
+    "Tomato": ["tamatar", "tamater"],
+    "Onion": ["pyaz", "pyaaz", "pyaj", "kanda", "dungri"],
+    "Potato": ["aloo", "alu", "batata"],
+    "Wheat": ["gehun", "gehu", "gahu"],
+    "Rice": ["chawal", "chaval"],
+    "Paddy(Dhan)(Common)": ["paddy", "dhaan"],
+    "Maize": ["makka", "makki", "corn", "bhutta"],
+    "Cauliflower": ["phool gobhi", "phool gobi", "gobhi", "gobi"],
+    "Cabbage": ["patta gobhi", "band gobhi", "patta gobi"],
+    "Brinjal": ["baingan", "bengan", "eggplant", "vangi"],
+    "Green Chilli": ["hari mirch", "mirchi", "mirch", "chilli", "chili"],
+    "Dry Chillies": ["lal mirch", "red chilli"],
+    "Bhindi(Ladies Finger)": ["okra", "ladyfinger", "lady finger", "bhendi"],
+    "Garlic": ["lehsun", "lahsun", "lasun"],
+    "Ginger(Green)": ["adrak", "ginger"],
+    "Turmeric": ["haldi"],
+    "Coriander(Leaves)": ["dhaniya", "dhania", "coriander"],
+    "Carrot": ["gajar"],
+    "Cucumbar(Kheera)": ["cucumber", "khira"],
+    "Peas Wet": ["matar", "mutter", "green peas", "peas"],
+    "Spinach": ["palak"],
+    "Methi(Leaves)": ["fenugreek"],
+    "Sweet Potato": ["shakarkand", "shakarkandi"],
+    "Capsicum": ["shimla mirch", "bell pepper"],
+    "Pumpkin": ["kaddu", "kaddoo"],
+    "Radish": ["mooli", "muli"],
+    "Beetroot": ["chukandar", "beet"],
+    "Bitter gourd": ["karela"],
+    "Bottle gourd": ["lauki", "ghiya", "dudhi"],
+    "Ridgeguard(Tori)": ["ridge gourd", "turai", "torai"],
+    "Drumstick": ["sahjan", "moringa"],
+    "Tapioca": ["cassava"],
+    "Banana": ["kela"],
+    "Apple": ["seb", "saib"],
+    "Mango": ["aam"],
+    "Pomegranate": ["anar"],
+    "Grapes": ["angoor", "angur", "grape"],
+    "Orange": ["santra", "narangi"],
+    "Mousambi(Sweet Lime)": ["mosambi", "musambi"],
+    "Papaya": ["papita"],
+    "Guava": ["amrood", "amrud", "peru"],
+    "Lemon": ["nimbu", "lime"],
+    "Water Melon": ["tarbooz", "tarbuj", "watermelon"],
+    "Pineapple": ["ananas"],
+    "Coconut": ["nariyal"],
+    "Bajra(Pearl Millet/Cumbu)": ["pearl millet"],
+    "Jowar(Sorghum)": ["jwar"],
+    "Ragi (Finger Millet)": ["nachni", "mandua"],
+    "Barley (Jau)": [],
+    "Arhar (Tur/Red Gram)(Whole)": ["toor", "toor dal", "arhar dal", "pigeon pea"],
+    "Bengal Gram(Gram)(Whole)": ["chana", "chickpea", "chick pea"],
+    "Green Gram (Moong)(Whole)": ["mung", "moong dal"],
+    "Black Gram (Urd Beans)(Whole)": ["urad", "urad dal"],
+    "Lentil (Masur)(Whole)": ["masoor", "masoor dal"],
+    "Groundnut": ["moongfali", "mungfali", "peanut"],
+    "Mustard": ["sarson", "rai"],
+    "Soyabean": ["soybean", "soya"],
+    "Sunflower": ["surajmukhi"],
+    "Castor Seed": ["arandi"],
+    "Cotton": ["kapas"],
+    "Jute": ["pat"],
+    "Sugarcane": ["ganna"],
+    "Cumin Seed(Jeera)": ["cumin"],
+    "Black pepper": ["kali mirch", "pepper"],
+    "Cardamoms": ["elaichi", "cardamom"],
+    "Arecanut(Betelnut/Supari)": ["areca"],
+    "Copra": ["dry coconut"],
+}
+
+MIN_SIMILARITY = 0.45
+MAX_TYPO_LETTERS = 2
+
+_SPLIT_RE = re.compile(r"[()/]")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def _singular(word):
+    if len(word) > 4 and word.endswith("oes"):
+        return word[:-2]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def clean(text):
+    words = _NON_WORD_RE.sub(" ", str(text).lower()).split()
+    return " ".join(_singular(word) for word in words)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _build_aliases():
+    aliases = {}
+    for name, extra in VOCABULARY.items():
+        for alias in [name, *_SPLIT_RE.split(name), *extra]:
+            key = clean(alias)
+            if key and key not in ("whole", "leave", "common", "green", "gram"):
+                aliases.setdefault(key, name)
+    return aliases
+
+
+ALIASES = _build_aliases()
+
+
+def normalize(text):
+    key = clean(text)
+    if not key:
+        return None
+    if key in ALIASES:
+        return ALIASES[key]
+    grams = trigrams(key)
+    best, best_score = None, MIN_SIMILARITY
+    for alias, name in ALIASES.items():
+        alias_grams = trigrams(alias)
+        score = len(grams & alias_grams) / len(grams | alias_grams)
+        shorter, longer = sorted((key, alias), key=len)
+        different_word = shorter in longer and len(longer) - len(shorter) > MAX_TYPO_LETTERS
+        if score > best_score and not different_word:
+            best, best_score = name, score
+    if best is None:
+        for word in sorted(key.split(), key=len, reverse=True):
+            if word in ALIASES:
+                return ALIASES[word]
+    return best
+
+
+def commodity_for(text):
+    return normalize(text) or " ".join(str(text).split()).title()[:100]
+
+
+def fill_commodity(apps, schema_editor):
+    Produce = apps.get_model('dashboard', 'Produce')
+    batch = []
+    for produce in Produce.objects.only('id', 'name').order_by('id').iterator(chunk_size=1000):
+        produce.commodity = commodity_for(produce.name)
+        batch.append(produce)
+        if len(batch) == 1000:
+            Produce.objects.bulk_update(batch, ['commodity'])
+            batch = []
+    Produce.objects.bulk_update(batch, ['commodity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_produce_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='produce',
+            name='produce_name_price_idx',
+        ),
+        migrations.AddField(
+            model_name='produce',
+            name='commodity',
+            field=models.CharField(blank=True, help_text='Normalized commodity', max_length=100),
+        ),
+        migrations.RunPython(fill_commodity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='produce',
+            index=models.Index(fields=['commodity', 'price'], name='produce_commodity_price_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.5 on 2026-10-19 01:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_produce_commodity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('buyer_name', models.CharField(max_length=200)),
+                ('buyer_phone', phonenumber_field.modelfields.PhoneNumberField(max_length=128, region='IN')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('price', models.DecimalField(decimal_places=2, help_text='Price per unit when ordered', max_digits=10)),
+                ('status', models.CharField(choices=[('reserved', 'Reserved'), ('confirmed', 'Confirmed'), ('cancelled', 'Cancelled')], default='reserved', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='produce',
+            constraint=models.CheckConstraint(check=models.Q(('quantity__gte', 0)), name='produce_quantity_non_negative'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='produce',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='dashboard.produce'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.5 on 2026-10-19 01:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('landing', '0037_user_fidc_default'),
+        ('dashboard', '0009_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('commodity', models.CharField(help_text='Normalized commodity', max_length=100)),
+                ('state', models.CharField(max_length=100)),
+                ('direction', models.CharField(choices=[('above', 'Rises to or above'), ('below', 'Falls to or below')], max_length=10)),
+                ('threshold', models.DecimalField(decimal_places=2, help_text='Rs/quintal', max_digits=10)),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('triggered_at', models.DateTimeField(blank=True, null=True)),
+                ('triggered_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('triggered_market', models.CharField(blank=True, max_length=255)),
+                ('farmer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to='landing.user')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('active', True)), fields=['threshold'], name='pricealert_active_idx'), models.Index(fields=['farmer', '-created_at'], name='pricealert_farmer_idx')],
+            },
+        ),
+    ]
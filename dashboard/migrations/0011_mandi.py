@@ -0,0 +1,30 @@
+# Generated by Django 4.2.5 on 2026-10-19 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_pricealert'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Mandi',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('district', models.CharField(blank=True, max_length=255)),
+                ('state', models.CharField(max_length=100)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('geohash', models.CharField(blank=True, db_index=True, max_length=12)),
+                ('geocoded_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='mandi',
+            constraint=models.UniqueConstraint(fields=('state', 'district', 'name'), name='mandi_unique_market'),
+        ),
+    ]
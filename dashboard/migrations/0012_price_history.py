@@ -0,0 +1,52 @@
+# Generated by Django 4.2.5 on 2026-10-19 01:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_mandi'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('commodity', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('modal_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('method', models.CharField(max_length=20)),
+                ('made_at', models.DateTimeField()),
+                ('mandi', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='dashboard.mandi')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MarketPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('commodity', models.CharField(help_text='Normalized commodity', max_length=100)),
+                ('arrival_date', models.DateField()),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('modal_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('mandi', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='dashboard.mandi')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='priceforecast',
+            constraint=models.UniqueConstraint(fields=('mandi', 'commodity', 'date'), name='priceforecast_unique_day'),
+        ),
+        migrations.AddIndex(
+            model_name='marketprice',
+            index=models.Index(fields=['arrival_date'], name='marketprice_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='marketprice',
+            constraint=models.UniqueConstraint(fields=('mandi', 'commodity', 'arrival_date'), name='marketprice_unique_day'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.5 on 2026-10-19 01:43
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# dashboard.rollups as of this migration, copied so the backfill doesn't
+# change when the live module does
+FIELDS = ("listings", "priced_listings", "quantity", "price_sum", "value")
+CENTS = Decimal("0.01")
+QUINTALS_PER_UNIT = {
+    "quintal": Decimal(1),
+    "quintals": Decimal(1),
+    "kg": Decimal("0.01"),
+    "kgs": Decimal("0.01"),
+    "tonne": Decimal(10),
+    "tonnes": Decimal(10),
+}
+
+
+def contribution(price, quantity, unit):
+    quantity = Decimal(quantity)
+    if quantity <= 0:
+        return None
+    quintals = QUINTALS_PER_UNIT.get(str(unit).strip().lower())
+    if quintals is None:
+        return (1, 0, Decimal(0), Decimal(0), Decimal(0))
+    volume = (quantity * quintals).quantize(CENTS)
+    price = (Decimal(price) / quintals).quantize(CENTS)
+    return (1, 1, volume, price, (price * volume).quantize(CENTS))
+
+
+def backfill_rollups(apps, schema_editor):
+    Produce = apps.get_model('dashboard', 'Produce')
+    MarketRollup = apps.get_model('dashboard', 'MarketRollup')
+    rows = defaultdict(lambda: [0, 0, Decimal(0), Decimal(0), Decimal(0)])
+    for state, commodity, price, quantity, unit in Produce.objects.filter(quantity__gt=0).values_list(
+        'farmer__state', 'commodity', 'price', 'quantity', 'unit',
+    ).iterator(chunk_size=5000):
+        vector = contribution(price, quantity, unit)
+        if vector is not None:
+            row = rows[(state or "", commodity or "")]
+            for i, value in enumerate(vector):
+                row[i] += value
+    MarketRollup.objects.bulk_create([
+        MarketRollup(state=state, commodity=commodity, **dict(zip(FIELDS, row)))
+        for (state, commodity), row in rows.items()
+    ], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_price_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(blank=True, max_length=100)),
+                ('commodity', models.CharField(blank=True, max_length=100)),
+                ('listings', models.IntegerField(default=0)),
+                ('priced_listings', models.IntegerField(default=0)),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, help_text='Quintals', max_digits=16)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, help_text='Sum of Rs/quintal asks', max_digits=18)),
+                ('value', models.DecimalField(decimal_places=2, default=0, help_text='Sum of price x quantity', max_digits=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='marketrollup',
+            constraint=models.UniqueConstraint(fields=('state', 'commodity'), name='marketrollup_unique_key'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
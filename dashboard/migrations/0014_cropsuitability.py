@@ -0,0 +1,35 @@
+# Generated by Django 4.2.5 on 2026-10-19 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_marketrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CropSuitability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pincode', models.IntegerField()),
+                ('state', models.CharField(blank=True, max_length=100)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('crop', models.CharField(max_length=50)),
+                ('probability', models.FloatField()),
+                ('source', models.CharField(max_length=10)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['crop', '-probability'], name='cropsuitability_crop_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cropsuitability',
+            constraint=models.UniqueConstraint(fields=('pincode', 'rank'), name='cropsuitability_unique_rank'),
+        ),
+    ]
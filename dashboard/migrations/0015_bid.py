@@ -0,0 +1,37 @@
+# Generated by Django 4.2.5 on 2026-10-19 02:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0014_cropsuitability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Bid',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('commodity', models.CharField(max_length=100)),
+                ('price', models.DecimalField(decimal_places=2, help_text='Most the buyer will pay per unit', max_digits=10)),
+                ('quantity', models.DecimalField(decimal_places=2, help_text='Quantity bid for', max_digits=10)),
+                ('buyer_name', models.CharField(max_length=200)),
+                ('buyer_phone', phonenumber_field.modelfields.PhoneNumberField(max_length=128, region='IN')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='fill_ref',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='bid',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='dashboard.bid'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.5 on 2026-10-19 02:10
+
+from django.db import migrations, models
+
+
+def count_listings_with_stock(apps, schema_editor):
+    Produce = apps.get_model('dashboard', 'Produce')
+    ListingStats = apps.get_model('dashboard', 'ListingStats')
+    with_stock = dict(
+        Produce.objects.filter(quantity__gt=0, farmer__isnull=False).values_list('farmer_id').annotate(
+            count=models.Count('id'),
+        ).order_by()
+    )
+    stats = list(ListingStats.objects.all())
+    for row in stats:
+        if row.farmerid == 0:
+            row.listing_count = sum(with_stock.values())
+        else:
+            row.listing_count = with_stock.get(row.farmerid, 0)
+    ListingStats.objects.bulk_update(stats, ['listing_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0015_bid'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listingstats',
+            name='listing_count',
+            field=models.IntegerField(default=0, help_text='Listings with stock left'),
+        ),
+        migrations.RunPython(count_listings_with_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.5 on 2026-10-19 02:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('landing', '0037_user_fidc_default'),
+        ('dashboard', '0016_listingstats_active_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='produce',
+            name='farmer',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='produces', to='landing.user'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.5 on 2026-10-19 02:32
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+# settings.MATCHING_BID_DAYS's default when this migration was written
+BID_DAYS = 7
+
+
+def bring_bids_up_to_date(apps, schema_editor):
+    # Bids kept the quantity they were placed for; take their fills off
+    Bid = apps.get_model('dashboard', 'Bid')
+    bids = list(Bid.objects.annotate(filled=Sum('orders__quantity')))
+    for bid in bids:
+        bid.quantity = max(bid.quantity - (bid.filled or 0), 0)
+        bid.status = 'filled' if bid.quantity == 0 else 'open'
+        bid.expires_at = bid.created_at + timedelta(days=BID_DAYS)
+    Bid.objects.bulk_update(bids, ['quantity', 'status', 'expires_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0017_produce_farmer_no_fk_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bid',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bid',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('filled', 'Filled'), ('cancelled', 'Cancelled'), ('expired', 'Expired')], default='open', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='bid',
+            name='quantity',
+            field=models.DecimalField(decimal_places=2, help_text='Quantity still wanted', max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['expires_at'], name='bid_open_expiry_idx'),
+        ),
+        migrations.RunPython(bring_bids_up_to_date, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,24 @@
 from django.db import models
+from phonenumber_field.modelfields import PhoneNumberField
 from landing.models import User
+from .commodities import commodity_for
+
+
+class ProduceQuerySet(models.QuerySet):
+    def active(self):
+        # A listing stays on the market until its quantity is used up
+        return self.filter(quantity__gt=0)
 
-def getDetailsFromUID(id):
-    obj = User.objects.get(id=id)
-    return obj
 
 # Create your models here.
 class Produce(models.Model):
-    farmerid = models.IntegerField(default=0)
+    # produce_farmer_created_idx leads with farmer and serves its lookups
+    farmer = models.ForeignKey(User, null=True, on_delete=models.CASCADE, related_name='produces', db_index=False)
 
     # Product details
     name = models.CharField(max_length=255, help_text="Product name")
+    # Agmarknet commodity the name maps to (see dashboard.commodities); set on save
+    commodity = models.CharField(max_length=100, blank=True, help_text="Normalized commodity")
     price = models.DecimalField(max_digits=10, decimal_places=2, help_text="Price per unit")
     
     # Quantity and unit of measurement
@@ -19,7 +27,255 @@ class Produce(models.Model):
 
     # Date and time of listing
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProduceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['farmer', 'created_at'], name='produce_farmer_created_idx'),
+            models.Index(fields=['commodity', 'price'], name='produce_commodity_price_idx'),
+            # Serves the public marketplace's keyset pagination on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='produce_active_recent_idx', condition=models.Q(quantity__gt=0)),
+        ]
+        constraints = [
+            # Backstop for the conditional decrements in dashboard.orders
+            models.CheckConstraint(check=models.Q(quantity__gte=0), name='produce_quantity_non_negative'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.commodity = commodity_for(self.name)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'commodity'}
+        super().save(*args, **kwargs)
 
     @property
     def user(self):
-        return getDetailsFromUID(self.farmerid)
\ No newline at end of file
+        return self.farmer
+
+
+class PriceAlert(models.Model):
+    """Tell a farmer when a commodity's modal price in a state crosses a
+    threshold (see dashboard.alerts). Fires once, then stays off until re-armed."""
+    ABOVE = 'above'
+    BELOW = 'below'
+    DIRECTION_CHOICES = [
+        (ABOVE, 'Rises to or above'),
+        (BELOW, 'Falls to or below'),
+    ]
+
+    farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='price_alerts')
+    commodity = models.CharField(max_length=100, help_text="Normalized commodity")
+    state = models.CharField(max_length=100)
+    direction = models.CharField(max_length=10, choices=DIRECTION_CHOICES)
+    threshold = models.DecimalField(max_digits=10, decimal_places=2, help_text="Rs/quintal")
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # The record that set it off
+    triggered_at = models.DateTimeField(null=True, blank=True)
+    triggered_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    triggered_market = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['threshold'], name='pricealert_active_idx', condition=models.Q(active=True)),
+            models.Index(fields=['farmer', '-created_at'], name='pricealert_farmer_idx'),
+        ]
+
+
+class Mandi(models.Model):
+    """A market named in the data.gov.in price records, located once by
+    `manage.py geocode_mandis` (see dashboard.mandis)."""
+    name = models.CharField(max_length=255)
+    district = models.CharField(max_length=255, blank=True)
+    state = models.CharField(max_length=100)
+
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # See dashboard.geo; empty until located
+    geohash = models.CharField(blank=True, max_length=12, db_index=True)
+    # Last lookup, whether or not it found the market
+    geocoded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['state', 'district', 'name'], name='mandi_unique_market'),
+        ]
+
+    def __str__(self):
+        return f"{self.name}, {self.district}, {self.state}"
+
+
+class MarketPrice(models.Model):
+    """Daily price history: one row per market, commodity and arrival date,
+    recorded from each price refresh."""
+    mandi = models.ForeignKey(Mandi, on_delete=models.CASCADE, related_name='prices')
+    commodity = models.CharField(max_length=100, help_text="Normalized commodity")
+    arrival_date = models.DateField()
+    min_price = models.DecimalField(max_digits=10, decimal_places=2)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2)
+    modal_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mandi', 'commodity', 'arrival_date'], name='marketprice_unique_day'),
+        ]
+        indexes = [
+            models.Index(fields=['arrival_date'], name='marketprice_date_idx'),
+        ]
+
+
+class PriceForecast(models.Model):
+    """Modal price forecasts per market and commodity for the coming days,
+    written by `manage.py forecast_prices` (dashboard.forecasting). Pages only
+    read them."""
+    mandi = models.ForeignKey(Mandi, on_delete=models.CASCADE, related_name='forecasts')
+    commodity = models.CharField(max_length=100)
+    date = models.DateField()
+    modal_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # 80% band from the method's hold-out error
+    low = models.DecimalField(max_digits=10, decimal_places=2)
+    high = models.DecimalField(max_digits=10, decimal_places=2)
+    method = models.CharField(max_length=20)
+    made_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mandi', 'commodity', 'date'], name='priceforecast_unique_day'),
+        ]
+
+
+class CropSuitability(models.Model):
+    """The best-suited crops for a pincode's typical conditions, written by
+    `manage.py build_crop_suitability` (dashboard.suitability). Pages only
+    read them."""
+    pincode = models.IntegerField()
+    state = models.CharField(max_length=100, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    rank = models.PositiveSmallIntegerField()
+    crop = models.CharField(max_length=50)
+    probability = models.FloatField()
+    # Where the soil figures came from: the pincode's own profile, its state's, or the defaults
+    source = models.CharField(max_length=10)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pincode', 'rank'], name='cropsuitability_unique_rank'),
+        ]
+        indexes = [
+            models.Index(fields=['crop', '-probability'], name='cropsuitability_crop_idx'),
+        ]
+
+
+class ListingStats(models.Model):
+    """Materialized listing counters, kept current by the Produce signals and
+    by dashboard.orders as reservations sell listings out or give stock back.
+
+    One row per farmer, plus the row with farmerid=GLOBAL for marketplace totals.
+    """
+    GLOBAL = 0
+
+    farmerid = models.IntegerField(unique=True)
+    listing_count = models.IntegerField(default=0, help_text="Listings with stock left")
+    latest_listing = models.ForeignKey(Produce, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+
+    class Meta:
+        verbose_name_plural = "listing stats"
+
+    def __str__(self):
+        return f"Listing stats for {'all farmers' if self.farmerid == self.GLOBAL else self.farmerid}"
+
+
+class MarketRollup(models.Model):
+    """Active listing totals per seller state and commodity, kept current
+    incrementally by dashboard.rollups. Volume and prices are in quintals."""
+    state = models.CharField(max_length=100, blank=True)
+    commodity = models.CharField(max_length=100, blank=True)
+    listings = models.IntegerField(default=0)
+    # Listings in a unit that converts to quintals; the rest are only counted
+    priced_listings = models.IntegerField(default=0)
+    quantity = models.DecimalField(max_digits=16, decimal_places=2, default=0, help_text="Quintals")
+    price_sum = models.DecimalField(max_digits=18, decimal_places=2, default=0, help_text="Sum of Rs/quintal asks")
+    value = models.DecimalField(max_digits=20, decimal_places=2, default=0, help_text="Sum of price x quantity")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['state', 'commodity'], name='marketrollup_unique_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.commodity or 'Other'} in {self.state or 'unknown state'}: {self.listings} listings"
+
+
+class Bid(models.Model):
+    """A buyer's bid on a commodity's order book (see dashboard.matching).
+    The books and their log refer to bids by id only; the buyer's contact
+    details are kept here. An open bid rests on its book until it fills,
+    the buyer cancels it or it expires."""
+
+    OPEN = 'open'
+    FILLED = 'filled'
+    CANCELLED = 'cancelled'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = [
+        (OPEN, 'Open'),
+        (FILLED, 'Filled'),
+        (CANCELLED, 'Cancelled'),
+        (EXPIRED, 'Expired'),
+    ]
+
+    commodity = models.CharField(max_length=100)
+    price = models.DecimalField(max_digits=10, decimal_places=2, help_text="Most the buyer will pay per unit")
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, help_text="Quantity still wanted")
+    buyer_name = models.CharField(max_length=200)
+    buyer_phone = PhoneNumberField(region='IN')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='bid_open_expiry_idx', condition=models.Q(status='open')),
+        ]
+
+    def __str__(self):
+        return f"Bid {self.id}: {self.quantity} of {self.commodity} at {self.price}"
+
+
+class Order(models.Model):
+    """A buyer's claim on part of a listing. Reserving takes the quantity off
+    the listing straight away; cancelling puts it back (see dashboard.orders)."""
+
+    RESERVED = 'reserved'
+    CONFIRMED = 'confirmed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (RESERVED, 'Reserved'),
+        (CONFIRMED, 'Confirmed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    produce = models.ForeignKey(Produce, on_delete=models.CASCADE, related_name='orders')
+    buyer_name = models.CharField(max_length=200)
+    buyer_phone = PhoneNumberField(region='IN')
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    price = models.DecimalField(max_digits=10, decimal_places=2, help_text="Price per unit when ordered")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=RESERVED)
+    # Set when the order settles an order-book fill
+    bid = models.ForeignKey(Bid, null=True, blank=True, on_delete=models.SET_NULL, related_name='orders')
+    fill_ref = models.CharField(max_length=32, null=True, blank=True, unique=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.id}: {self.quantity} of listing {self.produce_id} ({self.status})"
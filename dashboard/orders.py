@@ -0,0 +1,113 @@
+"""Reserving, confirming and cancelling orders against listings.
+
+Stock is moved with conditional UPDATEs (``quantity >= n`` in the WHERE
+clause, ``F('quantity') - n`` in the SET) rather than read-modify-write, so
+concurrent buyers can't oversell a lot or lose each other's updates; the
+database decides which of them get the last units. Order status changes
+are conditional the same way, so an order is released at most once.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import matching, rollups
+from .cachekeys import invalidate_tags
+from .models import Order, Produce
+from .stats import record_stock_changed
+
+
+class OutOfStock(Exception):
+    """The listing is gone or has less than the requested quantity left."""
+
+
+class OrderStateError(Exception):
+    """The order has already moved on (confirmed or cancelled)."""
+
+
+def _listings_changed(farmer_id):
+    # Queryset updates skip the Produce signals (rollups are adjusted inside
+    # the transactions instead). Once committed, so a reader can't cache the
+    # old stock again in between; right away outside a transaction
+    transaction.on_commit(lambda: invalidate_tags(f"listings:farmer:{farmer_id}", "listings"))
+
+
+def reserve(produce_id, quantity, buyer_name, buyer_phone, price=None, bid=None, fill_ref=None):
+    """Take `quantity` off a listing and record the order, or raise OutOfStock.
+    The order is at the listing's price unless `price` is given. `bid` and
+    `fill_ref` are set when the order settles an order-book fill."""
+    if quantity <= 0:
+        raise ValueError("Quantity must be positive")
+    with transaction.atomic():
+        # The write comes first so SQLite takes the write lock before any read
+        taken = Produce.objects.filter(id=produce_id, quantity__gte=quantity).update(
+            quantity=F('quantity') - quantity, updated_at=timezone.now(),
+        )
+        if not taken:
+            raise OutOfStock(f"Less than {quantity} left on listing {produce_id}")
+        rollups.quantity_changed(produce_id, -quantity)
+        listed_price, farmer_id, left = Produce.objects.values_list('price', 'farmer_id', 'quantity').get(id=produce_id)
+        if farmer_id is not None:
+            record_stock_changed(farmer_id, left + quantity, left)
+        order = Order.objects.create(
+            produce_id=produce_id,
+            buyer_name=buyer_name,
+            buyer_phone=buyer_phone,
+            quantity=quantity,
+            price=listed_price if price is None else price,
+            bid=bid,
+            fill_ref=fill_ref,
+        )
+        if fill_ref is None:
+            # A fill is already off the book
+            matching.sync_on_commit([produce_id])
+    _listings_changed(farmer_id)
+    return order
+
+
+def _move(order_id, to_status, farmer_id=None):
+    orders = Order.objects.filter(id=order_id, status=Order.RESERVED)
+    if farmer_id is not None:
+        orders = orders.filter(produce__farmer_id=farmer_id)
+    if not orders.update(status=to_status, updated_at=timezone.now()):
+        raise OrderStateError(f"Order {order_id} is not an open reservation")
+
+
+def confirm(order_id, farmer_id=None):
+    """Mark a reservation as sold. With `farmer_id`, only that farmer's orders."""
+    with transaction.atomic():
+        _move(order_id, Order.CONFIRMED, farmer_id)
+
+
+def cancel(order_id, farmer_id=None):
+    """Release a reservation and put its quantity back on the listing."""
+    with transaction.atomic():
+        _move(order_id, Order.CANCELLED, farmer_id)
+        produce_id, quantity, owner_id = Order.objects.values_list(
+            'produce_id', 'quantity', 'produce__farmer_id',
+        ).get(id=order_id)
+        Produce.objects.filter(id=produce_id).update(
+            quantity=F('quantity') + quantity, updated_at=timezone.now(),
+        )
+        rollups.quantity_changed(produce_id, quantity)
+        left = Produce.objects.values_list('quantity', flat=True).get(id=produce_id)
+        if owner_id is not None:
+            record_stock_changed(owner_id, left - quantity, left)
+        matching.sync_on_commit([produce_id])
+    _listings_changed(owner_id)
+
+
+def release_expired(older_than):
+    """Cancel reservations left open for longer than `older_than` (a timedelta).
+    Returns how many were released."""
+    cutoff = timezone.now() - older_than
+    released = 0
+    stale = Order.objects.filter(status=Order.RESERVED, created_at__lt=cutoff).values_list('id', flat=True)
+    for order_id in list(stale):
+        try:
+            cancel(order_id)
+            released += 1
+        except OrderStateError:
+            # Confirmed or cancelled since the query
+            pass
+    return released
+
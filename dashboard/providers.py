@@ -0,0 +1,269 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from . import simulator, timing
+from .ratelimit import RateLimitExceeded, TokenBucket
+
+# Status codes worth another attempt; anything else is returned to the caller as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+DEFAULT_PROVIDER_CONFIG = {
+    "connect_timeout": 3.05,
+    "read_timeout": 10,
+    "retries": 2,
+    "backoff": 0.3,
+    "backoff_max": 3,
+    "failure_threshold": 5,
+    "reset_timeout": 30,
+    "pool_connections": 4,
+    "pool_maxsize": 16,
+    # {"calls": N, "period": seconds, "burst": M}; None means unmetered
+    "rate_limit": None,
+}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling a provider whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Per-provider breaker: closed -> open after N consecutive failures,
+    half-open after `reset_timeout` seconds to let one trial call through."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Only the first caller after the cool-down gets the trial call
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def release(self):
+        """Hand back a trial call that never reached the provider, so the
+        next caller gets it."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ProviderMetrics:
+    """Per-call latency and outcome counters for one provider."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.short_circuited = 0
+        self.rate_limited = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency, error=False):
+        with self._lock:
+            self.calls += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            if error:
+                self.errors += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_short_circuit(self):
+        with self._lock:
+            self.short_circuited += 1
+
+    def record_rate_limited(self):
+        with self._lock:
+            self.rate_limited += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retries,
+                "short_circuited": self.short_circuited,
+                "rate_limited": self.rate_limited,
+                "avg_latency_ms": round(1000 * self.total_latency / self.calls, 2) if self.calls else 0.0,
+                "max_latency_ms": round(1000 * self.max_latency, 2),
+            }
+
+
+class ProviderClient:
+    """Shared HTTP client for one external provider.
+
+    Holds a keep-alive connection pool, retries transient failures with
+    jittered exponential backoff and short-circuits while the provider is down.
+    """
+
+    def __init__(self, name, retry_on=(), **config):
+        self.name = name
+        self.retry_on = retry_on
+        self.config = {**DEFAULT_PROVIDER_CONFIG, **config}
+        self.breaker = CircuitBreaker(self.config["failure_threshold"], self.config["reset_timeout"])
+        self.metrics = ProviderMetrics()
+        rate_limit = self.config["rate_limit"]
+        self.limiter = TokenBucket(name, **rate_limit) if rate_limit else None
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        return (self.config["connect_timeout"], self.config["read_timeout"])
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    if simulator.is_enabled():
+                        adapter = simulator.SimulatedAdapter(self.name)
+                    else:
+                        adapter = HTTPAdapter(
+                            pool_connections=self.config["pool_connections"],
+                            pool_maxsize=self.config["pool_maxsize"],
+                        )
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter keeps workers from retrying in lockstep
+        cap = min(self.config["backoff_max"], self.config["backoff"] * (2 ** attempt))
+        time.sleep(random.uniform(0, cap))
+
+    @property
+    def _retryable(self):
+        return (requests.exceptions.ConnectionError, requests.exceptions.Timeout) + tuple(self.retry_on)
+
+    def call(self, fn, *args, **kwargs):
+        """Run `fn` under this provider's breaker, retry policy and metrics.
+
+        `fn` should raise on failure; connection errors, timeouts and any
+        types in `retry_on` are retried, everything else fails immediately.
+        """
+        with timing.timed("provider", self.name):
+            return self._call(fn, *args, **kwargs)
+
+    def _call(self, fn, *args, **kwargs):
+        if not self.breaker.allow():
+            self.metrics.record_short_circuit()
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        attempts = self.config["retries"] + 1
+        for attempt in range(attempts):
+            # Every attempt, retries included, counts against the provider's quota
+            if self.limiter is not None and not self.limiter.acquire():
+                self.metrics.record_rate_limited()
+                # Refused calls tell nothing about the provider's health
+                self.breaker.release()
+                raise RateLimitExceeded(f"{self.name} quota budget exhausted")
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except self._retryable:
+                self.metrics.record(time.perf_counter() - start, error=True)
+                if attempt + 1 < attempts:
+                    self.metrics.record_retry()
+                    self._sleep_before_retry(attempt)
+                    continue
+                self.breaker.record_failure()
+                raise
+            except requests.exceptions.HTTPError as e:
+                self.metrics.record(time.perf_counter() - start, error=True)
+                status = e.response.status_code if e.response is not None else None
+                if status in RETRY_STATUSES and attempt + 1 < attempts:
+                    self.metrics.record_retry()
+                    self._sleep_before_retry(attempt)
+                    continue
+                if status is None or status >= 500 or status == 429:
+                    self.breaker.record_failure()
+                else:
+                    # A 4xx is our mistake, not an outage
+                    self.breaker.record_success()
+                raise
+            except Exception:
+                self.metrics.record(time.perf_counter() - start, error=True)
+                self.breaker.record_failure()
+                raise
+            self.metrics.record(time.perf_counter() - start)
+            self.breaker.record_success()
+            return result
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+
+        def _get():
+            response = self.session.get(url, **kwargs)
+            response.raise_for_status()
+            return response
+
+        return self.call(_get)
+
+    def get_json(self, url, **kwargs):
+        return self.get(url, **kwargs).json()
+
+    def remaining_budget(self):
+        return self.limiter.remaining() if self.limiter is not None else None
+
+    def snapshot(self):
+        return {
+            "state": self.breaker.state,
+            "remaining_budget": self.remaining_budget(),
+            **self.metrics.snapshot(),
+        }
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name, retry_on=()):
+    """Return the process-wide client for `name`, creating it on first use."""
+    client = _providers.get(name)
+    if client is None:
+        with _providers_lock:
+            client = _providers.get(name)
+            if client is None:
+                config = getattr(settings, "PROVIDER_CLIENTS", {}).get(name, {})
+                client = ProviderClient(name, retry_on=retry_on, **config)
+                _providers[name] = client
+    return client
+
+
+def provider_snapshot():
+    return {name: client.snapshot() for name, client in sorted(_providers.items())}
@@ -0,0 +1,60 @@
+import time
+import uuid
+
+import requests
+from django.core.cache import cache
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """Raised instead of calling a provider whose quota budget is spent."""
+
+
+class TokenBucket:
+    """Token bucket whose state lives in the shared cache, so every worker
+    draws from the same budget.
+
+    `calls` tokens refill evenly over `period` seconds; `burst` caps how many
+    can be spent at once (defaults to `calls`).
+    """
+
+    def __init__(self, name, calls, period, burst=None):
+        self.name = name
+        self.rate = calls / period
+        self.capacity = burst or calls
+        self.period = period
+        self.key = f"ratelimit:{name}"
+
+    def _refilled(self, state, now):
+        if state is None:
+            return {"tokens": float(self.capacity), "ts": now}
+        tokens = min(self.capacity, state["tokens"] + (now - state["ts"]) * self.rate)
+        return {"tokens": tokens, "ts": now}
+
+    def acquire(self, tokens=1):
+        lock_key = f"{self.key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + 0.2
+        while not cache.add(lock_key, token, timeout=2):
+            if time.monotonic() >= deadline:
+                # Can't tell whether there's budget left; letting the call through
+                # would overspend the quota whenever the limiter is busiest
+                logger.warning(f"Rate limiter lock for {self.name} contended, refusing call")
+                return False
+            time.sleep(0.005)
+        try:
+            state = self._refilled(cache.get(self.key), time.time())
+            allowed = state["tokens"] >= tokens
+            if allowed:
+                state["tokens"] -= tokens
+            cache.set(self.key, state, timeout=int(self.period * 2))
+            return allowed
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    def remaining(self):
+        return int(self._refilled(cache.get(self.key), time.time())["tokens"])
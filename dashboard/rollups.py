@@ -0,0 +1,180 @@
+"""Marketplace totals per (seller state, commodity), maintained incrementally.
+
+Every write path that changes what a listing contributes reports it here,
+and the MarketRollup rows it touches are adjusted with F() increments in
+the same transaction:
+
+* saves and deletes of single listings, through the Produce signals
+  (the old values are read in pre_save / pre_delete);
+* bulk uploads (bulk_listings.create_listings);
+* reservations and cancellations (dashboard.orders), which move quantity
+  with queryset updates;
+* a farmer's state changing, through the User signals.
+
+Only active listings (quantity > 0) count. Quantities and prices are
+converted to quintals where the unit allows; listings in other units are
+counted but left out of volume and prices. ``rebuild()`` recomputes the
+table from the listings, for backfills and after bulk updates to farmers.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from .market_prices import QUINTALS_PER_UNIT
+from .models import MarketRollup, Produce
+
+FIELDS = ("listings", "priced_listings", "quantity", "price_sum", "value")
+CENTS = Decimal("0.01")
+
+
+def contribution(price, quantity, unit):
+    """What one listing adds to its row, as a FIELDS tuple; None if inactive."""
+    quantity = Decimal(quantity)
+    if quantity <= 0:
+        return None
+    quintals = QUINTALS_PER_UNIT.get(str(unit).strip().lower())
+    if quintals is None:
+        return (1, 0, Decimal(0), Decimal(0), Decimal(0))
+    volume = (quantity * quintals).quantize(CENTS)
+    price = (Decimal(price) / quintals).quantize(CENTS)
+    return (1, 1, volume, price, (price * volume).quantize(CENTS))
+
+
+class Deltas:
+    """Changes to apply, summed per (state, commodity)."""
+
+    def __init__(self):
+        self.rows = defaultdict(lambda: [0, 0, Decimal(0), Decimal(0), Decimal(0)])
+
+    def add(self, state, commodity, price, quantity, unit, sign=1):
+        vector = contribution(price, quantity, unit)
+        if vector is not None:
+            row = self.rows[(state or "", commodity or "")]
+            for i, value in enumerate(vector):
+                row[i] += sign * value
+        return self
+
+    def apply(self):
+        now = timezone.now()
+        with transaction.atomic():
+            for (state, commodity), row in sorted(self.rows.items()):
+                if not any(row):
+                    continue
+                MarketRollup.objects.get_or_create(state=state, commodity=commodity)
+                MarketRollup.objects.filter(state=state, commodity=commodity).update(
+                    updated_at=now, **{field: F(field) + value for field, value in zip(FIELDS, row)},
+                )
+
+
+def snapshot(produce_id):
+    """(state, commodity, price, quantity, unit) of a stored listing, or None."""
+    return Produce.objects.filter(id=produce_id).values_list(
+        'farmer__state', 'commodity', 'price', 'quantity', 'unit',
+    ).first()
+
+
+def listing_changed(before, after):
+    """Replace a listing's old snapshot (None when new) with its new one (None
+    when deleted)."""
+    deltas = Deltas()
+    if before is not None:
+        deltas.add(*before, sign=-1)
+    if after is not None:
+        deltas.add(*after)
+    deltas.apply()
+
+
+def quantity_changed(produce_id, change):
+    """Account for a queryset update that has already moved a listing's
+    quantity by `change`."""
+    after = snapshot(produce_id)
+    if after is not None:
+        state, commodity, price, quantity, unit = after
+        listing_changed((state, commodity, price, quantity - change, unit), after)
+
+
+def listings_created(state, produces):
+    deltas = Deltas()
+    for produce in produces:
+        deltas.add(state, produce.commodity, produce.price, produce.quantity, produce.unit)
+    deltas.apply()
+
+
+def farmer_moved(farmer_id, old_state, new_state):
+    """Move a farmer's active listings from one state's rows to another's."""
+    deltas = Deltas()
+    for commodity, price, quantity, unit in Produce.objects.active().filter(farmer_id=farmer_id).values_list(
+        'commodity', 'price', 'quantity', 'unit',
+    ):
+        deltas.add(old_state, commodity, price, quantity, unit, sign=-1)
+        deltas.add(new_state, commodity, price, quantity, unit)
+    deltas.apply()
+
+
+def totals(listings):
+    """Deltas for (state, commodity, price, quantity, unit) tuples from scratch."""
+    deltas = Deltas()
+    for listing in listings:
+        deltas.add(*listing)
+    return deltas
+
+
+def rebuild():
+    """Recompute every row from the listings. One pass over active listings."""
+    with transaction.atomic():
+        # The delete comes first so SQLite takes the write lock before the
+        # listings are read; no listing can change between reading and writing
+        MarketRollup.objects.all().delete()
+        deltas = totals(Produce.objects.active().values_list(
+            'farmer__state', 'commodity', 'price', 'quantity', 'unit',
+        ).iterator(chunk_size=5000))
+        deltas.apply()
+    return len(deltas.rows)
+
+
+def _figures(row, prefix=""):
+    priced, quantity = row[f'{prefix}priced_listings'] or 0, row[f'{prefix}quantity'] or 0
+    return {
+        'listings': row[f'{prefix}listings'] or 0,
+        'quantity_quintals': Decimal(quantity).quantize(CENTS),
+        'avg_price': (row[f'{prefix}price_sum'] / priced).quantize(CENTS) if priced else None,
+        'weighted_price': (row[f'{prefix}value'] / quantity).quantize(CENTS) if quantity else None,
+    }
+
+
+def analytics(state="", commodity="", limit=100):
+    """Marketplace figures read from the rollups alone: overall totals, per
+    state, per commodity, and the top `limit` (state, commodity) pairs by
+    listing count, optionally narrowed to one state and/or commodity.
+    Prices are Rs/quintal: `avg_price` is the plain mean ask,
+    `weighted_price` the volume-weighted one."""
+    rows = MarketRollup.objects.all()
+    if state:
+        rows = rows.filter(state__iexact=state)
+    if commodity:
+        rows = rows.filter(commodity=commodity)
+    # Rows that just emptied still count as a change
+    latest = rows.aggregate(latest=Max('updated_at'))['latest']
+    rows = rows.filter(listings__gt=0)
+    # Annotations can't reuse the field names
+    sums = {f'total_{field}': Sum(field) for field in FIELDS}
+
+    def grouped(field):
+        return rows.values(field).annotate(**sums).order_by('-total_listings', field)
+
+    overall = rows.aggregate(**sums)
+    return {
+        'totals': _figures(overall, 'total_'),
+        'states': [{'state': row['state'], **_figures(row, 'total_')} for row in grouped('state')],
+        'commodities': [{'commodity': row['commodity'], **_figures(row, 'total_')} for row in grouped('commodity')],
+        'markets': [
+            {'state': row['state'], 'commodity': row['commodity'], **_figures(row)}
+            for row in rows.order_by('-listings', 'state', 'commodity').values(
+                'state', 'commodity', *FIELDS,
+            )[:limit]
+        ],
+        'updated_at': latest,
+    }
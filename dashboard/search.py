@@ -0,0 +1,121 @@
+"""Listing search over an SQLite FTS5 trigram index.
+
+``produce_search`` indexes Produce.name and Produce.commodity and is kept in
+step by triggers, so every write path (including bulk_create) is covered.
+Schema migrations that rebuild dashboard_produce drop those triggers; the
+post_migrate hook (``install``) puts them back and reindexes when needed.
+On other databases, or SQLite builds without the trigram tokenizer, search
+falls back to a plain icontains filter.
+"""
+import logging
+
+from django.db import DatabaseError, connection, connections
+from django.db.models.expressions import RawSQL
+
+from .commodities import clean, normalize, similarity
+
+logger = logging.getLogger(__name__)
+
+TABLE = "produce_search"
+TRIGGERS = {
+    f"{TABLE}_ai": f"""
+        CREATE TRIGGER {TABLE}_ai AFTER INSERT ON dashboard_produce BEGIN
+            INSERT INTO {TABLE} (rowid, name, commodity) VALUES (new.id, new.name, new.commodity);
+        END""",
+    f"{TABLE}_ad": f"""
+        CREATE TRIGGER {TABLE}_ad AFTER DELETE ON dashboard_produce BEGIN
+            INSERT INTO {TABLE} ({TABLE}, rowid, name, commodity) VALUES ('delete', old.id, old.name, old.commodity);
+        END""",
+    f"{TABLE}_au": f"""
+        CREATE TRIGGER {TABLE}_au AFTER UPDATE OF name, commodity ON dashboard_produce BEGIN
+            INSERT INTO {TABLE} ({TABLE}, rowid, name, commodity) VALUES ('delete', old.id, old.name, old.commodity);
+            INSERT INTO {TABLE} (rowid, name, commodity) VALUES (new.id, new.name, new.commodity);
+        END""",
+}
+# Fuzzy matches are ranked from at most this many trigram hits
+FUZZY_CANDIDATES = 500
+
+_available = {}
+
+
+def install(using=connection):
+    """Create the index and its triggers if missing. Returns False where FTS5
+    trigram search isn't supported."""
+    if using.vendor != "sqlite":
+        return False
+    with using.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = %s OR type = 'trigger'", [TABLE])
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in TRIGGERS if name not in existing]
+        if TABLE in existing and not missing:
+            _available[using.alias] = True
+            return True
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+                f"name, commodity, content='dashboard_produce', content_rowid='id', tokenize='trigram')"
+            )
+        except DatabaseError as e:
+            logger.info(f"Listing search falls back to LIKE: {str(e)}")
+            return False
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        # Rows written while the triggers were missing are not indexed yet
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')")
+    _available[using.alias] = True
+    return True
+
+
+def is_available(using=connection):
+    if using.alias not in _available:
+        if using.vendor != "sqlite":
+            _available[using.alias] = False
+        else:
+            with using.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [TABLE])
+                _available[using.alias] = cursor.fetchone() is not None
+    return _available[using.alias]
+
+
+def _phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _fuzzy_ids(text, using=connection):
+    """Ids of listings whose name is trigram-similar to `text` (catches typos
+    in names outside the commodity vocabulary)."""
+    grams = [gram for gram in {text[i:i + 3] for i in range(len(text) - 2)} if '"' not in gram]
+    if not grams:
+        return []
+    with using.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, name FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY rank LIMIT %s",
+            [" OR ".join(_phrase(gram) for gram in grams), FUZZY_CANDIDATES],
+        )
+        rows = cursor.fetchall()
+    return [rowid for rowid, name in rows if similarity(text, clean(name)) >= 0.3]
+
+
+def search(queryset, text):
+    """Narrow a Produce queryset to listings matching free text.
+
+    A query that names a known commodity ("tamatar", "tomatos") matches on
+    the indexed commodity column; otherwise the text is looked up in the
+    trigram index as a substring, then as a fuzzy match.
+    """
+    text = " ".join(str(text).split())
+    if not text:
+        return queryset
+    commodity = normalize(text)
+    if commodity:
+        return queryset.filter(commodity=commodity)
+    # The index lives in the database the queryset reads from
+    using = connections[queryset.db]
+    if not is_available(using) or len(text) < 3:
+        return queryset.filter(name__icontains=text)
+
+    matches = RawSQL(f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s", [_phrase(text)])
+    found = queryset.filter(pk__in=matches)
+    if found.exists():
+        return found
+    return queryset.filter(pk__in=_fuzzy_ids(clean(text), using))
@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from landing.models import User
+from . import matching, rollups
+from .cachekeys import invalidate_tags
+from .models import Produce
+from .stats import record_listing_deleted, record_listings_created, record_stock_changed
+
+
+@receiver(pre_save, sender=User)
+def remember_farmer_state(sender, instance, **kwargs):
+    instance._rollup_state = User.objects.filter(id=instance.id).values_list('state', flat=True).first() \
+        if instance.id else None
+
+
+@receiver(post_save, sender=User)
+def move_farmer_rollups(sender, instance, created, **kwargs):
+    before = getattr(instance, '_rollup_state', None)
+    if not created and before is not None and before != instance.state:
+        rollups.farmer_moved(instance.id, before, instance.state)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_farmer(sender, instance, **kwargs):
+    # After commit, or a reader could cache the old row again before it lands
+    tag = f"farmer:{instance.id}"
+    transaction.on_commit(lambda: invalidate_tags(tag))
+
+
+@receiver([post_save, post_delete], sender=Produce)
+def invalidate_listings(sender, instance, **kwargs):
+    tag = f"listings:farmer:{instance.farmer_id}"
+    transaction.on_commit(lambda: invalidate_tags(tag, "listings"))
+
+
+@receiver(post_save, sender=Produce)
+def count_new_listing(sender, instance, created, **kwargs):
+    if instance.farmer_id is None:
+        return
+    if created:
+        record_listings_created(instance.farmer_id, 1 if instance.quantity > 0 else 0, instance)
+    else:
+        before = getattr(instance, '_rollup_before', None)
+        if before is not None:
+            record_stock_changed(instance.farmer_id, before[3], instance.quantity)
+
+
+@receiver(post_delete, sender=Produce)
+def count_deleted_listing(sender, instance, **kwargs):
+    if instance.farmer_id is not None:
+        before = getattr(instance, '_rollup_before', None)
+        record_listing_deleted(instance.farmer_id, (before[3] if before else instance.quantity) > 0)
+
+
+@receiver(post_save, sender=Produce)
+def update_order_book(sender, instance, **kwargs):
+    matching.sync_on_commit([instance.id])
+
+
+@receiver(post_delete, sender=Produce)
+def remove_from_order_book(sender, instance, **kwargs):
+    matching.remove_on_commit(instance.id, instance.commodity)
+
+
+@receiver([pre_save, pre_delete], sender=Produce)
+def remember_listing(sender, instance, **kwargs):
+    instance._rollup_before = rollups.snapshot(instance.id) if instance.id else None
+
+
+@receiver(post_save, sender=Produce)
+def update_rollups(sender, instance, **kwargs):
+    rollups.listing_changed(getattr(instance, '_rollup_before', None), rollups.snapshot(instance.id))
+
+
+@receiver(post_delete, sender=Produce)
+def remove_from_rollups(sender, instance, **kwargs):
+    rollups.listing_changed(getattr(instance, '_rollup_before', None), None)
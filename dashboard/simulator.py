@@ -0,0 +1,198 @@
+"""Offline stand-ins for the external providers.
+
+When ``PROVIDER_SIMULATOR['enabled']`` is set, every ProviderClient session is
+mounted with a SimulatedAdapter that answers in the provider's own response
+shape after a sampled delay, and fails at the configured rate. Runs are
+reproducible for a given ``seed``.
+"""
+import io
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+from django.conf import settings
+
+DEFAULT_SIMULATION = {
+    "latency": {"dist": "lognormal", "median_ms": 150, "sigma": 0.5},
+    "error_rate": 0.0,
+    # Share of failures that are timeouts rather than 503s
+    "timeout_share": 0.5,
+    "payload": {},
+}
+
+COMMODITIES = ["Tomato", "Onion", "Potato", "Wheat", "Rice", "Maize", "Cauliflower", "Cabbage",
+               "Brinjal", "Green Chilli", "Banana", "Apple", "Cotton", "Soyabean", "Mustard"]
+CONDITIONS = ["Sunny", "Partly cloudy", "Overcast", "Light rain", "Mist", "Clear"]
+
+_rngs = {}
+_rngs_lock = threading.Lock()
+
+
+def get_config():
+    return getattr(settings, "PROVIDER_SIMULATOR", {}) or {}
+
+
+def is_enabled():
+    return bool(get_config().get("enabled"))
+
+
+def provider_config(name):
+    overrides = get_config().get("providers", {}).get(name, {})
+    return {**DEFAULT_SIMULATION, **overrides}
+
+
+def get_rng(name):
+    # One seeded stream per provider so adding calls to one doesn't shift another
+    with _rngs_lock:
+        if name not in _rngs:
+            _rngs[name] = random.Random(f"{get_config().get('seed', 0)}:{name}")
+        return _rngs[name]
+
+
+def sample_latency(latency, rng):
+    dist = latency.get("dist", "fixed")
+    if dist == "fixed":
+        ms = latency.get("ms", 0)
+    elif dist == "uniform":
+        ms = rng.uniform(latency["low_ms"], latency["high_ms"])
+    elif dist == "exponential":
+        ms = rng.expovariate(1 / latency["mean_ms"])
+    elif dist == "lognormal":
+        ms = latency["median_ms"] * rng.lognormvariate(0, latency.get("sigma", 0.5))
+    else:
+        raise ValueError(f"Unknown latency distribution: {dist}")
+    return ms / 1000
+
+
+def weather_payload(params, rng, payload):
+    return {
+        "location": {"name": "Simulated", "lat": 0, "lon": 0},
+        "current": {
+            "condition": {"text": rng.choice(CONDITIONS)},
+            "temp_c": round(rng.uniform(12, 42), 1),
+            "humidity": rng.randint(20, 95),
+            "wind_kph": round(rng.uniform(0, 30), 1),
+            "pressure_mb": rng.randint(995, 1025),
+        },
+    }
+
+
+def news_payload(params, rng, payload):
+    body_chars = payload.get("content_chars", 200)
+    return {
+        "status": "ok",
+        "totalResults": payload.get("articles", 100),
+        "articles": [
+            {
+                "source": {"id": None, "name": "Simulated Agro Times"},
+                "author": "Simulator",
+                "title": f"Simulated agriculture story #{i}",
+                "description": "x" * (body_chars // 2),
+                "url": f"https://example.com/news/{i}",
+                "urlToImage": None,
+                "publishedAt": "2023-10-01T00:00:00Z",
+                "content": "x" * body_chars,
+            }
+            for i in range(payload.get("articles", 100))
+        ],
+    }
+
+
+def govdata_payload(params, rng, payload):
+    state = params.get("filters[state]", ["Unknown"])[0]
+    records = []
+    for i in range(payload.get("records_per_state", 10)):
+        low = rng.randint(500, 4000)
+        high = low + rng.randint(100, 1500)
+        records.append({
+            "state": state,
+            "district": f"{state} District {i % 4}",
+            "market": f"{state} Mandi {i}",
+            "commodity": rng.choice(COMMODITIES),
+            "variety": "Other",
+            "grade": "FAQ",
+            "arrival_date": "01/10/2023",
+            "min_price": str(low),
+            "max_price": str(high),
+            "modal_price": str((low + high) // 2),
+        })
+    return {"status": "ok", "total": len(records), "count": len(records), "records": records}
+
+
+def geocode_payload(params, rng, payload):
+    pincode = params.get("address", ["0"])[0]
+    # Derive a stable location from the pincode so repeated lookups agree
+    local = random.Random(pincode)
+    return {
+        "status": "OK",
+        "results": [{
+            "address_components": [
+                {"long_name": pincode, "short_name": pincode, "types": ["postal_code"]},
+                {"long_name": "Simulated State", "short_name": "SS", "types": ["administrative_area_level_1", "political"]},
+                {"long_name": "India", "short_name": "IN", "types": ["country", "political"]},
+            ],
+            "geometry": {"location": {"lat": round(local.uniform(8, 32), 6), "lng": round(local.uniform(69, 89), 6)}},
+        }],
+    }
+
+
+PAYLOADS = {
+    "weather": weather_payload,
+    "news": news_payload,
+    "govdata": govdata_payload,
+    "gmaps": geocode_payload,
+}
+
+
+class SimulatedAdapter(BaseAdapter):
+    """Transport adapter that fakes one provider's HTTP API."""
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    def send(self, request, timeout=None, **kwargs):
+        config = provider_config(self.name)
+        rng = get_rng(self.name)
+        delay = sample_latency(config["latency"], rng)
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        failed = rng.random() < config["error_rate"]
+        timed_out = failed and rng.random() < config["timeout_share"]
+
+        if read_timeout is not None and (timed_out or delay > read_timeout):
+            time.sleep(read_timeout)
+            raise requests.exceptions.ReadTimeout(f"simulated {self.name} timeout", request=request)
+        time.sleep(delay)
+
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.headers["Content-Type"] = "application/json"
+        if failed:
+            response.status_code = 503
+            body = {"error": {"message": f"simulated {self.name} outage"}}
+        else:
+            response.status_code = 200
+            params = parse_qs(urlparse(request.url).query)
+            body = PAYLOADS[self.name](params, rng, config["payload"])
+        response.raw = io.BytesIO(json.dumps(body).encode())
+        response.encoding = "utf-8"
+        return response
+
+    def close(self):
+        pass
+
+
+def gemini_response(query):
+    """Stand-in for a Gemini completion, with the same latency/failure knobs."""
+    config = provider_config("gemini")
+    rng = get_rng("gemini")
+    time.sleep(sample_latency(config["latency"], rng))
+    if rng.random() < config["error_rate"]:
+        raise RuntimeError("simulated gemini outage")
+    words = config["payload"].get("words", 150)
+    return f"Simulated answer to: {query}\n\n" + " ".join("lorem" for _ in range(words))
@@ -0,0 +1,102 @@
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How long stale copies outlive the fresh value, used while a refresh is in flight
+DEFAULT_STALE_TIMEOUT = 7 * 86400
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _stale_key(key):
+    return f"{key}:stale"
+
+
+def _lock_key(key):
+    return f"{key}:lock"
+
+
+def _is_empty(value):
+    # The provider helpers return None / [] when a call fails
+    return value is None or value == [] or value == {}
+
+
+def _compute_across_processes(key, compute, timeout, stale_timeout, lock_timeout, wait):
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not cache.add(_lock_key(key), token, lock_timeout):
+        # Another worker process holds the key: serve stale if we have it, else wait for its result
+        stale = cache.get(_stale_key(key))
+        if stale is not None:
+            return stale
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if time.monotonic() >= deadline:
+            logger.warning(f"single_flight: gave up waiting for {key}, computing locally")
+            token = None
+            break
+        time.sleep(0.05)
+
+    try:
+        value = compute()
+        if _is_empty(value):
+            # Keep serving the last good value instead of caching a failure
+            stale = cache.get(_stale_key(key))
+            return stale if stale is not None else value
+        cache.set(key, value, timeout=timeout)
+        cache.set(_stale_key(key), value, timeout=stale_timeout)
+        return value
+    finally:
+        if token is not None and cache.get(_lock_key(key)) == token:
+            cache.delete(_lock_key(key))
+
+
+def single_flight(key, compute, timeout, stale_timeout=DEFAULT_STALE_TIMEOUT, lock_timeout=30, wait=10):
+    """Read-through cache get that lets only one caller recompute `key`.
+
+    Threads in this process wait for the leader's result; other processes
+    sharing the cache backend see the lock and get the stale copy (or poll
+    for the fresh value). Empty results are not cached.
+    """
+    value = cache.get(key)
+    if value is not None and not _is_empty(value):
+        return value
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait(wait + lock_timeout)
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _compute_across_processes(key, compute, timeout, stale_timeout, lock_timeout, wait)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models import F
+
+from .cachekeys import invalidate_tags
+from .models import ListingStats, Produce
+
+
+def _ensure_rows(farmerid):
+    for key in (farmerid, ListingStats.GLOBAL):
+        ListingStats.objects.get_or_create(farmerid=key)
+
+
+def _update_counts(farmerid, delta, **changes):
+    _ensure_rows(farmerid)
+    ListingStats.objects.filter(farmerid=farmerid).update(listing_count=F('listing_count') + delta, **changes)
+    ListingStats.objects.filter(farmerid=ListingStats.GLOBAL).update(listing_count=F('listing_count') + delta)
+    # The cached counters are dropped once the new ones are committed
+    transaction.on_commit(lambda: invalidate_tags(f"listings:farmer:{farmerid}", "listings"))
+
+
+def record_listings_created(farmerid, count, latest):
+    """Account for `count` new listings with stock by one farmer, `latest`
+    being the newest (with or without stock)."""
+    with transaction.atomic():
+        _update_counts(farmerid, count, latest_listing=latest)
+
+
+def record_stock_changed(farmerid, before, after):
+    """Account for a listing's quantity going from `before` to `after`: it
+    leaves the count when it sells out and comes back when stock returns."""
+    delta = (after > 0) - (before > 0)
+    if delta:
+        with transaction.atomic():
+            _update_counts(farmerid, delta)
+
+
+def record_listing_deleted(farmerid, had_stock):
+    with transaction.atomic():
+        _update_counts(farmerid, -1 if had_stock else 0)
+        # The delete has already nulled latest_listing if it pointed at this row
+        stats = ListingStats.objects.select_for_update().get(farmerid=farmerid)
+        if stats.latest_listing_id is None:
+            stats.latest_listing_id = (
+                Produce.objects.filter(farmer_id=farmerid).order_by('-id').values_list('id', flat=True).first()
+            )
+            stats.save(update_fields=['latest_listing'])
@@ -0,0 +1,153 @@
+"""Which crops suit each pincode, precomputed for the suitability map.
+
+``croprec`` scores one farmer's soil test at a time. Here every pincode
+gets a profile of typical conditions: soil N/P/K/pH and rainfall (and
+optionally temperature and humidity) from an extension officers' CSV,
+by pincode or by state; current weather for climate the CSV leaves out,
+one lookup per geohash cell of CLIMATE_PRECISION; and the training data's
+medians for anything still missing. Typical values are only typical, so
+each profile is widened into a grid of nearby soils and rainfalls, and a
+crop's suitability is the recommendation model's probability averaged
+over that grid.
+
+The grids for all pincodes are scored with vectorized ``predict_proba``
+calls, CHUNK_SIZE pincodes per call, spread over processes with joblib.
+Run by ``manage.py build_crop_suitability``; pages only read the stored
+top crops.
+"""
+import csv
+import itertools
+import pickle
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from joblib import Parallel, delayed
+
+from . import geo
+from .alerts import state_key
+from .functions import getWeatherDetails
+
+MODEL_PATH = settings.BASE_DIR / 'model_code' / 'CropRecommend.pkl'
+TRAINING_DATA = settings.BASE_DIR / 'datasets' / 'Crop_recommendation.csv'
+# The model's inputs, in order
+FEATURES = ("N", "P", "K", "temperature", "humidity", "ph", "rainfall")
+TOP_K = 5
+# Pincodes per predict_proba call (x GRID_SIZE rows)
+CHUNK_SIZE = 200
+WEATHER_WORKERS = 4
+# Geohash length of the areas sharing one weather lookup (~150 km cells)
+CLIMATE_PRECISION = 3
+
+PINCODE = "pincode"
+STATE = "state"
+DEFAULT = "default"
+
+# Grid around a profile: N, P, K and rainfall scaled, pH shifted
+_SCALES = (0.8, 1.0, 1.2)
+_RAINFALL_SCALES = (0.75, 1.0, 1.25)
+_PH_SHIFTS = (-0.5, 0.0, 0.5)
+_LOWER = np.array([0, 0, 0, -10, 0, 0, 0])
+_UPPER = np.array([200, 200, 250, 50, 100, 14, 400])
+
+
+def grid():
+    """(scale, shift): (GRID_SIZE, len(FEATURES)) arrays such that
+    profile * scale + shift are the grid points."""
+    points = list(itertools.product(_SCALES, _SCALES, _SCALES, _PH_SHIFTS, _RAINFALL_SCALES))
+    scale = np.ones((len(points), len(FEATURES)))
+    shift = np.zeros((len(points), len(FEATURES)))
+    for row, (n, p, k, ph, rainfall) in enumerate(points):
+        scale[row, [0, 1, 2, 6]] = n, p, k, rainfall
+        shift[row, 5] = ph
+    return scale, shift
+
+
+GRID_SIZE = len(_SCALES) ** 3 * len(_PH_SHIFTS) * len(_RAINFALL_SCALES)
+
+
+def load_model():
+    with open(MODEL_PATH, 'rb') as model_file:
+        return pickle.load(model_file)
+
+
+def defaults():
+    """Median of each feature over the model's training data."""
+    with open(TRAINING_DATA, newline='') as data:
+        rows = list(csv.DictReader(data))
+    return {feature: statistics.median(float(row[feature]) for row in rows) for feature in FEATURES}
+
+
+def load_profiles(path):
+    """{pincode (int) or state key (str): {feature: value}} from a CSV with a
+    `region` column (a pincode or a state name) and any of FEATURES."""
+    profiles = {}
+    with open(path, newline='') as data:
+        for row in csv.DictReader(data):
+            region = row.get("region", "").strip()
+            values = {feature: float(row[feature]) for feature in FEATURES if (row.get(feature) or "").strip()}
+            if region and values:
+                profiles[int(region) if region.isdigit() else state_key(region)] = values
+    return profiles
+
+
+def profile_for(pincode, state, profiles, fallback, weather=None):
+    """(feature vector, source) for a pincode: its own profile, else its
+    state's, with `weather` (temperature, humidity) and then `fallback`
+    filling the gaps."""
+    if pincode in profiles:
+        values, source = profiles[pincode], PINCODE
+    elif state_key(state) in profiles:
+        values, source = profiles[state_key(state)], STATE
+    else:
+        values, source = {}, DEFAULT
+    values = dict(values)
+    if weather is not None:
+        values.setdefault("temperature", weather[0])
+        values.setdefault("humidity", weather[1])
+    return [float(values.get(feature, fallback[feature])) for feature in FEATURES], source
+
+
+def current_climate(cells):
+    """{geohash cell: (temperature, humidity) or None} from the weather
+    provider, at each cell's centre."""
+    cells = list(cells)
+
+    def fetch(cell):
+        south, north, west, east = geo.decode_bounds(cell)
+        details = getWeatherDetails(((south + north) / 2, (west + east) / 2))
+        return (details[1], details[2]) if details else None
+
+    with ThreadPoolExecutor(max_workers=WEATHER_WORKERS) as pool:
+        return dict(zip(cells, pool.map(fetch, cells)))
+
+
+def _score_chunk(model, profiles):
+    scale, shift = grid()
+    points = np.clip(profiles[:, None, :] * scale + shift, _LOWER, _UPPER).reshape(-1, len(FEATURES))
+    probabilities = model.predict_proba(pd.DataFrame(points, columns=FEATURES))
+    return probabilities.reshape(len(profiles), GRID_SIZE, -1).mean(axis=1)
+
+
+def score(model, profiles, jobs=-1):
+    """(n, crops) suitability for an (n, len(FEATURES)) array of profiles,
+    columns in model.classes_ order."""
+    starts = range(0, len(profiles), CHUNK_SIZE)
+    if len(starts) <= 1 or jobs == 1:
+        parts = [_score_chunk(model, profiles[start:start + CHUNK_SIZE]) for start in starts]
+    else:
+        parts = Parallel(n_jobs=jobs)(
+            delayed(_score_chunk)(model, profiles[start:start + CHUNK_SIZE]) for start in starts
+        )
+    return np.concatenate(parts) if parts else np.empty((0, len(model.classes_)))
+
+
+def top_crops(suitability, classes, k=TOP_K):
+    """Per row, the k best (crop, probability) pairs, best first."""
+    best = np.argsort(-suitability, axis=1, kind='stable')[:, :k]
+    return [
+        [(str(classes[column]), float(row[column])) for column in columns]
+        for row, columns in zip(suitability, best)
+    ]
@@ -1,3 +1,865 @@
-from django.test import TestCase
+import datetime
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import requests
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from landing.models import User
+from . import (
+    bulk_listings, commodities, forecasting, geo, mandis, matching, orders, providers, rollups, suitability, timing, views,
+)
+from .alerts import AlertIndex, price_ranges
+from .cachekeys import WEATHER
+from .fanout import FanOut
+from .market_prices import build_index, compare_with_mandi
+from .models import Bid, ListingStats, Mandi, MarketRollup, Order, PriceAlert, Produce
+from .ratelimit import RateLimitExceeded, TokenBucket
+from .singleflight import single_flight
+
+BUYERS = 200
+WORKERS = 32
+
+
+def race(calls):
+    """Run `calls` from WORKERS threads, the first wave released at once.
+    Returns each call's result, or the exception it raised."""
+    barrier = threading.Barrier(min(WORKERS, len(calls)))
+
+    def run(indexed):
+        index, call = indexed
+        try:
+            if index < barrier.parties:
+                barrier.wait(timeout=10)
+            return call()
+        except Exception as e:
+            return e
+        finally:
+            # Every thread has its own connection
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        return list(pool.map(run, enumerate(calls)))
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    """Hundreds of buyers against one listing, each on its own connection.
+
+    Runs against the on-disk test database (settings.DATABASES TEST NAME);
+    SQLite's shared-cache in-memory database can't serialise writers."""
+
+    def setUp(self):
+        self.farmer = User.objects.create(
+            name="Test Farmer", phone="+919812345678", pincode="411001",
+            farmname="Test Farm", farmarea=2, latitude=18.52, longitude=73.85,
+        )
+
+    def listing(self, quantity):
+        return Produce.objects.create(
+            farmer=self.farmer, name="Tomato", quantity=quantity, price=20, unit="quintals",
+        )
+
+    def reserve_call(self, produce, quantity, buyer):
+        return lambda: orders.reserve(produce.id, quantity, f"Buyer {buyer}", "+919800000000")
+
+    def test_no_oversell(self):
+        produce = self.listing(100)
+        results = race([self.reserve_call(produce, 1, buyer) for buyer in range(BUYERS)])
+
+        sold = [result for result in results if isinstance(result, Order)]
+        refused = [result for result in results if isinstance(result, orders.OutOfStock)]
+        self.assertEqual(len(sold), 100)
+        self.assertEqual(len(refused), BUYERS - 100)
+        produce.refresh_from_db()
+        self.assertEqual(produce.quantity, 0)
+        self.assertEqual(Order.objects.filter(produce=produce).count(), 100)
+        # The sold-out listing left the rollups too
+        self.assertFalse(MarketRollup.objects.filter(listings__gt=0).exists())
+
+    def test_no_lost_updates(self):
+        initial = Decimal(500)
+        produce = self.listing(initial)
+        rng = random.Random(42)
+        results = race([
+            self.reserve_call(produce, Decimal(rng.randint(1, 10)), buyer) for buyer in range(BUYERS)
+        ])
+
+        unexpected = [result for result in results if isinstance(result, Exception)
+                      and not isinstance(result, orders.OutOfStock)]
+        self.assertEqual(unexpected, [])
+        produce.refresh_from_db()
+        reserved = sum(Order.objects.filter(produce=produce).values_list('quantity', flat=True))
+        self.assertGreaterEqual(produce.quantity, 0)
+        self.assertEqual(reserved + produce.quantity, initial)
+
+    def test_cancel_restores_once(self):
+        produce = self.listing(10)
+        order = orders.reserve(produce.id, 4, "Buyer", "+919800000000")
+        results = race([lambda: orders.cancel(order.id)] * 50)
+
+        self.assertEqual(sum(result is None for result in results), 1)
+        self.assertTrue(all(result is None or isinstance(result, orders.OrderStateError) for result in results))
+        produce.refresh_from_db()
+        self.assertEqual(produce.quantity, 10)
+
+    def test_confirm_and_cancel_race(self):
+        produce = self.listing(10)
+        order = orders.reserve(produce.id, 4, "Buyer", "+919800000000")
+        results = race([lambda: orders.confirm(order.id), lambda: orders.cancel(order.id)] * 25)
+
+        self.assertEqual(sum(result is None for result in results), 1)
+        order.refresh_from_db()
+        produce.refresh_from_db()
+        expected = 6 if order.status == Order.CONFIRMED else 10
+        self.assertEqual(produce.quantity, expected)
+
+
+class MatchingEngineTests(SimpleTestCase):
+    def test_price_time_priority(self):
+        engine = matching.Engine()
+        engine.submit("Onion", matching.ASK, 12, 5, order_id="late-cheap")
+        engine.submit("Onion", matching.ASK, 10, 5, order_id="first")
+        engine.submit("Onion", matching.ASK, 10, 5, order_id="second")
+        entry, fills = engine.submit("Onion", matching.BID, 12, 12)
+
+        self.assertEqual(
+            [(fill.ask, fill.price, fill.quantity) for fill in fills],
+            [("first", 10, 5), ("second", 10, 5), ("late-cheap", 12, 2)],
+        )
+        self.assertEqual(entry.quantity, 0)
+        self.assertEqual(engine.snapshot(), {"Onion": [("late-cheap", matching.ASK, 12, 3)]})
+
+    def test_failed_settlement_cancels_ask(self):
+        engine = matching.Engine()
+        engine.submit("Onion", matching.ASK, 10, 5, order_id="sold-out")
+        engine.submit("Onion", matching.ASK, 11, 5, order_id="in-stock")
+        entry, fills = engine.submit(
+            "Onion", matching.BID, 11, 5, settle=lambda bid, ask, quantity, price, ref: ask.id != "sold-out",
+        )
+
+        self.assertEqual([fill.ask for fill in fills], ["in-stock"])
+        self.assertEqual(engine.snapshot(), {})
+
+    def test_replay_rebuilds_books(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "books.jsonl")
+            engine = matching.Engine(path)
+            rng = random.Random(7)
+            for i in range(2000):
+                commodity = rng.choice(["Onion", "Potato"])
+                if i % 10 == 0 and engine.book(commodity).orders:
+                    engine.cancel(commodity, rng.choice(sorted(engine.book(commodity).orders)))
+                else:
+                    engine.submit(commodity, rng.choice([matching.BID, matching.ASK]),
+                                  rng.randint(95, 105), rng.randint(1, 9))
+            engine.close()
+
+            for _ in range(2):
+                # The second pass replays the log compacted by the first
+                replayed = matching.Engine(path)
+                replayed.close()
+                self.assertEqual(replayed.snapshot(), engine.snapshot())
+
+    def test_one_engine_per_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "books.jsonl")
+            engine = matching.Engine(path)
+            with self.assertRaises(matching.EngineBusy):
+                matching.Engine(path)
+            engine.close()
+            matching.Engine(path).close()
+
+    def test_replay_skips_fills_that_never_settled(self):
+        def crash(bid, ask, quantity, price, ref):
+            raise RuntimeError("Crashed before the fill was confirmed")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "books.jsonl")
+            engine = matching.Engine(path)
+            engine.submit("Onion", matching.ASK, 10, 5, order_id="ask")
+            with self.assertRaises(RuntimeError):
+                engine.submit("Onion", matching.BID, 10, 3, settle=crash)
+            self.assertEqual(engine.snapshot(), {"Onion": [("ask", matching.ASK, 10, 5)]})
+            engine.close()
+
+            replayed = matching.Engine(path, settled=lambda refs: set())
+            self.assertEqual(replayed.snapshot(), engine.snapshot())
+            replayed.close()
+
+
+class OrderBookTests(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log_path = os.path.join(directory.name, "books.jsonl")
+        settings_override = override_settings(MATCHING_LOG=self.log_path, MATCHING_SYNC_SECONDS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.close_engine)
+        self.farmer = User.objects.create(
+            name="Test Farmer", phone="+919812345678", pincode="411001",
+            farmname="Test Farm", farmarea=2, latitude=18.52, longitude=73.85,
+        )
+
+    def close_engine(self):
+        if matching._engine is not None:
+            matching._engine.close()
+        matching._engine = None
+        matching._synced.clear()
+        matching._caught_up_at = None
+
+    def test_bids_fill_listings_and_keep_contacts_out_of_the_log(self):
+        produce = Produce.objects.create(farmer=self.farmer, name="Onion", quantity=5, price=10, unit="quintals")
+        entry, fills = matching.place_bid("Onion", 11, 3, "Asha", "+919876543210")
+        self.assertEqual([(fill.price, fill.quantity) for fill in fills], [(10, 3)])
+        order = fills[0].settlement
+        self.assertEqual((order.bid.buyer_name, order.fill_ref), ("Asha", fills[0].ref))
+
+        # A saved listing reaches the book once it commits
+        produce.refresh_from_db()
+        produce.quantity = 8
+        produce.save()
+        entry, fills = matching.place_bid("Onion", 12, 10, "Ravi", "+919876500000")
+        self.assertEqual(sum(fill.quantity for fill in fills), 8)
+        self.assertEqual(entry.quantity, 2)
+        produce.refresh_from_db()
+        self.assertEqual(produce.quantity, 0)
+
+        with open(self.log_path) as log:
+            self.assertNotIn("98765", log.read())
+
+    def test_bid_quantity_follows_fills(self):
+        entry, fills = matching.place_bid("Onion", 11, 10, "Asha", "+919876543210")
+        bid = Bid.objects.get(id=entry.owner["bid"])
+        self.assertEqual((bid.quantity, bid.status), (10, Bid.OPEN))
+
+        # A listing saved later fills the resting bid
+        Produce.objects.create(farmer=self.farmer, name="Onion", quantity=4, price=10, unit="quintals")
+        bid.refresh_from_db()
+        self.assertEqual((bid.quantity, bid.status), (6, Bid.OPEN))
+        Produce.objects.create(farmer=self.farmer, name="Onion", quantity=9, price=10, unit="quintals")
+        bid.refresh_from_db()
+        self.assertEqual((bid.quantity, bid.status), (0, Bid.FILLED))
+        self.assertEqual(sum(bid.orders.values_list('quantity', flat=True)), 10)
+
+    def test_cancel_and_expiry(self):
+        entry, fills = matching.place_bid("Onion", 11, 10, "Asha", "+919876543210")
+        bid_id = entry.owner["bid"]
+        self.assertIsNone(matching.cancel_bid(bid_id, "+919876500000"))
+        bid = matching.cancel_bid(bid_id, "+919876543210")
+        self.assertEqual(bid.status, Bid.CANCELLED)
+        self.assertEqual(matching.engine().snapshot(), {})
+        self.assertIsNone(matching.cancel_bid(bid_id, "+919876543210"))
+
+        entry, fills = matching.place_bid("Onion", 11, 10, "Ravi", "+919876500000")
+        Bid.objects.filter(id=entry.owner["bid"]).update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        matching.catch_up(matching.engine())
+        self.assertEqual(Bid.objects.get(id=entry.owner["bid"]).status, Bid.EXPIRED)
+        self.assertEqual(matching.engine().snapshot(), {})
+        # Nothing left for a new listing to fill
+        Produce.objects.create(farmer=self.farmer, name="Onion", quantity=4, price=10, unit="quintals")
+        self.assertFalse(Order.objects.exists())
+
+    def test_bids_need_a_csrf_token(self):
+        client = Client(HTTP_HOST="localhost", enforce_csrf_checks=True)
+        bid = {"commodity": "Onion", "price": 11, "quantity": 3, "buyer_name": "Asha", "buyer_phone": "+919876543210"}
+        self.assertEqual(client.post("/public/api/bids/", bid).status_code, 403)
+
+        client.get("/public/api/listings/")
+        token = client.cookies["csrftoken"].value
+        response = client.post("/public/api/bids/", bid, HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 202)
+        cancelled = client.post(f"/public/api/bids/{response.json()['bid']}/cancel/",
+                                {"buyer_phone": "+919876543210"}, HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(cancelled.json()["status"], Bid.CANCELLED)
+
+
+class ProviderClientTests(SimpleTestCase):
+    def provider(self, **config):
+        provider = providers.ProviderClient("test", **{"backoff": 0, **config})
+        provider.limiter = mock.Mock()
+        provider.limiter.acquire.return_value = True
+        return provider
+
+    def fail(self):
+        raise requests.exceptions.ConnectionError("down")
+
+    def test_breaker_opens_and_recovers(self):
+        provider = self.provider(retries=0, failure_threshold=2, reset_timeout=0)
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                provider.call(self.fail)
+        self.assertEqual(provider.breaker.state, providers.CircuitBreaker.OPEN)
+
+        # The first call after the cool-down is the trial; a failed trial reopens
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            provider.call(self.fail)
+        self.assertEqual(provider.breaker.state, providers.CircuitBreaker.OPEN)
+        self.assertEqual(provider.call(lambda: "ok"), "ok")
+        self.assertEqual(provider.breaker.state, providers.CircuitBreaker.CLOSED)
+
+    def test_open_circuit_short_circuits(self):
+        provider = self.provider(retries=0, failure_threshold=1, reset_timeout=60)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            provider.call(self.fail)
+        called = mock.Mock()
+        with self.assertRaises(providers.CircuitOpenError):
+            provider.call(called)
+        called.assert_not_called()
+        self.assertEqual(provider.metrics.snapshot()["short_circuited"], 1)
+
+    def test_rate_limited_trial_is_handed_back(self):
+        provider = self.provider(retries=0, failure_threshold=1, reset_timeout=0)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            provider.call(self.fail)
+        provider.limiter.acquire.return_value = False
+        with self.assertRaises(RateLimitExceeded):
+            provider.call(lambda: "ok")
+        self.assertEqual(provider.breaker.state, providers.CircuitBreaker.OPEN)
+
+        provider.limiter.acquire.return_value = True
+        self.assertEqual(provider.call(lambda: "ok"), "ok")
+        self.assertEqual(provider.breaker.state, providers.CircuitBreaker.CLOSED)
+
+
+class ProviderRetryTests(SimpleTestCase):
+    def provider(self, **config):
+        return providers.ProviderClient("test", **{"backoff": 0, **config})
+
+    def http_error(self, status):
+        response = requests.Response()
+        response.status_code = status
+        return requests.exceptions.HTTPError(response=response)
+
+    def test_transient_failures_are_retried(self):
+        provider = self.provider(retries=2)
+        fn = mock.Mock(side_effect=[requests.exceptions.Timeout(), self.http_error(503), "ok"])
+        self.assertEqual(provider.call(fn), "ok")
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual(provider.metrics.snapshot()["retries"], 2)
+        self.assertEqual(provider.breaker.state, providers.CircuitBreaker.CLOSED)
+
+    def test_gives_up_after_the_last_retry(self):
+        provider = self.provider(retries=1, failure_threshold=1)
+        fn = mock.Mock(side_effect=requests.exceptions.ConnectionError())
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            provider.call(fn)
+        self.assertEqual(fn.call_count, 2)
+        self.assertEqual(provider.breaker.state, providers.CircuitBreaker.OPEN)
+
+    def test_client_errors_are_not_retried(self):
+        provider = self.provider(retries=2, failure_threshold=1)
+        fn = mock.Mock(side_effect=self.http_error(404))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            provider.call(fn)
+        self.assertEqual(fn.call_count, 1)
+        # Our mistake, not an outage
+        self.assertEqual(provider.breaker.state, providers.CircuitBreaker.CLOSED)
+
+    def test_backoff_is_capped_and_jittered(self):
+        provider = self.provider(backoff=0.5, backoff_max=1)
+        with mock.patch.object(providers.time, "sleep") as sleep:
+            for attempt in range(5):
+                provider._sleep_before_retry(attempt)
+        delays = [call.args[0] for call in sleep.call_args_list]
+        self.assertTrue(all(0 <= delay <= 1 for delay in delays))
+        self.assertLessEqual(delays[0], 0.5)
+
+    def test_every_attempt_draws_from_the_quota(self):
+        provider = self.provider(retries=2)
+        provider.limiter = mock.Mock()
+        provider.limiter.acquire.side_effect = [True, False]
+        fn = mock.Mock(side_effect=requests.exceptions.Timeout())
+        with self.assertRaises(RateLimitExceeded):
+            provider.call(fn)
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(provider.metrics.snapshot()["rate_limited"], 1)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.bucket = TokenBucket("tokenbuckettest", calls=10, period=10, burst=3)
+        self.addCleanup(cache.delete_many, [self.bucket.key, f"{self.bucket.key}:lock"])
+        cache.delete_many([self.bucket.key, f"{self.bucket.key}:lock"])
+
+    def test_burst_then_refill(self):
+        with mock.patch("time.time", return_value=1000.0) as now:
+            self.assertEqual([self.bucket.acquire() for _ in range(4)], [True, True, True, False])
+            self.assertEqual(self.bucket.remaining(), 0)
+            # One token a second, never above the burst
+            now.return_value = 1002.0
+            self.assertEqual(self.bucket.remaining(), 2)
+            now.return_value = 1100.0
+            self.assertEqual(self.bucket.remaining(), 3)
+
+    def test_refuses_while_the_lock_is_held(self):
+        cache.add(f"{self.bucket.key}:lock", "other", timeout=5)
+        self.assertFalse(self.bucket.acquire())
+        cache.delete(f"{self.bucket.key}:lock")
+        self.assertTrue(self.bucket.acquire())
+
+    def test_concurrent_callers_share_the_budget(self):
+        results = race([self.bucket.acquire] * 20)
+        self.assertLessEqual(sum(result is True for result in results), 3)
+
+
+class SingleFlightTests(SimpleTestCase):
+    KEY = "singleflighttest"
+
+    def setUp(self):
+        keys = [self.KEY, f"{self.KEY}:stale", f"{self.KEY}:lock"]
+        cache.delete_many(keys)
+        self.addCleanup(cache.delete_many, keys)
+
+    def test_concurrent_callers_compute_once(self):
+        calls = []
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return {"value": 1}
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(single_flight, self.KEY, compute, 60) for _ in range(8)]
+            while not calls:
+                time.sleep(0.01)
+            time.sleep(0.05)
+            release.set()
+            results = [future.result() for future in futures]
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"value": 1}] * 8)
+        self.assertEqual(single_flight(self.KEY, mock.Mock(), 60), {"value": 1})
+
+    def test_failed_refresh_serves_stale(self):
+        single_flight(self.KEY, lambda: {"value": 1}, 60)
+        cache.delete(self.KEY)
+        self.assertEqual(single_flight(self.KEY, lambda: None, 60), {"value": 1})
+        # The failure itself was not cached
+        self.assertIsNone(cache.get(self.KEY))
+
+    def test_other_process_refreshing_serves_stale(self):
+        single_flight(self.KEY, lambda: {"value": 1}, 60)
+        cache.delete(self.KEY)
+        cache.add(f"{self.KEY}:lock", "other", 30)
+        compute = mock.Mock(return_value={"value": 2})
+        self.assertEqual(single_flight(self.KEY, compute, 60), {"value": 1})
+        compute.assert_not_called()
+
+
+class FanOutTests(SimpleTestCase):
+    def test_slow_and_failing_sources_get_placeholders(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def fail():
+            raise RuntimeError("down")
+
+        fanout = FanOut()
+        fanout.submit("fast", lambda: "fresh", deadline=1, placeholder="-")
+        fanout.submit("slow", lambda: release.wait(5), deadline=0.1, placeholder="-")
+        fanout.submit("failing", fail, deadline=1, placeholder="-")
+        fanout.submit("empty", lambda: None, deadline=1, placeholder=[])
+        started = time.monotonic()
+        results = fanout.results()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(results, {"fast": "fresh", "slow": "-", "failing": "-", "empty": []})
+
+    def test_sources_run_concurrently(self):
+        fanout = FanOut()
+        for name in ("a", "b", "c"):
+            fanout.submit(name, lambda name=name: time.sleep(0.3) or name, deadline=0.8, placeholder="-")
+        started = time.monotonic()
+        self.assertEqual(fanout.results(), {"a": "a", "b": "b", "c": "c"})
+        self.assertLess(time.monotonic() - started, 0.8)
+
+
+class RecommendationWeatherTests(TestCase):
+    def setUp(self):
+        self.farmer = User.objects.create(
+            name="Test Farmer", phone="+919812345678", pincode="411001",
+            farmname="Test Farm", farmarea=2, latitude=18.52, longitude=73.85,
+        )
+        self.client = Client(HTTP_HOST="localhost")
+        session = self.client.session
+        session["member_logged_id"] = self.farmer.id
+        session.save()
+
+    def test_crop_recommendation_falls_back_to_cached_weather(self):
+        with mock.patch.object(views, "getWeatherDetails", return_value=["Sunny", 27.0, 80, 5, 1010]):
+            views.load_weather(self.farmer)
+        cache.delete(WEATHER.key(lat=18.52, lon=73.85))
+
+        # Out of quota: the provider helper returns None
+        with mock.patch.object(views, "getWeatherDetails", return_value=None) as provider:
+            response = self.client.post("/admin/tools/crop_recommendation", {
+                "nitrogen": 90, "phosphorus": 42, "potassium": 43, "PH": 6, "rainfall": 200,
+            })
+        provider.assert_called_once()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("prediction", response.context)
+        self.assertNotIn("error", response.context)
+
+
+class CommodityTests(SimpleTestCase):
+    def test_typos_match_but_other_words_do_not(self):
+        self.assertEqual(commodities.normalize("tamattar"), "Tomato")
+        self.assertEqual(commodities.normalize("potatoe"), "Potato")
+        self.assertEqual(commodities.normalize("Sugar cane"), "Sugarcane")
+        self.assertIsNone(commodities.normalize("Sugar"))
+
+
+class PriceAlertIndexTests(SimpleTestCase):
+    def test_thresholds_crossed(self):
+        index = AlertIndex([
+            (1, "Onion", "Maharashtra", PriceAlert.ABOVE, Decimal(1000)),
+            (2, "Onion", "Maharashtra", PriceAlert.ABOVE, Decimal(2000)),
+            (3, "Onion", "Maharashtra", PriceAlert.BELOW, Decimal(1500)),
+            (4, "Onion", "Maharashtra", PriceAlert.BELOW, Decimal(2500)),
+            (5, "Onion", "Kerala", PriceAlert.ABOVE, Decimal(100)),
+        ])
+        key = ("Onion", "maharashtra")
+
+        self.assertEqual(list(index.rising(key, Decimal(2000))), [1, 2])
+        self.assertEqual(list(index.rising(key, Decimal(1999))), [1])
+        self.assertEqual(list(index.falling(key, Decimal(1500))), [3, 4])
+        self.assertEqual(list(index.falling(key, Decimal(2600))), [])
+        self.assertEqual(list(index.rising(("Potato", "maharashtra"), Decimal(9999))), [])
+
+    def test_price_ranges(self):
+        ranges = price_ranges([
+            {"commodity": "Onion", "state": "Uttar+Pradesh", "market": "Agra", "modal_price": "1800"},
+            {"commodity": "Onion", "state": "Uttar Pradesh", "market": "Kanpur", "modal_price": "1200"},
+            {"commodity": "Onion", "state": "Uttar Pradesh", "market": "Lucknow", "modal_price": "NR"},
+        ])
+        self.assertEqual(ranges, {
+            ("Onion", "uttar pradesh"): ((Decimal(1200), "Kanpur"), (Decimal(1800), "Agra")),
+        })
+
+
+class MandiPriceIndexTests(SimpleTestCase):
+    RECORDS = [
+        {"commodity": "Onion", "state": "Maharashtra", "market": "Lasalgaon", "arrival_date": "02/10/2023",
+         "min_price": "1500", "max_price": "2100", "modal_price": "1800"},
+        {"commodity": "Onion", "state": "Maharashtra", "market": "Pune", "arrival_date": "02/10/2023",
+         "min_price": "1700", "max_price": "2500", "modal_price": "2200"},
+        # Superseded by the later arrivals
+        {"commodity": "Onion", "state": "Maharashtra", "market": "Nashik", "arrival_date": "01/10/2023",
+         "min_price": "100", "max_price": "9000", "modal_price": "5000"},
+        {"commodity": "Onion", "state": "Kerala", "market": "Kochi", "arrival_date": "02/10/2023",
+         "min_price": "2600", "max_price": "3000", "modal_price": "2800"},
+    ]
+
+    def test_latest_day_per_state(self):
+        prices = build_index(self.RECORDS)["prices"]
+        self.assertEqual(prices["Onion|maharashtra"]["modal"], Decimal(2000))
+        self.assertEqual(prices["Onion|maharashtra"]["min"], Decimal(1500))
+        self.assertEqual(prices["Onion|maharashtra"]["max"], Decimal(2500))
+        self.assertEqual(prices["Onion|"]["markets"], 3)
+
+    def test_premium_per_quintal(self):
+        index = build_index(self.RECORDS)
+        listings = [
+            Produce(name="Onion", commodity="Onion", price=2200, unit="quintals"),
+            Produce(name="Onion", commodity="Onion", price=18, unit="kg"),
+            Produce(name="Onion", commodity="Onion", price=2200, unit="crates"),
+            Produce(name="Okra", commodity="Bhindi(Ladies Finger)", price=10, unit="kg"),
+        ]
+        compare_with_mandi(listings, lambda produce: "Maharashtra", index)
+
+        self.assertEqual([produce.mandi_premium for produce in listings], [10.0, -10.0, None, None])
+        self.assertEqual(listings[0].mandi_label, "10% above mandi")
+        self.assertEqual(listings[1].mandi_label, "10% below mandi")
+
+
+class NearbyMandiTests(TestCase):
+    RECORDS = [
+        {"state": "Maharashtra", "district": "Pune", "market": "Pune", "commodity": "Onion", "modal_price": "1800"},
+        {"state": "Maharashtra", "district": "Nashik", "market": "Lasalgaon", "commodity": "Onion", "modal_price": "1700"},
+        {"state": "Maharashtra", "district": "Nagpur", "market": "Nagpur", "commodity": "Onion", "modal_price": "2100"},
+        {"state": "Maharashtra", "district": "Pune", "market": "Pune", "commodity": "Potato", "modal_price": "1500"},
+        # Not located yet
+        {"state": "Kerala", "district": "Ernakulam", "market": "Kochi", "commodity": "Onion", "modal_price": "2800"},
+    ]
+    LOCATIONS = {"Pune": (18.52, 73.85), "Lasalgaon": (20.15, 74.23), "Nagpur": (21.15, 79.09)}
+
+    def setUp(self):
+        self.assertEqual(mandis.register(self.RECORDS), 4)
+        for mandi in Mandi.objects.filter(name__in=self.LOCATIONS):
+            mandi.latitude, mandi.longitude = self.LOCATIONS[mandi.name]
+            mandi.geohash = geo.encode(mandi.latitude, mandi.longitude)
+            mandi.save()
+
+    def test_register_is_idempotent(self):
+        self.assertEqual(mandis.register(self.RECORDS), 0)
+        self.assertEqual(mandis.pending().count(), 1)
+
+    def test_nearest_markets_first(self):
+        rows = mandis.nearby_prices(self.RECORDS, 18.6, 73.8, k=2)
+        self.assertEqual([(row["market"], row["commodity"]) for row in rows],
+                         [("Pune", "Onion"), ("Pune", "Potato"), ("Lasalgaon", "Onion")])
+        self.assertLess(rows[0]["distance_km"], rows[-1]["distance_km"])
+
+    def test_failed_lookups_are_retried(self):
+        with mock.patch.object(mandis, "GeocodeAddress", side_effect=RateLimitExceeded("gmaps")):
+            self.assertEqual(mandis.locate(mandis.pending()), (0, 1))
+        self.assertEqual(mandis.pending().count(), 1)
+
+        with mock.patch.object(mandis, "GeocodeAddress", return_value=(None, None)):
+            self.assertEqual(mandis.locate(mandis.pending()), (0, 0))
+        # Not found: held back until RETRY_AFTER
+        self.assertEqual(mandis.pending().count(), 0)
+        self.assertEqual(mandis.pending(retry_failed=True).count(), 0)
+
+
+class GeoSearchTests(TestCase):
+    FIELDS = ('farmer__geohash', 'farmer__latitude', 'farmer__longitude')
+
+    def farmer(self, phone, lat, lon):
+        return User.objects.create(
+            name="Test Farmer", phone=phone, pincode="411001",
+            farmname="Test Farm", farmarea=2, latitude=lat, longitude=lon,
+        )
+
+    def setUp(self):
+        self.pune = self.farmer("+919812345678", 18.52, 73.85)
+        self.mumbai = self.farmer("+919812345679", 19.07, 72.88)
+        for farmer in (self.pune, self.mumbai):
+            Produce.objects.create(farmer=farmer, name="Onion", quantity=5, price=20, unit="quintal")
+
+    def test_given_coordinates_are_hashed(self):
+        self.assertEqual(self.pune.geohash, geo.encode(18.52, 73.85))
+        self.assertEqual(set(geo.within(User.objects.all(), 18.5, 73.8, 10)), {self.pune.id})
+        nearest = geo.nearest(Produce.objects.all(), 18.5, 73.8, 2, fields=self.FIELDS)
+        self.assertEqual([produce.farmer_id for produce in nearest], [self.pune.id, self.mumbai.id])
+        self.assertLess(nearest[0].distance_km, 10)
+
+    def test_moved_farm_is_rehashed(self):
+        self.mumbai.latitude, self.mumbai.longitude = 18.53, 73.84
+        self.mumbai.save()
+        self.mumbai.refresh_from_db()
+        self.assertEqual(self.mumbai.geohash, geo.encode(18.53, 73.84))
+        self.assertEqual(set(geo.within(User.objects.all(), 18.5, 73.8, 10)), {self.pune.id, self.mumbai.id})
+
+        self.pune.latitude = 19.07
+        self.pune.save(update_fields=['latitude'])
+        self.pune.refresh_from_db()
+        self.assertEqual(self.pune.geohash, geo.encode(19.07, 73.85))
+
+
+class ListingStatsTests(TestCase):
+    def test_counts_listings_with_stock(self):
+        farmer = User.objects.create(
+            name="Test Farmer", phone="+919812345678", pincode="411001",
+            farmname="Test Farm", farmarea=2, latitude=18.52, longitude=73.85,
+        )
+        onion = Produce.objects.create(farmer=farmer, name="Onion", quantity=5, price=20, unit="quintal")
+        Produce.objects.create(farmer=farmer, name="Potato", quantity=3, price=15, unit="quintal")
+
+        def counts():
+            return dict(ListingStats.objects.values_list('farmerid', 'listing_count'))
+
+        self.assertEqual(counts(), {farmer.id: 2, ListingStats.GLOBAL: 2})
+        order = orders.reserve(onion.id, 5, "Buyer", "+919800000000")
+        self.assertEqual(counts(), {farmer.id: 1, ListingStats.GLOBAL: 1})
+        orders.cancel(order.id)
+        self.assertEqual(counts(), {farmer.id: 2, ListingStats.GLOBAL: 2})
+        orders.reserve(onion.id, 5, "Buyer", "+919800000000")
+        onion.refresh_from_db()
+        onion.delete()
+        self.assertEqual(counts(), {farmer.id: 1, ListingStats.GLOBAL: 1})
+
+
+class MarketRollupTests(TestCase):
+    def setUp(self):
+        self.farmer = User.objects.create(
+            name="Test Farmer", phone="+919812345678", pincode="411001", state="Maharashtra",
+            farmname="Test Farm", farmarea=2, latitude=18.52, longitude=73.85,
+        )
+
+    def listing(self, name, quantity, price, unit="quintal"):
+        return Produce.objects.create(
+            farmer=self.farmer, name=name, commodity=name, quantity=quantity, price=price, unit=unit,
+        )
+
+    def assertMatchesListings(self):
+        expected = rollups.totals(Produce.objects.active().values_list(
+            'farmer__state', 'commodity', 'price', 'quantity', 'unit',
+        )).rows
+        stored = {
+            (row[0], row[1]): list(row[2:])
+            for row in MarketRollup.objects.filter(listings__gt=0).values_list('state', 'commodity', *rollups.FIELDS)
+        }
+        self.assertEqual(stored, dict(expected))
+
+    def test_every_write_path(self):
+        onion = self.listing("Onion", 500, 20, unit="kg")
+        self.listing("Onion", 10, 1800)
+        onion.price = 25
+        onion.save()
+        order = orders.reserve(onion.id, 100, "Buyer", "+919800000000")
+        self.assertMatchesListings()
+        orders.cancel(order.id)
+        bulk_listings.create_listings(self.farmer.id, [
+            Produce(farmer=self.farmer, name="Potato", commodity="Potato", quantity=5, price=1200, unit="quintal"),
+            Produce(farmer=self.farmer, name="Eggs", commodity="Eggs", quantity=30, price=6, unit="dozen"),
+        ])
+        self.assertMatchesListings()
+        self.farmer.state = "Kerala"
+        self.farmer.save()
+        self.assertMatchesListings()
+        onion.delete()
+        self.assertMatchesListings()
+
+    def test_analytics(self):
+        self.listing("Onion", 500, 20, unit="kg")  # 5 quintals at 2000
+        self.listing("Onion", 15, 1000)
+        self.listing("Eggs", 30, 6, unit="dozen")
+        figures = rollups.analytics(state="maharashtra")
+        self.assertEqual(figures['totals']['listings'], 3)
+        onion = next(row for row in figures['commodities'] if row['commodity'] == "Onion")
+        self.assertEqual(onion['quantity_quintals'], Decimal(20))
+        self.assertEqual(onion['avg_price'], Decimal(1500))
+        self.assertEqual(onion['weighted_price'], Decimal(1250))
+        self.assertEqual(rollups.analytics(state="Kerala")['markets'], [])
+
+
+class ForecastingTests(SimpleTestCase):
+    def test_fill_gaps(self):
+        y = np.array([[np.nan, 2.0, np.nan, np.nan, 5.0, np.nan]])
+        self.assertEqual(forecasting.fill_gaps(y).tolist(), [[2.0, 2.0, 2.0, 2.0, 5.0, 5.0]])
+
+    def test_picks_method_per_series(self):
+        days = 8 * forecasting.SEASON
+        weekly = 1000 + 100 * (np.arange(days) % forecasting.SEASON)
+        flat = np.full(days, 1500.0)
+        forecasts, spread, chosen = forecasting.forecast_all(np.stack([weekly, flat]), jobs=1)
+
+        methods = list(forecasting.METHODS)
+        self.assertEqual(methods[chosen[0]], forecasting.SEASONAL_NAIVE)
+        np.testing.assert_allclose(forecasts[0], weekly[days - forecasting.SEASON:][np.arange(forecasting.HORIZON) % forecasting.SEASON])
+        np.testing.assert_allclose(forecasts[1], 1500.0)
+        np.testing.assert_allclose(spread, 0, atol=1e-9)
+
+    def test_history_matrix_drops_thin_and_stale_series(self):
+        end = datetime.date(2024, 3, 31)
+        days = [end - datetime.timedelta(days=i) for i in range(40)]
+        rows = [("full", day, 100) for day in days]
+        rows += [("thin", day, 100) for day in days[:10]]
+        rows += [("stale", day, 100) for day in days[forecasting.HORIZON:]]
+        keys, y = forecasting.history_matrix(rows, end, 40)
+        self.assertEqual(keys, ["full"])
+        self.assertEqual(y.shape, (1, 40))
+
+
+class CropSuitabilityTests(SimpleTestCase):
+    FALLBACK = dict(zip(suitability.FEATURES, (50, 50, 50, 25, 70, 6.5, 100)))
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.model = suitability.load_model()
+
+    def test_profile_precedence(self):
+        profiles = {411001: {"N": 10}, "maharashtra": {"N": 20, "temperature": 30}}
+        features, source = suitability.profile_for(411001, "Maharashtra", profiles, self.FALLBACK, (22, 60))
+        self.assertEqual((features[:5], source), ([10, 50, 50, 22, 60], suitability.PINCODE))
+        features, source = suitability.profile_for(411002, "Maharashtra", profiles, self.FALLBACK, (22, 60))
+        self.assertEqual((features[:5], source), ([20, 50, 50, 30, 60], suitability.STATE))
+        features, source = suitability.profile_for(700001, "West Bengal", profiles, self.FALLBACK)
+        self.assertEqual((features, source), ([float(v) for v in self.FALLBACK.values()], suitability.DEFAULT))
+
+    def test_batched_scores_match_one_at_a_time(self):
+        rng = np.random.default_rng(3)
+        profiles = rng.uniform([0, 5, 5, 10, 15, 4, 20], [140, 145, 205, 43, 99, 9.5, 300], (7, 7))
+        original, suitability.CHUNK_SIZE = suitability.CHUNK_SIZE, 3
+        try:
+            batched = suitability.score(self.model, profiles, jobs=1)
+        finally:
+            suitability.CHUNK_SIZE = original
+
+        scale, shift = suitability.grid()
+        self.assertEqual(len(scale), suitability.GRID_SIZE)
+        for profile, scores in zip(profiles, batched):
+            points = np.clip(profile * scale + shift, suitability._LOWER, suitability._UPPER)
+            expected = self.model.predict_proba(pd.DataFrame(points, columns=suitability.FEATURES)).mean(axis=0)
+            np.testing.assert_allclose(scores, expected)
+
+    def test_top_crops(self):
+        classes = np.array(["maize", "rice", "wheat"])
+        top = suitability.top_crops(np.array([[0.2, 0.5, 0.3]]), classes, k=2)
+        self.assertEqual(top, [[("rice", 0.5), ("wheat", 0.3)]])
+
+
+class TimingTests(TestCase):
+    @override_settings(SERVER_TIMING=True, METRICS_ALLOWED_IPS=["127.0.0.1"])
+    def test_server_timing_and_metrics(self):
+        client = Client(HTTP_HOST="localhost")
+        response = client.get("/public/analytics/")
+        spans = dict(part.split(";", 1)[0:2] for part in response["Server-Timing"].split(", "))
+        self.assertIn("db", spans)
+        self.assertIn("template", spans)
+        self.assertIn("total", spans)
+
+        metrics = client.get("/metrics").content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",status="200",'
+                      'view="public.views.market_analytics_page"}', metrics)
+        self.assertIn('operation_duration_seconds_count{kind="template",name="dash/market/market_analytics.html"}',
+                      metrics)
+
+    @override_settings(SERVER_TIMING=False, METRICS_ALLOWED_IPS=[], TRUSTED_PROXIES=["10.0.0.1"])
+    def test_closed_unless_configured(self):
+        client = Client(HTTP_HOST="localhost")
+        self.assertNotIn("Server-Timing", client.get("/public/analytics/"))
+        self.assertEqual(client.get("/metrics").status_code, 403)
+
+        # Behind the proxy, the address it saw is what the allow-list checks
+        proxied = Client(HTTP_HOST="localhost", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="1.2.3.4, 192.0.2.7")
+        with self.settings(METRICS_ALLOWED_IPS=["10.0.0.1"]):
+            self.assertEqual(proxied.get("/metrics").status_code, 403)
+        with self.settings(METRICS_ALLOWED_IPS=["192.0.2.7"]):
+            self.assertEqual(proxied.get("/metrics").status_code, 200)
+
+    @override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"])
+    def test_cache_counters_exported(self):
+        def sample(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        before = (sample("cache_gets_total", prefix="timingtest", result="hit"),
+                  sample("cache_gets_total", prefix="timingtest", result="miss"),
+                  sample("cache_sets_total", prefix="timingtest"))
+        cache.set("timingtest:a", {"x": 1})
+        cache.get("timingtest:a")
+        cache.get_many(["timingtest:a", "timingtest:b"])
+        after = (sample("cache_gets_total", prefix="timingtest", result="hit"),
+                 sample("cache_gets_total", prefix="timingtest", result="miss"),
+                 sample("cache_sets_total", prefix="timingtest"))
+        self.assertEqual([a - b for a, b in zip(after, before)], [2, 1, 1])
+        metrics = Client(HTTP_HOST="localhost").get("/metrics").content.decode()
+        self.assertIn('cache_gets_total{prefix="timingtest",result="hit"}', metrics)
+
+    def test_nested_spans_count_once(self):
+        timings = timing.Timings()
+        token = timing._current.set(timings)
+        try:
+            with timing.timed("cache", "set_many"):
+                with timing.timed("cache", "set"):
+                    pass
+                with timing.timed("provider", "weather"):
+                    pass
+        finally:
+            timing._current.reset(token)
+        self.assertEqual({key: count for key, (seconds, count) in timings.snapshot().items()},
+                         {"cache": 1, "provider.weather": 1})
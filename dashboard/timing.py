@@ -0,0 +1,201 @@
+"""Where a request's time goes: database, cache, providers, models, templates.
+
+``TimingMiddleware`` opens a ``Timings`` for each request in a context
+variable; the hooks below add to it:
+
+* database: an execute wrapper on every connection (``install_db_timing``,
+  connected to ``connection_created``), so queries from FanOut threads
+  count too;
+* cache: the backends in ``cache_backends`` time each operation;
+* providers: ``ProviderClient.call``, retries and backoff included;
+* models: the ``timed("model", ...)`` blocks around inference;
+* templates: ``TimedDjangoTemplates``, the template backend in settings.
+
+The totals go out in a ``Server-Timing`` header (to staff, or to everyone
+with settings.SERVER_TIMING), and every span and request is observed in
+Prometheus histograms served by ``metrics_view`` to METRICS_ALLOWED_IPS.
+Kinds overlap (a template's time includes the queries its lazy querysets
+run) and concurrent work adds up, so the kinds can sum to more than the
+total. A span nested in one of the same kind (``set_many`` calling
+``set``) is only counted once.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest, multiprocess,
+)
+
+from .middleware import login_exempt
+
+# Kinds reported per name in Server-Timing ("provider.weather"); the rest as one total
+PER_NAME = ("provider", "model")
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to produce a response", ["view", "method", "status"],
+)
+REQUEST_PHASE_SECONDS = Histogram(
+    "http_request_phase_seconds", "Time one request spent on each kind of work", ["view", "kind"],
+)
+OPERATION_SECONDS = Histogram(
+    "operation_duration_seconds", "Single database, cache, provider, model or template operations",
+    ["kind", "name"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# labels() takes a lock and builds a key on every call; spans are frequent
+_operation_children = {}
+
+_current = contextvars.ContextVar("request_timings", default=None)
+_active = contextvars.ContextVar("timed_kinds", default=frozenset())
+
+
+class Timings:
+    """Seconds and operation counts per kind for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = {}
+
+    def add(self, kind, name, seconds):
+        key = f"{kind}.{name}" if kind in PER_NAME else kind
+        with self._lock:
+            span = self.spans.setdefault(key, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+
+    def header(self):
+        total = time.perf_counter() - self.started
+        with self._lock:
+            parts = [
+                f'{key};dur={seconds * 1000:.1f};desc="{count} ops"'
+                for key, (seconds, count) in sorted(self.spans.items())
+            ]
+        return ", ".join(parts + [f"total;dur={total * 1000:.1f}"])
+
+    def snapshot(self):
+        with self._lock:
+            return {key: tuple(span) for key, span in self.spans.items()}
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def timed(kind, name=""):
+    """Time the block as one `kind` operation."""
+    active = _active.get()
+    if kind in active:
+        yield
+        return
+    token = _active.set(active | {kind})
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        _active.reset(token)
+        child = _operation_children.get((kind, name))
+        if child is None:
+            child = _operation_children[(kind, name)] = OPERATION_SECONDS.labels(kind, name)
+        child.observe(seconds)
+        timings = _current.get()
+        if timings is not None:
+            timings.add(kind, name, seconds)
+
+
+def _time_query(execute, sql, params, many, context):
+    with timed("db", context["connection"].alias):
+        return execute(sql, params, many, context)
+
+
+def install_db_timing(sender, connection, **kwargs):
+    """connection_created receiver: time every query on the connection."""
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+        self.origin = template.origin
+
+    def render(self, context=None, request=None):
+        with timed("template", self.origin.template_name or "<string>"):
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with each render timed."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    # The view's dotted path keeps the label set small; raw paths would not
+    return match._func_path if match is not None else "unmatched"
+
+
+class TimingMiddleware:
+    """Time each request and report where the time went. Goes first in
+    MIDDLEWARE so the other middleware are inside the measurement."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = Timings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        view = _view_name(request)
+        REQUEST_SECONDS.labels(view, request.method, response.status_code).observe(
+            time.perf_counter() - timings.started,
+        )
+        for key, (seconds, count) in timings.snapshot().items():
+            REQUEST_PHASE_SECONDS.labels(view, key).observe(seconds)
+        if settings.SERVER_TIMING or getattr(getattr(request, "user", None), "is_staff", False):
+            response["Server-Timing"] = timings.header()
+        return response
+
+
+def client_address(request):
+    """REMOTE_ADDR, or for a request through settings.TRUSTED_PROXIES the
+    nearest X-Forwarded-For address that isn't one of them."""
+    trusted = settings.TRUSTED_PROXIES
+    address = request.META.get("REMOTE_ADDR")
+    if address in trusted:
+        forwarded = [hop.strip() for hop in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if hop.strip()]
+        for hop in reversed(forwarded):
+            address = hop
+            if hop not in trusted:
+                break
+    return address
+
+
+@login_exempt
+def metrics_view(request):
+    """Prometheus exposition. Under a multi-process server, set
+    PROMETHEUS_MULTIPROC_DIR so every worker's samples are merged."""
+    if client_address(request) not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -9,6 +9,9 @@ urlpatterns = [
     path('tools/fertilizer_recommendation', fertrec),
     path('forum/', forum),
     path('prices/', crop_prices_page),
+    path('prices/alerts/', price_alerts_page),
+    path('prices/alerts/<int:id>/rearm/', rearm_price_alert),
+    path('prices/alerts/<int:id>/delete/', delete_price_alert),
     path('news/', news_page),
     path('help/', help_page),
     path('profile/', profile_page),
@@ -16,7 +19,13 @@ urlpatterns = [
     path('layout_dashboard/', layout_dashboard),
     path('logout/', logout_view),
     path('list_product/', list_page),
+    path('list_product/bulk/', bulk_list_page),
     path('check_products/', check_my_listings),
-    path('delete_listing/<int:id>/', delete_listing)
+    path('delete_listing/<int:id>/', delete_listing),
+    path('orders/<int:id>/confirm/', confirm_order),
+    path('orders/<int:id>/cancel/', cancel_order),
+    path('widgets/weather/', weather_widget),
+    path('widgets/news/', news_widget),
+    path('widgets/market_stats/', market_stats_widget),
 ]
 
@@ -1,13 +1,28 @@
 import datetime
 from django.shortcuts import render, redirect
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
 from django.core.cache import cache
 from django.db import transaction
-from .models import User, Produce
-from .forms import CropRecommendationForm, FertilizerPredictionForm, UserInputForm, CropProduceListForm
+from django.db.models import Prefetch
+from django.views.decorators.http import require_POST
+from .models import User, Produce, ListingStats, Order, PriceAlert
+from . import orders
+from .forms import CropRecommendationForm, FertilizerPredictionForm, UserInputForm, CropProduceListForm, BulkProduceUploadForm, PriceAlertForm
+from .bulk_listings import import_listings
+from .csv_upload import CSVUploadError
+from .market_prices import attach_outlook, compare_with_mandi, refresh_market_prices
+from .mandis import nearby_prices
 import pickle
 import numpy as np
 from django.template.defaulttags import register
-from .functions import getWeatherDetails, getAgroNews, getFertilizerRecommendation, getMarketPricesAllStates, GetResponse
+from .functions import getWeatherDetails, getAgroNews, getFertilizerRecommendation, GetResponse
+from .singleflight import single_flight
+from .fanout import FanOut
+from .timing import timed
+from .middleware import fragment, get_farmer, login_exempt
+from .cachekeys import USER_PROFILE, WEATHER, AGRO_NEWS, MARKET_PRICES, FARMER_LISTINGS, PUBLIC_LISTING_COUNT
+from django.conf import settings
 import base64
 import os
 from google import genai
@@ -26,6 +41,9 @@ except Exception as e:
     cropRecommendationModel = None
     fertilizerRecommendModel = None
 
+# Shown in place of a source that is slow or down
+WEATHER_PLACEHOLDER = ["Unavailable", "--", "--", "--", "--"]
+
 @register.filter
 def get_range(value):
     return range(value)
@@ -35,83 +53,134 @@ def index(indexable, i):
     return indexable[i]
 
 def getDetailsFromUID(id):
-    cache_key = f'user_{id}'
-    user = cache.get(cache_key)
-    if not user:
-        try:
-            user = User.objects.get(id=id)
-            cache.set(cache_key, user, timeout=300)  # Cache for 5 minutes
-        except User.DoesNotExist:
-            logger.error(f"User with id {id} not found")
-            raise
+    profile = USER_PROFILE.get(id=id)
+    if profile:
+        # Rebuilt from the cached field values; no query and no unpickling
+        return User(**profile)
+    try:
+        user = User.objects.get(id=id)
+    except User.DoesNotExist:
+        logger.error(f"User with id {id} not found")
+        raise
+    profile = {field.attname: getattr(user, field.attname) for field in User._meta.concrete_fields}
+    profile['phone'] = str(user.phone)
+    USER_PROFILE.set(profile, id=id)  # Dropped by the User signals when the profile changes
     return user
 
+@login_exempt
 def e404_page(request):
     error_message = request.session.get("error_message", "An error occurred")
     return render(request, "dash/404.html", {"errormsg": error_message})
 
+def load_weather(userlogged):
+    # Geocode and weather are one chain; concurrent misses share one provider call
+    lat, lon = userlogged.coords
+    if lat is None:
+        return None
+    return single_flight(WEATHER.key(lat=lat, lon=lon), lambda: getWeatherDetails([lat, lon]), timeout=WEATHER.timeout)
+
+def load_news():
+    return single_flight(AGRO_NEWS.key(), getAgroNews, timeout=AGRO_NEWS.timeout)
+
+def load_market_stats(userlogged):
+    stats = FARMER_LISTINGS.get(id=userlogged.id)
+    public_produces_count = PUBLIC_LISTING_COUNT.get()
+    if stats is None or public_produces_count is None:
+        # Both counters come from the materialized stats rows, in one query
+        rows = {
+            row.farmerid: row
+            for row in ListingStats.objects.filter(
+                farmerid__in=[userlogged.id, ListingStats.GLOBAL]
+            ).select_related('latest_listing')
+        }
+        mine = rows.get(userlogged.id)
+        stats = {"produces_count": mine.listing_count if mine else 0, "last_listing": ""}
+        last_listing = mine.latest_listing if mine else None
+        if last_listing:
+            stats["last_listing"] = {
+                "name": last_listing.name,
+                "quantity": last_listing.quantity,
+                "price": last_listing.price,
+                "created_at": last_listing.created_at,
+            }
+        FARMER_LISTINGS.set(stats, id=userlogged.id)
+
+        overall = rows.get(ListingStats.GLOBAL)
+        public_produces_count = overall.listing_count if overall else 0
+        PUBLIC_LISTING_COUNT.set(public_produces_count)
+    return {**stats, "public_produces_count": public_produces_count}
+
 def home_page(request):
     try:
-        id = request.session.get("member_logged_id")
-        if not id:
-            raise ValueError("User not logged in")
+        # The concrete instance, not the lazy proxy, since it is shared with the fan-out threads
+        userlogged = get_farmer(request)
+        widgets = settings.DASHBOARD_WIDGETS
 
-        userlogged = getDetailsFromUID(id)
-        
-        my_products = Produce.objects.filter(farmerid=userlogged.id)
-        public_products = Produce.objects.all()
-        
-        # Cache expensive operations
-        weather_cache_key = f'weather_{userlogged.coords}'
-        details = cache.get(weather_cache_key)
-        if not details:
-            details = getWeatherDetails(userlogged.coords)
-            cache.set(weather_cache_key, details, timeout=3600)  # Cache for 1 hour
-
-        news_cache_key = 'agro_news'
-        news = cache.get(news_cache_key)
-        if not news:
-            news = getAgroNews()
-            cache.set(news_cache_key, news, timeout=86400)  # Cache for 24 hours
+        # The shell only waits briefly for each provider; cards that miss their
+        # deadline are fetched by the browser from their widget endpoints
+        sources = FanOut()
+        sources.submit('weather', lambda: load_weather(userlogged), widgets['weather']['shell_deadline'])
+        sources.submit('news', load_news, widgets['news']['shell_deadline'])
 
-        context = {
-            "user": userlogged,
-            "produces": my_products,
-            "produces_count": my_products.count(),
-            "public_produces_count": public_products.count(),
-            "last_listing": my_products.last() if my_products.exists() else "",
-            'news': news[:3],
-            'weather': details,
-        }
+        # The ORM queries run here while the providers are in flight
+        context = {"user": userlogged, **load_market_stats(userlogged)}
+
+        fetched = sources.results()
+        context['weather'] = fetched['weather']
+        context['news'] = fetched['news'][:3] if fetched['news'] is not None else None
         return render(request, 'dash/home.html', context)
     except Exception as e:
         logger.error(f"Home page error: {str(e)}")
         request.session["error_message"] = "An unexpected error occurred"
         return redirect('/admin/404/')
 
-def forum(request):
+def _widget_response(request, template, context, name, failed=False):
+    response = render(request, template, context)
+    # Weather and stats depend on the farmer, so only the browser may keep them;
+    # a placeholder shown after an error isn't kept at all
+    max_age = 0 if failed else settings.DASHBOARD_WIDGETS[name]['max_age']
+    patch_cache_control(response, private=True, max_age=max_age)
+    return response
+
+@fragment
+def weather_widget(request):
     try:
-        id = request.session.get("member_logged_id")
-        if not id:
-            raise ValueError("User not logged in")
-        return render(request, 'dash/forum.html')
+        weather = load_weather(request.farmer) or WEATHER_PLACEHOLDER
+        return _widget_response(request, 'dash/widgets/weather.html', {'weather': weather}, 'weather')
     except Exception as e:
-        logger.error(f"Forum error: {str(e)}")
-        request.session["error_message"] = "Please Login to Continue"
-        return redirect('/admin/404/')
+        logger.error(f"Weather widget error: {str(e)}")
+        return _widget_response(request, 'dash/widgets/weather.html', {'weather': WEATHER_PLACEHOLDER}, 'weather',
+                                failed=True)
+
+@fragment
+def news_widget(request):
+    try:
+        return _widget_response(request, 'dash/widgets/news.html', {'news': load_news()[:3]}, 'news')
+    except Exception as e:
+        logger.error(f"News widget error: {str(e)}")
+        return _widget_response(request, 'dash/widgets/news.html', {'news': []}, 'news', failed=True)
+
+@fragment
+def market_stats_widget(request):
+    try:
+        stats = load_market_stats(request.farmer)
+        return _widget_response(request, 'dash/widgets/market_stats.html', stats, 'market_stats')
+    except Exception as e:
+        logger.error(f"Market stats widget error: {str(e)}")
+        return _widget_response(request, 'dash/widgets/unavailable.html', {'label': "Market Overview"},
+                                'market_stats', failed=True)
+
+def forum(request):
+    return render(request, 'dash/forum.html')
 
 def croprec(request):
     try:
-        logged_id = request.session.get("member_logged_id")
-        if not logged_id:
-            raise ValueError("User not logged in")
-            
-        userlogged = getDetailsFromUID(logged_id)
-        
+        userlogged = request.farmer
+
         form = CropRecommendationForm(request.POST if request.method == 'POST' else None)
         
         if request.method == 'POST' and form.is_valid():
-            weatherd = getWeatherDetails(userlogged.coords)
+            weatherd = load_weather(userlogged)
             try:
                 data = np.array([[
                     form.cleaned_data['nitrogen'],
@@ -122,7 +191,8 @@ def croprec(request):
                     form.cleaned_data['PH'],
                     form.cleaned_data['rainfall']
                 ]])
-                prediction = cropRecommendationModel.predict(data)
+                with timed("model", "crop_recommend"):
+                    prediction = cropRecommendationModel.predict(data)
                 context = {
                     'form': form,
                     'user': userlogged,
@@ -151,18 +221,10 @@ def croprec(request):
 
 def news_page(request):
     try:
-        logged_id = request.session.get("member_logged_id")
-        if not logged_id:
-            raise ValueError("User not logged in")
-            
-        userlogged = getDetailsFromUID(logged_id)
-        
-        news_cache_key = 'agro_news'
-        news = cache.get(news_cache_key)
-        if not news:
-            news = getAgroNews()
-            cache.set(news_cache_key, news, timeout=86400)
-            
+        userlogged = request.farmer
+
+        news = load_news()
+
         context = {
             'news': news,
             'user': userlogged,
@@ -176,28 +238,26 @@ def news_page(request):
 
 def fertrec(request):
     try:
-        logged_id = request.session.get("member_logged_id")
-        if not logged_id:
-            raise ValueError("User not logged in")
-            
-        userlogged = getDetailsFromUID(logged_id)
-        
+        userlogged = request.farmer
+
         form = FertilizerPredictionForm(request.POST if request.method == 'POST' else None)
         
         if request.method == 'POST' and form.is_valid():
-            weatherd = getWeatherDetails(userlogged.coords)
+            weatherd = load_weather(userlogged)
             try:
-                prediction = getFertilizerRecommendation(
-                    fertilizerRecommendModel,
-                    form.cleaned_data['nitrogen'],
-                    form.cleaned_data['phosphorus'],
-                    form.cleaned_data['potassium'],
-                    weatherd[1],  # temp
-                    weatherd[2],  # humidity
-                    form.cleaned_data['moisture'],
-                    form.cleaned_data['soil_type'],
-                    form.cleaned_data['crop']
-                )
+                # Includes fitting the label encoders, which runs on every call
+                with timed("model", "fertilizer"):
+                    prediction = getFertilizerRecommendation(
+                        fertilizerRecommendModel,
+                        form.cleaned_data['nitrogen'],
+                        form.cleaned_data['phosphorus'],
+                        form.cleaned_data['potassium'],
+                        weatherd[1],  # temp
+                        weatherd[2],  # humidity
+                        form.cleaned_data['moisture'],
+                        form.cleaned_data['soil_type'],
+                        form.cleaned_data['crop']
+                    )
                 context = {
                     'form': form,
                     'user': userlogged,
@@ -226,23 +286,27 @@ def fertrec(request):
 
 def crop_prices_page(request):
     try:
-        logged_id = request.session.get("member_logged_id")
-        if not logged_id:
-            raise ValueError("User not logged in")
-            
-        userlogged = getDetailsFromUID(logged_id)
-        
-        prices_cache_key = f'prices_{logged_id}'
-        latest_prices = cache.get(prices_cache_key)
-        if not latest_prices:
-            latest_prices = getMarketPricesAllStates()
-            cache.set(prices_cache_key, latest_prices, timeout=3600)
-            
+        userlogged = request.farmer
+
+        # Prices are the same for every farmer, so share one entry; whoever
+        # refreshes it also rebuilds the price index and checks everyone's alerts
+        latest_prices = single_flight(MARKET_PRICES.key(), refresh_market_prices, timeout=MARKET_PRICES.timeout)
+        # Open on the markets around the farm; the full list is one click away
+        nearby = []
+        if userlogged.latitude is not None and not request.GET.get('all'):
+            # Forecasts come precomputed from `manage.py forecast_prices`
+            nearby = attach_outlook(nearby_prices(latest_prices or [], userlogged.latitude, userlogged.longitude))
+        triggered = PriceAlert.objects.filter(
+            farmer_id=userlogged.id, active=False, triggered_at__isnull=False,
+        ).order_by('-triggered_at')[:5]
+
         context = {
             "userid": userlogged.id,
             "user": userlogged,
             "date": datetime.datetime.now(),
-            "prices": latest_prices
+            "prices": nearby or latest_prices,
+            "nearby": bool(nearby),
+            "triggered_alerts": triggered,
         }
         return render(request, 'dash/check_prices.html', context)
     except Exception as e:
@@ -250,14 +314,65 @@ def crop_prices_page(request):
         request.session["error_message"] = "Please Login to Continue"
         return redirect('/admin/404/')
 
+def price_alerts_page(request):
+    try:
+        userlogged = request.farmer
+
+        form = PriceAlertForm(request.POST if request.method == 'POST' else None)
+        context = {
+            'form': form,
+            'user': userlogged,
+            'userid': userlogged.id,
+        }
+        if request.method == 'POST' and form.is_valid():
+            state = form.cleaned_data['state'] or userlogged.state
+            if not state:
+                context['error'] = "Enter the state whose markets you want to watch"
+            else:
+                PriceAlert.objects.create(
+                    farmer_id=userlogged.id,
+                    commodity=form.cleaned_data['commodity'],
+                    state=state,
+                    direction=form.cleaned_data['direction'],
+                    threshold=form.cleaned_data['threshold'],
+                )
+                context['success'] = f"We'll let you know when {form.cleaned_data['commodity']} crosses Rs {form.cleaned_data['threshold']} in {state}."
+                context['form'] = PriceAlertForm()
+        context['alerts'] = PriceAlert.objects.filter(farmer_id=userlogged.id).order_by('-created_at')
+        return render(request, 'dash/price_alerts.html', context)
+    except Exception as e:
+        logger.error(f"Price alerts error: {str(e)}")
+        request.session["error_message"] = "Please Login to Continue"
+        return redirect('/admin/404/')
+
+@require_POST
+def rearm_price_alert(request, id):
+    try:
+        userlogged = request.farmer
+        PriceAlert.objects.filter(id=id, farmer_id=userlogged.id).update(
+            active=True, triggered_at=None, triggered_price=None, triggered_market="",
+        )
+        return redirect('/admin/prices/alerts/')
+    except Exception as e:
+        logger.error(f"Re-arm price alert error: {str(e)}")
+        request.session["error_message"] = "Please Login to Continue"
+        return redirect('/admin/404/')
+
+@require_POST
+def delete_price_alert(request, id):
+    try:
+        userlogged = request.farmer
+        PriceAlert.objects.filter(id=id, farmer_id=userlogged.id).delete()
+        return redirect('/admin/prices/alerts/')
+    except Exception as e:
+        logger.error(f"Delete price alert error: {str(e)}")
+        request.session["error_message"] = "Please Login to Continue"
+        return redirect('/admin/404/')
+
 def help_page(request):
     try:
-        logged_id = request.session.get("member_logged_id")
-        if not logged_id:
-            raise ValueError("User not logged in")
-            
-        userlogged = getDetailsFromUID(logged_id)
-        
+        userlogged = request.farmer
+
         form = UserInputForm(request.POST if request.method == 'POST' else None)
         
         if request.method == 'POST' and form.is_valid():
@@ -301,12 +416,8 @@ def help_page(request):
 
 def profile_page(request):
     try:
-        logged_id = request.session.get("member_logged_id")
-        if not logged_id:
-            raise ValueError("User not logged in")
-            
-        userlogged = getDetailsFromUID(logged_id)
-        
+        userlogged = request.farmer
+
         context = {
             "userid": userlogged.id,
             "user": userlogged,
@@ -317,6 +428,7 @@ def profile_page(request):
         request.session["error_message"] = "Please Login to Continue"
         return redirect('/admin/404/')
 
+@login_exempt
 def logout_view(request):
     try:
         if 'member_logged_id' in request.session:
@@ -331,26 +443,26 @@ def logout_view(request):
 
 def list_page(request):
     try:
-        logged_id = request.session.get("member_logged_id")
-        if not logged_id:
-            raise ValueError("User not logged in")
-            
-        userlogged = getDetailsFromUID(logged_id)
-        
+        userlogged = request.farmer
+
         form = CropProduceListForm(request.POST if request.method == 'POST' else None)
         
         if request.method == 'POST' and form.is_valid():
             try:
-                Produce.objects.create(
-                    **form.cleaned_data,
-                    farmerid=int(userlogged.id),
-                    unit="quintals"
-                )
+                # The listing and its counters commit together
+                with transaction.atomic():
+                    produce = Produce.objects.create(
+                        **form.cleaned_data,
+                        farmer_id=userlogged.id,
+                        unit="quintals"
+                    )
+                compare_with_mandi([produce], lambda produce: userlogged.state)
                 context = {
                     'form': form,
                     'user': userlogged,
                     'userid': userlogged.id,
-                    'success': "Your produce has been listed."
+                    'success': "Your produce has been listed.",
+                    'produce': produce,
                 }
             except Exception as e:
                 logger.error(f"Listing creation error: {str(e)}")
@@ -372,15 +484,58 @@ def list_page(request):
         request.session["error_message"] = "Please login to continue"
         return redirect('/admin/404/')
 
+def bulk_list_page(request):
+    try:
+        userlogged = request.farmer
+
+        form = BulkProduceUploadForm(request.POST or None, request.FILES or None)
+        context = {
+            'form': form,
+            'user': userlogged,
+            'userid': userlogged.id,
+            'created': 0,
+        }
+        if request.method == 'POST' and form.is_valid():
+            try:
+                created, row_errors = import_listings(form.cleaned_data['file'], userlogged.id)
+                context['created'] = len(created)
+                if row_errors:
+                    context['row_errors'] = row_errors
+                    context['error'] = f"{len(row_errors)} row(s) need fixing; nothing was listed"
+                elif not created:
+                    context['error'] = "The file has no listings"
+                else:
+                    context['success'] = f"{len(created)} listings are now on the public portal."
+            except CSVUploadError as e:
+                context['error'] = str(e)
+            except Exception as e:
+                logger.error(f"Bulk listing error: {str(e)}")
+                context['error'] = "Failed to list produce"
+
+        if not request.accepts('text/html') and request.accepts('application/json'):
+            status = 400 if 'error' in context or form.errors else 200
+            return JsonResponse({
+                'created': context['created'],
+                'error': context.get('error') or form.errors.get_json_data() or None,
+                'row_errors': context.get('row_errors', []),
+            }, status=status)
+        return render(request, "dash/market/bulk_list_produce.html", context)
+    except Exception as e:
+        logger.error(f"Bulk list page error: {str(e)}")
+        request.session["error_message"] = "Please login to continue"
+        return redirect('/admin/404/')
+
 def check_my_listings(request):
     try:
-        logged_id = request.session.get("member_logged_id")
-        if not logged_id:
-            raise ValueError("User not logged in")
-            
-        userlogged = getDetailsFromUID(logged_id)
-        produces = Produce.objects.filter(farmerid=userlogged.id)
-        
+        userlogged = request.farmer
+        open_orders = Order.objects.filter(status=Order.RESERVED).order_by('created_at')
+        produces = compare_with_mandi(
+            Produce.objects.filter(farmer_id=userlogged.id).prefetch_related(
+                Prefetch('orders', queryset=open_orders, to_attr='open_orders')
+            ),
+            lambda produce: userlogged.state,
+        )
+
         context = {
             'user': userlogged,
             'produces': produces
@@ -393,18 +548,38 @@ def check_my_listings(request):
 
 def delete_listing(request, id):
     try:
-        logged_id = request.session.get("member_logged_id")
-        if not logged_id:
-            raise ValueError("User not logged in")
-            
-        userlogged = getDetailsFromUID(logged_id)
-        listing = Produce.objects.get(id=id, farmerid=userlogged.id)
-        listing.delete()
+        userlogged = request.farmer
+        with transaction.atomic():
+            listing = Produce.objects.get(id=id, farmer_id=userlogged.id)
+            listing.delete()
         return redirect('/admin/check_products')
     except Exception as e:
         logger.error(f"Delete listing error: {str(e)}")
         request.session["error_message"] = "Please Login to Continue"
         return redirect('/admin/404/')
 
+@require_POST
+def confirm_order(request, id):
+    try:
+        userlogged = request.farmer
+        orders.confirm(id, farmer_id=userlogged.id)
+        return redirect('/admin/check_products')
+    except Exception as e:
+        logger.error(f"Confirm order error: {str(e)}")
+        request.session["error_message"] = "This order can no longer be confirmed"
+        return redirect('/admin/404/')
+
+@require_POST
+def cancel_order(request, id):
+    try:
+        userlogged = request.farmer
+        orders.cancel(id, farmer_id=userlogged.id)
+        return redirect('/admin/check_products')
+    except Exception as e:
+        logger.error(f"Cancel order error: {str(e)}")
+        request.session["error_message"] = "This order can no longer be cancelled"
+        return redirect('/admin/404/')
+
+@login_exempt
 def layout_dashboard(request):
     return render(request, 'dash/layout_dashboard.html')
\ No newline at end of file
@@ -1,6 +1,52 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.urls import path
+
+from dashboard.csv_upload import CSVUploadError
+from .forms import FarmerImportUploadForm
+from .importer import import_farmers, write_fidcs
 
 # Register your models here.
 from .models import User
 
-admin.site.register(User)
\ No newline at end of file
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    change_list_template = "admin/landing/user/change_list.html"
+    list_display = ('name', 'phone', 'pincode', 'state', 'farmname')
+    search_fields = ('name', 'phone')
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='landing_user_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return HttpResponse(status=403)
+        form = FarmerImportUploadForm(request.POST or None, request.FILES or None)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Import farmers",
+            'form': form,
+        }
+        if request.method == 'POST' and form.is_valid():
+            try:
+                created, row_errors = import_farmers(form.cleaned_data['file'])
+            except CSVUploadError as e:
+                messages.error(request, str(e))
+            else:
+                if row_errors:
+                    context['row_errors'] = row_errors
+                    messages.error(request, f"{len(row_errors)} row(s) need fixing; nothing was imported")
+                elif not created:
+                    messages.warning(request, "The file has no farmers")
+                else:
+                    # Hand the FIDCs straight back; they are the farmers' login codes
+                    response = HttpResponse(content_type="text/csv")
+                    response['Content-Disposition'] = 'attachment; filename="farmer_fidcs.csv"'
+                    write_fidcs(response, created)
+                    return response
+        return render(request, "admin/landing/user/import.html", context)
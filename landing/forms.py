@@ -44,4 +44,19 @@ class LoginWithFIDC(forms.Form):
     fidcId = forms.CharField(label="FIDC Number",widget=forms.TextInput(attrs={
         'class': 'form-control',
         'placeholder': 'Enter your name'
-    }),max_length=200)
\ No newline at end of file
+    }),max_length=200)
+
+
+class FarmerImportForm(RegisterFIDC):
+    """One row of a bulk farmer import; the free-text fields may be left empty."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in ('address', 'farmlandmarks', 'bio'):
+            self.fields[field].required = False
+
+
+class FarmerImportUploadForm(forms.Form):
+    file = forms.FileField(label="Farmers CSV", widget=forms.ClearableFileInput(attrs={
+        'accept': '.csv,text/csv'
+        }))
@@ -0,0 +1,111 @@
+"""Bulk farmer onboarding from a CSV file.
+
+Rows are validated with the registration form in chunks, phone numbers are
+checked against the database one chunk at a time, each distinct pincode is
+geocoded once, and the farmers are created with bulk_create in a single
+transaction. Nothing is created unless every row is valid.
+"""
+import csv
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import IntegrityError, transaction
+
+from dashboard import geo
+from dashboard.csv_upload import CSVUploadError, chunks, read_rows
+from .forms import FarmerImportForm
+from .login_cfg import GetLocation
+from .models import User
+
+COLUMNS = ("name", "phone", "pincode", "farmname", "farmarea")
+OPTIONAL_COLUMNS = ("address", "farmlandmarks", "bio")
+MAX_ROWS = 10000
+CHUNK_SIZE = 500
+# Concurrent geocoding lookups; each distinct pincode is looked up once
+GEOCODE_WORKERS = 4
+
+
+def validate(rows):
+    """Returns (list of (line, cleaned row), errors), errors being
+    [{'row': line number, 'errors': {field: [messages]}}]."""
+    valid, errors = [], []
+    seen_phones = {}
+    for chunk in chunks(rows, CHUNK_SIZE):
+        if len(valid) + len(errors) + len(chunk) > MAX_ROWS:
+            raise CSVUploadError(f"At most {MAX_ROWS} farmers per import")
+        cleaned = []
+        for line, row in chunk:
+            form = FarmerImportForm({
+                column: (row.get(column) or "").strip() for column in COLUMNS + OPTIONAL_COLUMNS
+            })
+            if not form.is_valid():
+                errors.append({"row": line, "errors": form.errors.get_json_data()})
+                continue
+            phone = str(form.cleaned_data['phone'])
+            if phone in seen_phones:
+                errors.append(_phone_error(line, f"Same phone number as row {seen_phones[phone]}"))
+                continue
+            seen_phones[phone] = line
+            cleaned.append((line, form.cleaned_data))
+
+        # One query per chunk for numbers that are already registered
+        taken = {str(phone) for phone in User.objects.filter(
+            phone__in=[str(data['phone']) for _, data in cleaned]
+        ).values_list('phone', flat=True)}
+        for line, data in cleaned:
+            if str(data['phone']) in taken:
+                errors.append(_phone_error(line, "This phone number is already registered"))
+            else:
+                valid.append((line, data))
+    return valid, errors
+
+
+def _phone_error(line, message):
+    return {"row": line, "errors": {"phone": [{"message": message, "code": "unique"}]}}
+
+
+def locate_pincodes(pincodes):
+    """{pincode: (state, country, lat, lon)}, one lookup per distinct pincode."""
+    pincodes = sorted(set(pincodes))
+    with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as pool:
+        return dict(zip(pincodes, pool.map(GetLocation, pincodes)))
+
+
+def create_farmers(valid):
+    """Geocode and insert validated rows; returns the created users in row order."""
+    locations = locate_pincodes(data['pincode'] for _, data in valid)
+    users = []
+    for _, data in valid:
+        state, country, lat, lon = locations[data['pincode']]
+        users.append(User(
+            **data,
+            fidc=uuid.uuid4(),
+            state=state,
+            country=country,
+            latitude=lat,
+            longitude=lon,
+            geohash=geo.encode(lat, lon) if lat is not None else "",
+        ))
+    with transaction.atomic():
+        return User.objects.bulk_create(users, batch_size=CHUNK_SIZE)
+
+
+def import_farmers(upload, dry_run=False):
+    """(created users, errors). Nothing is created if any row is invalid, or on
+    a dry run."""
+    valid, errors = validate(read_rows(upload, COLUMNS))
+    if errors or not valid or dry_run:
+        return [], errors
+    try:
+        return create_farmers(valid), []
+    except IntegrityError as e:
+        # A number registered between the check and the insert
+        raise CSVUploadError(f"Import conflicted with a concurrent registration: {str(e)}")
+
+
+def write_fidcs(output, users):
+    """CSV of the new farmers' FIDCs, to hand back to the cooperative."""
+    writer = csv.writer(output)
+    writer.writerow(["name", "phone", "pincode", "fidc"])
+    for user in users:
+        writer.writerow([user.name, str(user.phone), user.pincode, user.fidc])
@@ -1,38 +1,105 @@
 import googlemaps
 import os
+import threading
 from dotenv import load_dotenv
+from dashboard import simulator
+from dashboard.providers import get_provider
+from dashboard.cachekeys import GEOCODE
+from dashboard.singleflight import single_flight
 
 # Load API key from .env file
 load_dotenv()
 google_maps_api_key = os.getenv("GOOGLE_MAPS_API_KEY")
 
-# Initialize Google Maps client
-gmaps = googlemaps.Client(key=google_maps_api_key)
+_gmaps = None
+_gmaps_lock = threading.Lock()
 
-def GetAddressDetails(pincode):
-    geocode_result = gmaps.geocode(str(pincode))
+
+def getMapsProvider():
+    # googlemaps raises its own transport errors, so teach the provider to retry them
+    return get_provider("gmaps", retry_on=(googlemaps.exceptions.Timeout, googlemaps.exceptions.TransportError))
+
+
+class SingleAttemptClient(googlemaps.Client):
+    """googlemaps.Client making one attempt per call. The client would retry
+    5xx responses on its own, on top of the provider layer's retries and
+    outside its rate limiting; here a response it would retry raises
+    TransportError, which the provider retries instead."""
+
+    def _request(self, url, params, first_request_time=None, retry_counter=0, *args, **kwargs):
+        if retry_counter > 0:
+            raise googlemaps.exceptions.TransportError("Retriable response from Google Maps")
+        return super()._request(url, params, first_request_time, retry_counter, *args, **kwargs)
+
+
+def getMapsClient():
+    # Created on first use so importing this module needs neither a key nor the network
+    global _gmaps
+    if _gmaps is None:
+        with _gmaps_lock:
+            if _gmaps is None:
+                provider = getMapsProvider()
+                key = google_maps_api_key
+                if simulator.is_enabled() and not key:
+                    # The client insists on a key even though the simulator never checks it
+                    key = "AIza-simulated"
+                _gmaps = SingleAttemptClient(
+                    key=key,
+                    connect_timeout=provider.config["connect_timeout"],
+                    read_timeout=provider.config["read_timeout"],
+                    retry_over_query_limit=False,
+                    requests_session=provider.session,
+                )
+    return _gmaps
+
+
+def _geocode(query):
+    # [] is the geocoder finding nothing (ZERO_RESULTS); provider errors raise
+    return getMapsProvider().call(lambda: getMapsClient().geocode(str(query)))
+
+
+def _geocode_uncached(pincode):
+    try:
+        return _geocode(pincode)
+    except Exception as e:
+        print(f"Error in Geocode ({pincode}): {e}")
+        return []
+
+def Geocode(pincode):
+    # Pincodes don't move; cache for a month and fall back to the last result when over quota
+    return single_flight(GEOCODE.key(pincode=pincode), lambda: _geocode_uncached(pincode), timeout=GEOCODE.timeout)
+
+def _address_details(geocode_result):
+    state, country = None, None
     if geocode_result:
-        address_components = geocode_result[0]["address_components"]
-        state, country = None, None
-        for component in address_components:
+        for component in geocode_result[0]["address_components"]:
             if "administrative_area_level_1" in component["types"]:
                 state = component["long_name"]
             if "country" in component["types"]:
                 country = component["long_name"]
-        return state, country
-    return None, None
+    return state, country
 
-def GetCoordinates(pincode):
-    geocode_result = gmaps.geocode(str(pincode))
+def _coordinates(geocode_result):
     if geocode_result:
         location = geocode_result[0]["geometry"]["location"]
         return location["lat"], location["lng"]
     return None, None
 
-# Example usage
-pincode = "110001"  # Example: New Delhi Pincode
-state, country = GetAddressDetails(pincode)
-lat, lon = GetCoordinates(pincode)
+def GetAddressDetails(pincode):
+    return _address_details(Geocode(pincode))
+
+def GetCoordinates(pincode):
+    return _coordinates(Geocode(pincode))
+
+def GetLocation(pincode):
+    # State, country, latitude and longitude from one lookup
+    geocode_result = Geocode(pincode)
+    state, country = _address_details(geocode_result)
+    lat, lon = _coordinates(geocode_result)
+    return state or "", country or "", lat, lon
 
-print(f"State: {state}, Country: {country}")
-print(f"Latitude: {lat}, Longitude: {lon}")
+def GeocodeAddress(address):
+    # Free-text places such as mandis; callers store the result, so no cache entry.
+    # (None, None) only when the geocoder found nothing: errors (rate limit, open
+    # circuit, transport) raise, so the caller can try again later
+    return _coordinates(_geocode(address))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.csv_upload import CSVUploadError
+from landing.importer import import_farmers, write_fidcs
+
+
+class Command(BaseCommand):
+    help = "Register farmers in bulk from a CSV file (name, phone, pincode, farmname, farmarea)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_file")
+        parser.add_argument("--output", help="Write name, phone and FIDC of each new farmer to this CSV file")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only; create nothing")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["csv_file"], "rb") as upload:
+                created, errors = import_farmers(upload, dry_run=options["dry_run"])
+        except (OSError, CSVUploadError) as e:
+            raise CommandError(str(e))
+
+        for error in errors:
+            problems = "; ".join(
+                f"{field}: {message['message']}" for field, messages in error["errors"].items() for message in messages
+            )
+            self.stderr.write(f"row {error['row']}: {problems}")
+        if errors:
+            raise CommandError(f"{len(errors)} row(s) need fixing; nothing was imported")
+        if options["dry_run"]:
+            self.stdout.write("All rows are valid")
+            return
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                write_fidcs(output, created)
+        else:
+            write_fidcs(self.stdout, created)
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(created)} farmers"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import geo, rollups
+from dashboard.cachekeys import invalidate_tags
+from landing.login_cfg import GetLocation
+from landing.models import User
+
+
+class Command(BaseCommand):
+    help = "Fill in state and coordinates for farmers registered before they were stored"
+
+    def handle(self, *args, **options):
+        pending = User.objects.filter(latitude__isnull=True)
+        # One lookup per pincode, however many farmers share it
+        locations = {pincode: GetLocation(pincode) for pincode in pending.values_list('pincode', flat=True).distinct()}
+        users = list(pending)
+        for user in users:
+            user.state, user.country, user.latitude, user.longitude = locations[user.pincode]
+            user.geohash = geo.encode(user.latitude, user.longitude) if user.latitude is not None else ""
+        User.objects.bulk_update(users, ['state', 'country', 'latitude', 'longitude', 'geohash'], batch_size=500)
+        # bulk_update skips the save signals, so drop every cached profile at once
+        invalidate_tags("user")
+        # ...and the listing rollups' farmer state changes
+        rollups.rebuild()
+        self.stdout.write(f"Located {len(users)} farmers across {len(locations)} pincodes")
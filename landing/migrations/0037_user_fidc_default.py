@@ -0,0 +1,19 @@
+# Generated by Django 4.2.5 on 2026-10-19 01:06
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('landing', '0036_user_geohash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='fidc',
+            field=models.UUIDField(default=uuid.uuid4, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from importlib import import_module
+
+from django.db import migrations
+
+# Users saved with coordinates but no pincode change were never hashed;
+# the backfill from 0036, with its frozen encoder, covers them
+fill_geohash = import_module('landing.migrations.0036_user_geohash').fill_geohash
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('landing', '0037_user_fidc_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
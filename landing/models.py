@@ -1,11 +1,12 @@
 from django.db import models
-from .login_cfg import GetAddressDetails, GetCoordinates
+from .login_cfg import GetAddressDetails, GetCoordinates, GetLocation
 from phonenumber_field.modelfields import PhoneNumberField
 import uuid
+from dashboard import geo
 
 # Create your models here.
 class User(models.Model):
-    fidc = models.UUIDField(default=uuid.uuid4().int, unique=True)
+    fidc = models.UUIDField(default=uuid.uuid4, unique=True)
     name = models.CharField(max_length=200)
     phone = PhoneNumberField(null=False, default="None", blank=False, unique=True, region='IN')
     pincode = models.IntegerField()
@@ -16,14 +17,52 @@ class User(models.Model):
     farmarea = models.DecimalField(max_digits=10000, decimal_places=3)
     address = models.TextField(blank=True,max_length=700)
     bio = models.TextField(blank=True,max_length=700)
+    # Resolved from the pincode on save so pages can filter and map farms without geocoding
+    state = models.CharField(blank=True, max_length=100, db_index=True)
+    country = models.CharField(blank=True, max_length=100)
+    latitude = models.FloatField(null=True, blank=True, db_index=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Geohash of the farm; nearby farms share a prefix (see dashboard.geo)
+    geohash = models.CharField(blank=True, max_length=12, db_index=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_pincode = instance.__dict__.get('pincode')
+        return instance
+
+    def locate(self):
+        self.state, self.country, self.latitude, self.longitude = GetLocation(self.pincode)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self.latitude is None or getattr(self, '_loaded_pincode', self.pincode) != self.pincode:
+            self.locate()
+            if update_fields is not None:
+                update_fields = {*update_fields, 'state', 'country', 'latitude', 'longitude'}
+        # Coordinates can also be given or edited directly; the hash follows them
+        located = self.latitude is not None and self.longitude is not None
+        geohash = geo.encode(self.latitude, self.longitude) if located else ""
+        if geohash != self.geohash:
+            self.geohash = geohash
+            if update_fields is not None:
+                update_fields = {*update_fields, 'geohash'}
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        self._loaded_pincode = self.pincode
 
     @property 
     def addressinfo(self):
+        if self.state:
+            return [self.state, self.country]
         state, country = GetAddressDetails(self.pincode)
         return [state, country]
 
     @property 
     def coords(self):
+        if self.latitude is not None:
+            return [self.latitude, self.longitude]
         lat ,lon = GetCoordinates(self.pincode)
         return [lat, lon]
     
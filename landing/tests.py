@@ -1,3 +1,93 @@
+import io
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from dashboard import geo
+from dashboard.cachekeys import GEOCODE
+from . import importer, login_cfg
+from .models import User
+
+PLACES = {
+    "411001": ("Maharashtra", 18.52, 73.85),
+    "560001": ("Karnataka", 12.97, 77.59),
+}
+
+
+def geocode(query):
+    # A googlemaps geocode response, as far as login_cfg reads it
+    state, lat, lon = PLACES[str(query)]
+    return [{
+        "address_components": [
+            {"long_name": state, "types": ["administrative_area_level_1", "political"]},
+            {"long_name": "India", "types": ["country", "political"]},
+        ],
+        "geometry": {"location": {"lat": lat, "lng": lon}},
+    }]
+
+
+class FarmerImportTests(TestCase):
+    HEADER = "name,phone,pincode,farmname,farmarea\n"
+
+    def setUp(self):
+        keys = [GEOCODE.key(pincode=int(pincode)) for pincode in PLACES]
+        keys += [f"{key}:stale" for key in keys]
+        cache.delete_many(keys)
+        self.addCleanup(cache.delete_many, keys)
+        patcher = mock.patch.object(login_cfg, "_geocode", side_effect=geocode)
+        self.provider = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, rows):
+        return io.BytesIO((self.HEADER + rows).encode())
+
+    def test_import(self):
+        created, errors = importer.import_farmers(self.upload(
+            "Asha,+919812345678,411001,Green Acres,2.5\n"
+            "Ravi,+919812345679,411001,Ravi Farm,1\n"
+            "Meena,+919812345680,560001,Hill Farm,3\n"
+        ))
+        self.assertEqual((len(created), errors), (3, []))
+        # One lookup per distinct pincode
+        self.assertEqual(self.provider.call_count, 2)
+        meena = User.objects.get(name="Meena")
+        self.assertEqual((meena.state, meena.country, meena.latitude, meena.longitude),
+                         ("Karnataka", "India", 12.97, 77.59))
+        self.assertEqual(meena.geohash, geo.encode(12.97, 77.59))
+
+        output = io.StringIO()
+        importer.write_fidcs(output, created)
+        self.assertIn(str(meena.fidc), output.getvalue())
+
+    def test_any_bad_row_imports_nothing(self):
+        User.objects.create(
+            name="Registered", phone="+919812345670", pincode="411001",
+            farmname="Farm", farmarea=1, latitude=18.52, longitude=73.85,
+        )
+        created, errors = importer.import_farmers(self.upload(
+            "Asha,+919812345678,411001,Green Acres,2.5\n"
+            "Asha again,+919812345678,411001,Green Acres,2.5\n"
+            "Registered,+919812345670,411001,Farm,1\n"
+            "Nobody,+919812345681,411001,Farm,not a number\n"
+        ))
+        self.assertEqual(created, [])
+        self.assertEqual(sorted((error["row"], list(error["errors"])) for error in errors),
+                         [(3, ["phone"]), (4, ["phone"]), (5, ["farmarea"])])
+        self.assertEqual(User.objects.count(), 1)
+        self.provider.assert_not_called()
+
+    def test_one_lookup_per_location(self):
+        # Nothing found isn't cached, so a second lookup would go to the provider again
+        self.provider.side_effect = lambda query: []
+        keys = [GEOCODE.key(pincode=999999), f"{GEOCODE.key(pincode=999999)}:stale"]
+        cache.delete_many(keys)
+        self.addCleanup(cache.delete_many, keys)
+        self.assertEqual(login_cfg.GetLocation(999999), ("", "", None, None))
+        self.assertEqual(self.provider.call_count, 1)
+
+    def test_dry_run(self):
+        created, errors = importer.import_farmers(self.upload("Asha,+919812345678,411001,Green Acres,2.5\n"),
+                                                  dry_run=True)
+        self.assertEqual((created, errors), ([], []))
+        self.assertFalse(User.objects.exists())
@@ -35,10 +35,9 @@ def register(request):
     if request.method == 'POST':
         form = RegisterFIDC(request.POST)
         if form.is_valid():
-            User.objects.create(**form.cleaned_data, fidc=uuid.uuid4())
-            fidc = User.objects.get(phone=form.cleaned_data['phone']).fidc
+            user = User.objects.create(**form.cleaned_data, fidc=uuid.uuid4())
             return render(request, 'login_success.html', {
-                'fidc': fidc
+                'fidc': user.fidc
             })
     else:
         form = RegisterFIDC()
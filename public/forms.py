@@ -0,0 +1,104 @@
+from django import forms
+from phonenumber_field.formfields import PhoneNumberField
+
+from dashboard.commodities import commodity_for, normalize
+
+
+class ListingFilterForm(forms.Form):
+    q = forms.CharField(required=False, max_length=100, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Search produce'
+        }))
+    commodity = forms.CharField(required=False, max_length=100, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Commodity'
+        }))
+    price_min = forms.DecimalField(required=False, min_value=0, widget=forms.NumberInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Min price'
+        }))
+    price_max = forms.DecimalField(required=False, min_value=0, widget=forms.NumberInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Max price'
+        }))
+    state = forms.CharField(required=False, max_length=100, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'State'
+        }))
+    lat = forms.FloatField(required=False, min_value=-90, max_value=90, widget=forms.HiddenInput())
+    lon = forms.FloatField(required=False, min_value=-180, max_value=180, widget=forms.HiddenInput())
+    km = forms.FloatField(required=False, min_value=0.1, max_value=500, widget=forms.NumberInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Within km'
+        }))
+    nearest = forms.IntegerField(required=False, min_value=1, max_value=100, widget=forms.NumberInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Nearest N'
+        }))
+    limit = forms.IntegerField(required=False, min_value=1, max_value=100, widget=forms.HiddenInput())
+    cursor = forms.CharField(required=False, max_length=200, widget=forms.HiddenInput())
+
+    def clean(self):
+        cleaned_data = super().clean()
+        has_point = cleaned_data.get('lat') is not None and cleaned_data.get('lon') is not None
+        wants_distance = cleaned_data.get('km') is not None or cleaned_data.get('nearest') is not None
+        if wants_distance != has_point or (cleaned_data.get('lat') is None) != (cleaned_data.get('lon') is None):
+            raise forms.ValidationError("Distance search needs lat and lon with km or nearest")
+        price_min, price_max = cleaned_data.get('price_min'), cleaned_data.get('price_max')
+        if price_min is not None and price_max is not None and price_min > price_max:
+            raise forms.ValidationError("Minimum price is above maximum price")
+        return cleaned_data
+
+
+class AnalyticsFilterForm(forms.Form):
+    state = forms.CharField(required=False, max_length=100, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'State'
+        }))
+    commodity = forms.CharField(required=False, max_length=100, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Commodity'
+        }))
+
+    def clean_commodity(self):
+        # Match the name listings are filed under
+        return commodity_for(self.cleaned_data['commodity'])
+
+
+class ReservationForm(forms.Form):
+    buyer_name = forms.CharField(label="Your Name", max_length=200, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Enter your name'
+        }))
+    buyer_phone = PhoneNumberField(label="Phone Number", region='IN', widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'The farmer will call you on this number'
+        }))
+    quantity = forms.DecimalField(label="Quantity", max_digits=10, decimal_places=2, min_value=0.01, widget=forms.NumberInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'How much do you need?'
+        }))
+
+
+class BidForm(ReservationForm):
+    commodity = forms.CharField(max_length=100, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'What do you want to buy?'
+        }))
+    price = forms.DecimalField(label="Price", max_digits=10, decimal_places=2, min_value=0.01, widget=forms.NumberInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Highest price you will pay per unit'
+        }))
+
+    def clean_commodity(self):
+        commodity = normalize(self.cleaned_data['commodity'])
+        if commodity is None:
+            raise forms.ValidationError("Unknown commodity")
+        return commodity
+
+
+class BidCancelForm(forms.Form):
+    buyer_phone = PhoneNumberField(label="Phone Number", region='IN', widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'The number the bid was placed with'
+        }))
@@ -0,0 +1,160 @@
+"""Keyset pagination over active marketplace listings.
+
+Pages are ordered newest first on (created_at, id) and a page boundary is
+carried as an opaque cursor, so fetching page N is one range scan on
+produce_active_recent_idx instead of an OFFSET over every earlier page.
+"""
+import base64
+import datetime
+import hashlib
+import json
+
+from django.db.models import Q
+
+from dashboard import geo
+from dashboard.commodities import commodity_for
+from dashboard.models import Produce
+from dashboard.search import search
+from landing.models import User
+
+PAGE_SIZE = 20
+# Up to this many farmers in range, their listings are fetched by farmer id;
+# past it most listings match anyway and a newest-first scan is cheaper
+MAX_FARMER_IDS = 2000
+# Wide distance searches scan candidates in batches of this many pages
+DISTANCE_OVERFETCH = 4
+
+
+def encode_cursor(produce):
+    raw = f"{produce.created_at.isoformat()}|{produce.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of the last row on the previous page; ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, produce_id = raw.rsplit("|", 1)
+        return datetime.datetime.fromisoformat(created_at), int(produce_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+
+def _after(queryset, created_at, produce_id):
+    return queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=produce_id))
+
+
+def filter_listings(filters):
+    """Active listings matching the non-distance filters, newest first."""
+    queryset = Produce.objects.active().select_related('farmer')
+    if filters.get('commodity'):
+        queryset = queryset.filter(commodity=commodity_for(filters['commodity']))
+    if filters.get('q'):
+        queryset = search(queryset, filters['q'])
+    if filters.get('price_min') is not None:
+        queryset = queryset.filter(price__gte=filters['price_min'])
+    if filters.get('price_max') is not None:
+        queryset = queryset.filter(price__lte=filters['price_max'])
+    if filters.get('state'):
+        queryset = queryset.filter(farmer__state__iexact=filters['state'].strip())
+    return queryset.order_by('-created_at', '-id')
+
+
+def listings_page(filters, cursor=None, limit=PAGE_SIZE):
+    """One page of listings and the cursor for the next one (None on the last page).
+
+    With `nearest` set the page is instead the N closest listings, nearest
+    first, and there is no next page. Rows found by distance carry a
+    `distance_km` attribute.
+    """
+    queryset = filter_listings(filters)
+    if filters.get('nearest') is not None:
+        rows = geo.nearest(
+            queryset, filters['lat'], filters['lon'], filters['nearest'],
+            fields=('farmer__geohash', 'farmer__latitude', 'farmer__longitude'),
+        )
+        if filters.get('km') is not None:
+            rows = [produce for produce in rows if produce.distance_km <= filters['km']]
+        return rows, None
+
+    distances = None
+    if filters.get('km') is not None:
+        distances = geo.within(User.objects.all(), filters['lat'], filters['lon'], filters['km'])
+        if len(distances) <= MAX_FARMER_IDS:
+            queryset = queryset.filter(farmer_id__in=distances)
+        else:
+            return _wide_distance_page(queryset, distances, cursor, limit)
+
+    if cursor:
+        queryset = _after(queryset, *decode_cursor(cursor))
+    rows = list(queryset[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if distances is not None:
+        for produce in rows:
+            produce.distance_km = distances[produce.farmer_id]
+    return rows, encode_cursor(rows[-1]) if has_more else None
+
+
+def _wide_distance_page(queryset, distances, cursor, limit):
+    # Walk listings newest first, keeping those whose farmer is in range
+    if cursor:
+        queryset = _after(queryset, *decode_cursor(cursor))
+    rows, has_more = [], False
+    batch_size = limit * DISTANCE_OVERFETCH
+    candidates = queryset
+    while not has_more:
+        batch = list(candidates[:batch_size])
+        for produce in batch:
+            if produce.farmer_id not in distances:
+                continue
+            if len(rows) == limit:
+                has_more = True
+                break
+            produce.distance_km = distances[produce.farmer_id]
+            rows.append(produce)
+        if len(batch) < batch_size:
+            break
+        candidates = _after(queryset, batch[-1].created_at, batch[-1].id)
+    return rows, encode_cursor(rows[-1]) if has_more else None
+
+
+def listing_data(produce):
+    farmer = produce.farmer
+    data = {
+        "id": produce.id,
+        "name": produce.name,
+        "commodity": produce.commodity,
+        "quantity": str(produce.quantity),
+        "unit": produce.unit,
+        "price": str(produce.price),
+        "listed_at": produce.created_at.isoformat(),
+        "seller": farmer.name if farmer else None,
+        "contact": str(farmer.phone) if farmer else None,
+        "state": farmer.state if farmer else "",
+        "country": farmer.country if farmer else "",
+        "location": [farmer.latitude, farmer.longitude] if farmer and farmer.latitude is not None else None,
+    }
+    if hasattr(produce, 'distance_km'):
+        data["distance_km"] = round(produce.distance_km, 2)
+    if getattr(produce, 'mandi', None):
+        data["mandi_modal_price"] = str(produce.mandi["modal"])
+        data["mandi_premium_pct"] = produce.mandi_premium
+    return data
+
+
+def page_validators(filters, rows, next_cursor, variant=""):
+    """ETag and Last-Modified timestamp for a page.
+
+    The ETag covers everything shown (including seller details, which don't
+    touch Produce.updated_at); Last-Modified is the newest listing edit.
+    """
+    payload = {
+        "variant": variant,
+        "filters": filters,
+        "rows": [listing_data(produce) for produce in rows],
+        "next": next_cursor,
+    }
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    last_modified = max((produce.updated_at for produce in rows), default=None)
+    return f'"{digest}"', last_modified.timestamp() if last_modified else None
@@ -1,3 +1,107 @@
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase
 
-# Create your tests here.
+from dashboard import bulk_listings
+from dashboard.models import Produce
+from landing.models import User
+
+
+class ListingsApiTests(TestCase):
+    def setUp(self):
+        self.client = Client(HTTP_HOST="localhost")
+        self.farmer = User.objects.create(
+            name="Test Farmer", phone="+919812345678", pincode="411001", state="Maharashtra",
+            farmname="Test Farm", farmarea=2, latitude=18.52, longitude=73.85,
+        )
+        self.listings = [
+            Produce.objects.create(farmer=self.farmer, name=f"Tomato {i}", quantity=5, price=20 + i, unit="quintal")
+            for i in range(25)
+        ]
+        Produce.objects.create(farmer=self.farmer, name="Sold out", quantity=0, price=20, unit="quintal")
+
+    def get(self, **params):
+        return self.client.get("/public/api/listings/", params)
+
+    def ids(self, response):
+        return [row["id"] for row in response.json()["results"]]
+
+    def test_cursor_pages_cover_every_listing_once(self):
+        seen, cursor = [], None
+        while True:
+            response = self.get(limit=10, **({"cursor": cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            seen += self.ids(response)
+            cursor = response.json()["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, [produce.id for produce in reversed(self.listings)])
+
+        # A listing added meanwhile doesn't shift the pages after it
+        first = self.get(limit=10)
+        Produce.objects.create(farmer=self.farmer, name="Onion", quantity=5, price=20, unit="quintal")
+        second = self.get(limit=10, cursor=first.json()["next_cursor"])
+        self.assertEqual(self.ids(second), [produce.id for produce in reversed(self.listings[5:15])])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.get(cursor="not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cursor", response.json()["errors"])
+        self.assertEqual(self.client.get("/public/", {"cursor": "not-a-cursor"}).status_code, 400)
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.get(limit=5)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get("/public/api/listings/", {"limit": 5}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        newest = self.listings[-1]
+        newest.price = 99
+        newest.save()
+        changed = self.client.get("/public/api/listings/", {"limit": 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+
+    def test_search(self):
+        compost = Produce.objects.create(farmer=self.farmer, name="Vermicompost bags", quantity=5, price=300, unit="bag")
+        # Commodity names, Hindi included, match on the commodity column
+        self.assertEqual(len(self.ids(self.get(q="tamatar", limit=100))), 25)
+        # Anything else through the trigram index: substrings, then typos
+        self.assertEqual(self.ids(self.get(q="compost")), [compost.id])
+        self.assertEqual(self.ids(self.get(q="vermicompst")), [compost.id])
+        self.assertEqual(self.ids(self.get(q="zzzz")), [])
+
+
+class BulkUploadTests(TestCase):
+    def setUp(self):
+        self.farmer = User.objects.create(
+            name="Test Farmer", phone="+919812345678", pincode="411001", state="Maharashtra",
+            farmname="Test Farm", farmarea=2, latitude=18.52, longitude=73.85,
+        )
+
+    def upload(self, text):
+        return SimpleUploadedFile("listings.csv", text.encode(), content_type="text/csv")
+
+    def test_any_bad_row_lists_nothing(self):
+        created, errors = bulk_listings.import_listings(self.upload(
+            "Name,Price,Quantity\n"
+            "Onion,20,5\n"
+            "\n"
+            "Potato,cheap,5\n"
+            ",18,2\n"
+        ), self.farmer.id)
+        self.assertEqual(created, [])
+        self.assertEqual([error["row"] for error in errors], [4, 5])
+        self.assertIn("price", errors[0]["errors"])
+        self.assertFalse(Produce.objects.exists())
+
+    def test_upload_is_listed(self):
+        created, errors = bulk_listings.import_listings(
+            self.upload("name,price,quantity\nOnion,20,5\npyaz,21,3\nPotato,15,10\n"), self.farmer.id,
+        )
+        self.assertEqual((len(created), errors), (3, []))
+        self.assertEqual(Produce.objects.filter(farmer=self.farmer, commodity="Onion").count(), 2)
+        response = Client(HTTP_HOST="localhost").get("/public/api/listings/", {"commodity": "onion"})
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_missing_columns(self):
+        with self.assertRaises(bulk_listings.CSVUploadError):
+            bulk_listings.import_listings(self.upload("name,price\nOnion,20\n"), self.farmer.id)
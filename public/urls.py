@@ -6,5 +6,13 @@ from public.views import *
 urlpatterns = [
     # path('', home_page),
     # path("", home_page, name ="admin"),
-    path('', view_listings_page)
+    path('', view_listings_page),
+    path('api/listings/', listings_api),
+    path('listings/<int:id>/reserve/', reserve_listing),
+    path('api/bids/', bids_api),
+    path('api/bids/<int:id>/cancel/', cancel_bid),
+    path('analytics/', market_analytics_page),
+    path('api/analytics/', analytics_api),
+    path('suitability/', crop_suitability_page),
+    path('api/suitability/', crop_suitability_api),
 ]
\ No newline at end of file
@@ -1,10 +1,260 @@
+import hashlib
+import json
+
+from django.db.models import Max
+from django.http import Http404, JsonResponse
 from django.shortcuts import render
-from dashboard.models import Produce
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from dashboard import matching, orders, rollups
+from dashboard.market_prices import compare_with_mandi
+from dashboard.models import CropSuitability, Produce
+from .forms import AnalyticsFilterForm, BidCancelForm, BidForm, ListingFilterForm, ReservationForm
+from .listings import PAGE_SIZE, listing_data, listings_page, page_validators
+
+
+def _seller_state(produce):
+    return produce.farmer.state if produce.farmer else ""
+
+
+def _filters(form):
+    return {name: value for name, value in form.cleaned_data.items() if name not in ('cursor', 'limit')}
+
+
+def _with_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Let clients keep the page but revalidate it every time
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def _conditional(request, etag, last_modified, render_page):
+    # Answer 304 before rendering anything when the client's copy is current
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render_page()
+    return _with_validators(response, etag, last_modified)
+
 
 # Create your views here.
+# Buyers browse listings before bidding; the cookie lets their bids pass CSRF
+@ensure_csrf_cookie
 def view_listings_page(request):
-    products = Produce.objects.all()
+    form = ListingFilterForm(request.GET)
     context = {
-        'products': products,
+        'form': form,
+        'products': [],
+        'next_url': None,
     }
-    return render(request, "dash/market/market_produce.html", context)
\ No newline at end of file
+    if not form.is_valid():
+        return render(request, "dash/market/market_produce.html", context, status=400)
+    try:
+        products, next_cursor = listings_page(
+            _filters(form), form.cleaned_data['cursor'], form.cleaned_data['limit'] or PAGE_SIZE,
+        )
+    except ValueError as e:
+        context['error_message'] = str(e)
+        return render(request, "dash/market/market_produce.html", context, status=400)
+
+    compare_with_mandi(products, _seller_state)
+    if next_cursor:
+        query = request.GET.copy()
+        query['cursor'] = next_cursor
+        context['next_url'] = f"?{query.urlencode()}"
+    context['products'] = products
+    etag, last_modified = page_validators(_filters(form), products, next_cursor, variant="html")
+    return _conditional(
+        request, etag, last_modified,
+        lambda: render(request, "dash/market/market_produce.html", context),
+    )
+
+
+@ensure_csrf_cookie
+def listings_api(request):
+    form = ListingFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        products, next_cursor = listings_page(
+            _filters(form), form.cleaned_data['cursor'], form.cleaned_data['limit'] or PAGE_SIZE,
+        )
+    except ValueError as e:
+        return JsonResponse({'errors': {'cursor': [str(e)]}}, status=400)
+
+    compare_with_mandi(products, _seller_state)
+    etag, last_modified = page_validators(_filters(form), products, next_cursor, variant="json")
+    return _conditional(
+        request, etag, last_modified,
+        lambda: JsonResponse({
+            'results': [listing_data(produce) for produce in products],
+            'next_cursor': next_cursor,
+        }),
+    )
+
+
+def reserve_listing(request, id):
+    try:
+        produce = Produce.objects.active().select_related('farmer').get(id=id)
+    except Produce.DoesNotExist:
+        raise Http404("This listing is no longer available")
+    form = ReservationForm(request.POST or None)
+    context = {
+        'produce': produce,
+        'form': form,
+    }
+    status = 200
+    if request.method == 'POST':
+        if form.is_valid():
+            try:
+                context['order'] = orders.reserve(produce.id, **form.cleaned_data)
+            except orders.OutOfStock:
+                produce.refresh_from_db(fields=['quantity'])
+                context['error'] = f"Only {produce.quantity} {produce.unit} left on this listing"
+                status = 409
+        else:
+            status = 400
+
+    if not request.accepts('text/html') and request.accepts('application/json'):
+        order = context.get('order')
+        return JsonResponse({
+            'order': order and {'id': order.id, 'quantity': str(order.quantity), 'price': str(order.price), 'status': order.status},
+            'error': context.get('error') or form.errors.get_json_data() or None,
+        }, status=status)
+    return render(request, "dash/market/reserve_produce.html", context, status=status)
+
+
+_ENGINE_BUSY = {'errors': {'__all__': ["Bids are taken by another server; try again"]}}
+
+
+@require_POST
+def bids_api(request):
+    form = BidForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    data = form.cleaned_data
+    try:
+        entry, fills = matching.place_bid(
+            data['commodity'], data['price'], data['quantity'], data['buyer_name'], data['buyer_phone'],
+        )
+    except matching.EngineBusy:
+        # Another worker owns the order books
+        return JsonResponse(_ENGINE_BUSY, status=503)
+    return JsonResponse({
+        'id': entry.id,
+        'bid': entry.owner['bid'],
+        'commodity': data['commodity'],
+        'resting': str(entry.quantity),
+        'fills': [{
+            'listing': fill.settlement.produce_id,
+            'order': fill.settlement.id,
+            'price': str(fill.price),
+            'quantity': str(fill.quantity),
+        } for fill in fills],
+    }, status=201 if fills else 202)
+
+
+@require_POST
+def cancel_bid(request, id):
+    form = BidCancelForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        bid = matching.cancel_bid(id, str(form.cleaned_data['buyer_phone']))
+    except matching.EngineBusy:
+        return JsonResponse(_ENGINE_BUSY, status=503)
+    if bid is None:
+        raise Http404("No open bid with this id and phone number")
+    return JsonResponse({'bid': bid.id, 'status': bid.status, 'unfilled': str(bid.quantity)})
+
+
+def _analytics(request, variant):
+    form = AnalyticsFilterForm(request.GET)
+    form.is_valid()
+    filters = {name: form.cleaned_data.get(name) or "" for name in ('state', 'commodity')}
+    figures = rollups.analytics(**filters)
+    payload = json.dumps({"variant": variant, "filters": filters, "figures": figures}, sort_keys=True, default=str)
+    etag = f'"{hashlib.sha1(payload.encode()).hexdigest()}"'
+    updated_at = figures['updated_at']
+    return form, figures, etag, updated_at.timestamp() if updated_at else None
+
+
+def market_analytics_page(request):
+    form, figures, etag, last_modified = _analytics(request, "html")
+    return _conditional(
+        request, etag, last_modified,
+        lambda: render(request, "dash/market/market_analytics.html", {'form': form, **figures}),
+    )
+
+
+def analytics_api(request):
+    form, figures, etag, last_modified = _analytics(request, "json")
+    return _conditional(request, etag, last_modified, lambda: JsonResponse(figures))
+
+
+# The map shows every pincode; the table under it only the best ones
+SUITABILITY_TABLE_ROWS = 100
+
+
+def _suitability(request, variant):
+    """(crop, pincode, rows, etag, last_modified). Rows are the pincode's
+    ranked crops, else the pincodes where `crop` ranks, else each pincode's
+    best crop; best first."""
+    crop = request.GET.get('crop', '').strip().lower()
+    pincode = request.GET.get('pincode', '').strip()
+    rows = CropSuitability.objects.all()
+    if pincode.isdigit():
+        rows = rows.filter(pincode=int(pincode)).order_by('rank')
+    else:
+        pincode = ""
+        rows = rows.filter(crop=crop) if crop else rows.filter(rank=1)
+        rows = rows.order_by('-probability', 'pincode')
+    # The table is rewritten as a whole, so its build time versions every page
+    computed_at = CropSuitability.objects.aggregate(latest=Max('computed_at'))['latest']
+    etag = f'"{hashlib.sha1(f"{variant}|{crop}|{pincode}|{computed_at}".encode()).hexdigest()}"'
+    return crop, pincode, rows, etag, computed_at.timestamp() if computed_at else None
+
+
+def _suitability_data(row):
+    return {
+        'pincode': row.pincode,
+        'state': row.state,
+        'lat': row.latitude,
+        'lon': row.longitude,
+        'rank': row.rank,
+        'crop': row.crop,
+        'probability': row.probability,
+        'source': row.source,
+    }
+
+
+def crop_suitability_page(request):
+    crop, pincode, rows, etag, last_modified = _suitability(request, "html")
+
+    def render_page():
+        rows_list = list(rows)
+        return render(request, "dash/market/crop_suitability.html", {
+            'crop': crop,
+            'pincode': pincode,
+            'crops': CropSuitability.objects.values_list('crop', flat=True).distinct().order_by('crop'),
+            'rows': rows_list[:SUITABILITY_TABLE_ROWS],
+            # Only what the map draws; it can be every pincode
+            'markers': [
+                [row.latitude, row.longitude, row.pincode, row.crop, row.probability]
+                for row in rows_list if row.latitude is not None
+            ],
+        })
+
+    return _conditional(request, etag, last_modified, render_page)
+
+
+def crop_suitability_api(request):
+    crop, pincode, rows, etag, last_modified = _suitability(request, "json")
+    return _conditional(
+        request, etag, last_modified,
+        lambda: JsonResponse({'results': [_suitability_data(row) for row in rows]}),
+    )